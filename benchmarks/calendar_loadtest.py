@@ -0,0 +1,107 @@
+"""
+Load tests a sync against a local fake google calendar (fakecalendar.FakeCalendarServer) over real http,
+and reports how many events a second it gets through
+
+    python benchmarks/calendar_loadtest.py --events 10000
+    python benchmarks/calendar_loadtest.py --events 10000 --stream --latency 0.002
+    python benchmarks/calendar_loadtest.py --events 2000 --quota 500 --failure-rate 0.001
+
+The calendar starts with an event for every synthetic movie, except that a tenth of them are out
+of date, a twentieth are missing and there are a twentieth more stale events to delete
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+from googleapiclient.errors import HttpError
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+from mcu_calendar import reporting  # noqa: E402
+from mcu_calendar.fakecalendar import FakeCalendarApi, FakeCalendarServer  # noqa: E402
+from mcu_calendar.streamsync import stream_sync  # noqa: E402
+from mcu_calendar.yamlcalendar import YamlCalendar  # noqa: E402
+
+CAL_ID = "loadtest@group.calendar.google.com"
+START = date(1950, 1, 1)
+
+
+def make_catalog(folder: Path, size: int) -> List[Dict[str, Any]]:
+    """
+    Writes size synthetic movie yamls, and gets the events the calendar starts with
+    """
+    events = []
+    for i in range(size + size // 20):
+        title = f"Synthetic Movie {i}"
+        release_date = START + timedelta(days=i % 30000)
+        description = f"https://www.imdb.com/title/tt{i:08}"
+        if i < size:
+            (folder / f"synthetic_movie_{i:06}.yaml").write_text(
+                f"title: {title}\nrelease_date: {release_date.isoformat()}\ndescription: {description}\n",
+                encoding="UTF-8",
+            )
+        if i % 20 == 19 and i < size:
+            continue
+        events.append(
+            {
+                "summary": title,
+                "description": "out of date" if i % 10 == 0 else description,
+                "start": {"date": release_date.isoformat()},
+                "end": {"date": (release_date + timedelta(days=1)).isoformat()},
+            }
+        )
+    return events
+
+
+def main() -> None:
+    """
+    Runs the load test
+    """
+    parser = ArgumentParser(description="Load test a sync against a local fake google calendar")
+    parser.add_argument("--events", type=int, default=10000, help="How many movies the catalog has")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming sync instead of the full sync")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the server waits before each response")
+    parser.add_argument("--quota", type=int, help="The most calls the server allows each second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="The fraction of calls that fail with a 503")
+    args = parser.parse_args()
+
+    api = FakeCalendarApi(args.latency, args.quota, failure_rate=args.failure_rate)
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeCalendarServer(api) as server:
+        folder = Path(tmp_dir)
+        api.seed_events(CAL_ID, make_catalog(folder, args.events))
+        calendar = YamlCalendar("Load Test", CAL_ID, [folder], [], server.service())
+
+        error = None
+        start = time.perf_counter()
+        with open(os.devnull, "w", encoding="UTF-8") as devnull, contextlib.redirect_stdout(devnull):
+            reporting.configure(headless=True)
+            try:
+                if args.stream:
+                    stream_sync(calendar)
+                else:
+                    calendar.create_google_events()
+            except HttpError as http_error:
+                error = http_error
+        elapsed = time.perf_counter() - start
+
+    calls = sum(v for k, v in api.counts.items() if k not in ("throttled", "failed"))
+    print(f"{'sync':<8} {'events':>7} {'seconds':>9} {'events/s':>9} {'calls/s':>9}")
+    print(
+        f"{'stream' if args.stream else 'full':<8} {args.events:>7} {elapsed:>8.2f}s"
+        f" {args.events / elapsed:>9.1f} {calls / elapsed:>9.1f}"
+    )
+    print(", ".join(f"{k}: {v}" for k, v in sorted(api.counts.items())))
+    if error is not None:
+        print(f"Sync failed: {error.status_code} {error.reason}")
+
+
+if __name__ == "__main__":
+    main()
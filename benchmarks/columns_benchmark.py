@@ -0,0 +1,102 @@
+"""
+Compares bulk release date questions asked of the Movie and Show objects one at a time against the
+same questions asked of a columns.CatalogColumns, on synthetic catalogs of increasing size
+
+    python benchmarks/columns_benchmark.py --sizes 1000 10000 100000
+"""
+
+import random
+import sys
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from timing import best_of
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+from mcu_calendar.columns import CatalogColumns, classify_recurrence  # noqa: E402
+from mcu_calendar.events import GoogleMediaEvent, Movie, Show  # noqa: E402
+from mcu_calendar.recurrence import encode_recurrence  # noqa: E402
+
+START = date(2008, 5, 2)
+TODAY = date(2024, 1, 1)
+
+
+def make_catalog(size: int, seed: int = 0) -> List[GoogleMediaEvent]:
+    """
+    Makes size synthetic items, half movies and half weekly shows with the odd irregular week
+    """
+    rng = random.Random(seed)
+    items: List[GoogleMediaEvent] = []
+    for i in range(size):
+        first = START + timedelta(days=rng.randrange(7000))
+        if i % 2 == 0:
+            items.append(Movie(f"Movie {i}", "", first, Path(f"movie_{i}.yaml")))
+            continue
+        weeks = {first + timedelta(weeks=w) for w in range(rng.randint(1, 10))}
+        if rng.random() < 0.2:
+            weeks.add(first + timedelta(days=rng.randint(1, 70)))
+        items.append(Show(f"Show {i}", sorted(weeks), "", Path(f"show_{i}.yaml")))
+    return items
+
+
+def release_dates(item: GoogleMediaEvent) -> List[date]:
+    """
+    Gets every release date of an item
+    """
+    return item.release_dates if isinstance(item, Show) else [item.last_release_date()]
+
+
+def questions(items: List[GoogleMediaEvent], columns: CatalogColumns) -> List[Tuple[str, Callable, Callable]]:
+    """
+    Gets each question, answered both ways
+    """
+    soon = TODAY + timedelta(days=30)
+    return [
+        (
+            "next 30 days",
+            lambda: [i for i in items if any(TODAY <= d <= soon for d in release_dates(i))],
+            lambda: columns.select(columns.releasing_between(TODAY, soon)),
+        ),
+        (
+            "sync window",
+            lambda: [i for i in items if i.last_release_date() >= TODAY],
+            lambda: columns.select(columns.in_window(TODAY)),
+        ),
+        (
+            "schedules",
+            lambda: [classify_recurrence(encode_recurrence(release_dates(i))) for i in items],
+            columns.schedules,
+        ),
+    ]
+
+
+def main() -> None:
+    """
+    Runs the benchmark
+    """
+    parser = ArgumentParser(description="Benchmark the object path against the columnar catalog")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'items':>7} {'question':<14} {'objects':>10} {'columns':>10} {'speedup':>8}")
+    for size in args.sizes:
+        items = make_catalog(size)
+        build = best_of(args.repeat, lambda: CatalogColumns(items))  # pylint: disable=cell-var-from-loop
+        print(f"{size:>7} {'build columns':<14} {'':>10} {build * 1000:>8.1f}ms")
+        columns = CatalogColumns(items)
+        for name, objects, columnar in questions(items, columns):
+            objects_time = best_of(args.repeat, objects)
+            columns_time = best_of(args.repeat, columnar)
+            print(
+                f"{size:>7} {name:<14} {objects_time * 1000:>8.1f}ms {columns_time * 1000:>8.1f}ms"
+                f" {objects_time / columns_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
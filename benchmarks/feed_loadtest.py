@@ -0,0 +1,76 @@
+"""
+Load tests a running feed server (python main.py serve) and reports requests per second
+
+    python main.py serve &
+    python benchmarks/feed_loadtest.py --path /mcu.ics --conditional
+"""
+
+import http.client
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from typing import Dict, List
+
+
+# pylint: disable=too-many-arguments
+def worker(host: str, port: int, path: str, headers: Dict[str, str], deadline: float, results: List[Counter]) -> None:
+    """
+    Sends requests over a single keep-alive connection until the deadline
+    """
+    counts: Counter = Counter()
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    while time.perf_counter() < deadline:
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        counts[response.status] += 1
+    conn.close()
+    results.append(counts)
+
+
+def main() -> None:
+    """
+    Runs the load test
+    """
+    parser = ArgumentParser(description="Load test the calendar feed server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/mcu.ics")
+    parser.add_argument("--connections", type=int, default=8, help="Concurrent keep-alive connections")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--gzip", action="store_true", help="Ask for gzip compressed responses")
+    parser.add_argument("--conditional", action="store_true", help="Send If-None-Match like a polling client")
+    args = parser.parse_args()
+
+    headers = {}
+    if args.gzip:
+        headers["Accept-Encoding"] = "gzip"
+    if args.conditional:
+        conn = http.client.HTTPConnection(args.host, args.port, timeout=10)
+        conn.request("HEAD", args.path)
+        headers["If-None-Match"] = conn.getresponse().getheader("ETag", "")
+        conn.close()
+
+    results: List[Counter] = []
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=worker, args=(args.host, args.port, args.path, headers, deadline, results))
+        for _ in range(args.connections)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total: Counter = sum(results, Counter())
+    requests = sum(total.values())
+    print(f"{requests} requests in {elapsed:.1f}s = {requests / elapsed:,.0f} req/s")
+    for status, count in sorted(total.items()):
+        print(f"  {status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
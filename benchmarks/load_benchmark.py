@@ -0,0 +1,73 @@
+"""
+Compares loading a data folder serially against loading it across a process pool, on synthetic
+catalogs of increasing size, to find where YamlCalendar.PARALLEL_LOAD_THRESHOLD should be
+
+    python benchmarks/load_benchmark.py --sizes 16 64 256 1024 4096
+"""
+
+import os
+import sys
+import tempfile
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from functools import partial
+from pathlib import Path
+from typing import List
+
+import yaml
+from timing import best_of
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+from mcu_calendar.events import Show  # noqa: E402
+from mcu_calendar.yamlcalendar import YamlCalendar  # noqa: E402
+
+
+def make_catalog(folder: Path, size: int) -> None:
+    """
+    Writes size synthetic show yamls, which are the most expensive files to parse
+    """
+    start = date(2008, 5, 2)
+    for i in range(size):
+        show_data = {
+            "title": f"Synthetic Show {i}",
+            "release_dates": [start + timedelta(days=i + 7 * week) for week in range(10)],
+            "imdb_id": f"tt{i:08}",
+            "description": f"https://www.imdb.com/title/tt{i:08}\nhttps://www.marvel.com/tv-shows/synthetic-{i}\n",
+        }
+        with open(folder / f"synthetic_show_{i}.yaml", "w", encoding="UTF-8") as yaml_file:
+            yaml.safe_dump(show_data, yaml_file, sort_keys=False)
+
+
+def main() -> None:
+    """
+    Runs the benchmark
+    """
+    parser = ArgumentParser(description="Benchmark serial vs parallel data folder loading")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 256, 1024, 4096])
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'files':>6} {'serial':>10} {'parallel':>10} {'speedup':>8}   ({args.workers} workers)")
+    crossover: List[int] = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = Path(tmp_dir)
+            make_catalog(folder, size)
+            load = partial(YamlCalendar._get_objects_from_data, folder, Show.from_yaml)  # pylint: disable=W0212
+            serial = best_of(args.repeat, partial(load, parallel_threshold=sys.maxsize))
+            parallel = best_of(args.repeat, partial(load, parallel_threshold=0, max_workers=args.workers))
+        if parallel < serial:
+            crossover.append(size)
+        print(f"{size:>6} {serial * 1000:>8.1f}ms {parallel * 1000:>8.1f}ms {serial / parallel:>7.2f}x")
+
+    if crossover:
+        print(f"Parallel loading wins from {min(crossover)} files")
+    else:
+        print("Parallel loading never won, keep loading serially")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Times the whole sync (main.py) or scrape (get_new_media.py) pipeline end to end, replaying a cassette
+recorded on a host with google and TMDB access, so runs are reproducible and need no network
+
+    python main.py --record sync.cassette.json
+    python get_new_media.py --release_date 2024-01-01 --record scrape.cassette.json
+
+    python benchmarks/pipeline_benchmark.py sync sync.cassette.json --repeat 5
+    python benchmarks/pipeline_benchmark.py scrape scrape.cassette.json --release-date 2024-01-01 --zero-latency
+
+Every run works on a fresh copy of calendars.yaml and data/ in a temporary folder, since both
+pipelines write to them, and the scrape has to be given the release date it was recorded with (and
+GOOGLE_SEARCH_API_KEY has to be set if it was when recording, or the link searches are skipped).
+Replaying at the recorded latencies times the pipeline as it ran, and replaying at zero latency
+times only our side of it
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from datetime import date
+from pathlib import Path
+
+import tmdbsimple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# pylint: disable=wrong-import-position
+import get_new_media  # noqa: E402
+import main  # noqa: E402
+from mcu_calendar import reporting, transport  # noqa: E402
+from mcu_calendar.cassette import Cassette  # noqa: E402
+
+
+def fresh_copy(work_dir: Path) -> None:
+    """
+    Replaces work_dir's calendars.yaml, cal_id.yaml and data/ with copies of the repository's
+    """
+    shutil.rmtree(work_dir / "data", ignore_errors=True)
+    shutil.copytree(ROOT / "data", work_dir / "data")
+    for name in ("calendars.yaml", "cal_id.yaml"):
+        if (ROOT / name).exists():
+            shutil.copy(ROOT / name, work_dir / name)
+    for state in work_dir.glob(".*.yaml"):
+        state.unlink()
+
+
+def run_once(pipeline: str, release_date: date) -> None:
+    """
+    Runs a pipeline the way its script would
+    """
+    if pipeline == "sync":
+        main.main(dry=False, force=False)
+    else:
+        get_new_media.get_new_media(release_date)
+
+
+def main_benchmark() -> None:
+    """
+    Runs the benchmark
+    """
+    parser = ArgumentParser(description="Time the sync or scrape pipeline against a recorded cassette")
+    parser.add_argument("pipeline", choices=["sync", "scrape"])
+    parser.add_argument("cassette", type=Path)
+    parser.add_argument("--release-date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--zero-latency", action="store_true")
+    args = parser.parse_args()
+
+    # Replayed calls are matched without their credentials, but tmdbsimple won't make a call without a key
+    tmdbsimple.API_KEY = tmdbsimple.API_KEY or "replay"
+    tape = Cassette(args.cassette.resolve(), speed=0.0 if args.zero_latency else 1.0)
+    print(f"{len(tape)} recorded calls, replayed at {'zero' if args.zero_latency else 'recorded'} latency")
+    print(f"{'run':>4} {'seconds':>9} {'calls':>7} {'calls/s':>9}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        for run in range(1, args.repeat + 1):
+            fresh_copy(Path(work_dir))
+            tape.rewind()
+            transport.configure(cassette=tape)
+            with open(os.devnull, "w", encoding="UTF-8") as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    reporting.configure(headless=True)
+                    start = time.perf_counter()
+                    run_once(args.pipeline, args.release_date)
+                    elapsed = time.perf_counter() - start
+                    reporting.current().close()
+                finally:
+                    sys.stdout = stdout
+            print(f"{run:>4} {elapsed:>8.3f}s {tape.replayed:>7} {tape.replayed / elapsed:>9.1f}")
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,149 @@
+"""
+Compares the peak python memory of a full sync (YamlCalendar.create_google_events) against a streaming
+sync (streamsync.stream_sync) on synthetic catalogs of increasing size, against a fake calendar that
+already has an event for every movie (a tenth of them out of date) and generates its pages on the fly
+
+    python benchmarks/stream_benchmark.py --sizes 1000 10000 100000
+
+The streaming sync's remote index lives in sqlite, whose page cache is capped separately and isn't
+seen by tracemalloc.  What's left growing with the catalog is the sorted list of file names, at
+around 100 bytes a file, against nearly 2KB a movie for the full sync
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# pylint: disable=wrong-import-position
+from mcu_calendar.streamsync import stream_sync  # noqa: E402
+from mcu_calendar.yamlcalendar import YamlCalendar  # noqa: E402
+
+PAGE_SIZE = 250
+START = date(1950, 1, 1)
+
+
+def movie_data(i: int) -> Tuple[str, str, str]:
+    """
+    Gets the title, release date and description of synthetic movie i
+    """
+    return (
+        f"Synthetic Movie {i}",
+        (START + timedelta(days=i % 30000)).isoformat(),
+        f"https://www.imdb.com/title/tt{i:08}",
+    )
+
+
+def make_catalog(folder: Path, size: int) -> None:
+    """
+    Writes size synthetic movie yamls
+    """
+    for i in range(size):
+        title, release_date, description = movie_data(i)
+        (folder / f"synthetic_movie_{i:06}.yaml").write_text(
+            f"title: {title}\nrelease_date: {release_date}\ndescription: {description}\n", encoding="UTF-8"
+        )
+
+
+class Executor:  # pylint: disable=too-few-public-methods
+    """
+    The result of a fake calendar call
+    """
+
+    def __init__(self, result: Any = None) -> None:
+        self.result = result
+
+    def execute(self) -> Any:
+        """
+        Gets the result
+        """
+        return self.result
+
+
+class FakeCalendar:
+    """
+    A calendar with an event for each synthetic movie, which builds each page as it's asked for and drops every write
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+
+    def list(self, **kwargs: Any) -> Executor:
+        """
+        Gets a page of events
+        """
+        start = int(kwargs.get("pageToken", 0))
+        items = []
+        for i in range(start, min(start + PAGE_SIZE, self.size)):
+            title, release_date, description = movie_data(i)
+            end_date = (date.fromisoformat(release_date) + timedelta(days=1)).isoformat()
+            items.append(
+                {
+                    "id": f"event{i}",
+                    "summary": title,
+                    "description": "out of date" if i % 10 == 0 else description,
+                    "start": {"date": release_date},
+                    "end": {"date": end_date},
+                }
+            )
+        result: Dict[str, Any] = {"items": items}
+        if start + PAGE_SIZE < self.size:
+            result["nextPageToken"] = str(start + PAGE_SIZE)
+        return Executor(result)
+
+    def insert(self, **_: Any) -> Executor:
+        """
+        Drops an insert
+        """
+        return Executor()
+
+    update = insert
+    patch = insert
+    delete = insert
+
+
+def measure(func: Callable[[], object]) -> Tuple[float, float]:
+    """
+    Gets the peak traced memory in MB and the run time in seconds of func, with its output thrown away
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, "w", encoding="UTF-8") as devnull, contextlib.redirect_stdout(devnull):
+        func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, elapsed
+
+
+def main() -> None:
+    """
+    Runs the benchmark
+    """
+    parser = ArgumentParser(description="Benchmark the memory of a full sync vs a streaming sync")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    args = parser.parse_args()
+
+    print(f"{'movies':>7} {'full':>10} {'stream':>10} {'full':>8} {'stream':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            folder = Path(tmp_dir)
+            make_catalog(folder, size)
+            full = YamlCalendar("Full", "full", [folder], [], FakeCalendar(size))
+            full_mb, full_s = measure(full.create_google_events)
+            streamed = YamlCalendar("Stream", "stream", [folder], [], FakeCalendar(size))
+            stream_mb, stream_s = measure(partial(stream_sync, streamed))
+        print(f"{size:>7} {full_mb:>8.1f}MB {stream_mb:>8.1f}MB {full_s:>7.1f}s {stream_s:>7.1f}s")
+
+
+if __name__ == "__main__":
+    main()
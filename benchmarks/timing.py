@@ -0,0 +1,18 @@
+"""
+Timing shared by the benchmarks, which run as scripts and so import it from their own folder
+"""
+
+import time
+from typing import Callable
+
+
+def best_of(repeat: int, func: Callable[[], object]) -> float:
+    """
+    Gets the fastest run time of func in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
@@ -2,28 +2,37 @@
 This script adds events to a google users calendar for Movies and TV shows defined in ./data/
 """
 
-import re
 from argparse import ArgumentParser
 from datetime import date, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Collection, Dict, List, Optional, Union
 
 import yaml
 
+from mcu_calendar import cassette, reporting, transport
 from mcu_calendar.events import GoogleMediaEvent
-from mcu_calendar.helpers import create_progress
+from mcu_calendar.helpers import get_safe_title
+from mcu_calendar.search import SearchIndex
+from mcu_calendar.tmdbrefresh import TmdbState, plan_refresh
 from mcu_calendar.webscraping import (
     Companies,
     Keyword,
     MovieGenre,
+    TmdbApi,
     TvGenre,
+    discover_movies,
+    discover_shows,
     get_mcu_movie_link,
     get_mcu_show_link,
-    get_movies,
-    get_shows,
+    get_movie_details,
+    get_show_details,
 )
 from mcu_calendar.yamlcalendar import YamlCalendar
 
+# The regions, besides the US, whose release dates are kept so that there can be calendars for them
+REGIONS = ["GB", "CA", "AU", "DE"]
+THEATRICAL_RELEASE = 3
+
 
 def str_presenter(dumper: Union[yaml.Dumper, yaml.representer.SafeRepresenter], data: Any) -> yaml.Node:
     """
@@ -39,37 +48,49 @@ yaml.add_representer(str, str_presenter)
 yaml.representer.SafeRepresenter.add_representer(str, str_presenter)  # to use with safe_dum
 
 
-def get_safe_title(title: str) -> str:
+def index_release_dates(movie: Dict[str, Any]) -> Dict[str, Dict[int, date]]:
     """
-    Gets a url-safe title (mostly trying to match the format I already had)
+    Indexes the first listed release date of each type in each region of a movie's details, in one pass.
+    See https://developer.themoviedb.org/reference/movie-release-dates for the release types
     """
-    safe_title = re.sub(r"\s+", "_", title)
-    safe_title = safe_title.replace("-", "_")
-    safe_title = "".join(c for c in safe_title if c.isalnum() or c == "_")
-    safe_title = safe_title.lower()
-    return safe_title
-
-
-def get_release_date(movie: Dict[str, Any], region: str) -> Optional[date]:
+    index: Dict[str, Dict[int, date]] = {}
+    for region_releases in movie["release_dates"]["results"]:
+        region_dates = index.setdefault(region_releases["iso_3166_1"], {})
+        for release_date in region_releases["release_dates"]:
+            if release_date["type"] in region_dates:
+                continue
+            try:
+                region_dates[release_date["type"]] = date.fromisoformat(release_date["release_date"][:10])
+            except ValueError:
+                pass
+    return index
+
+
+def get_release_date(
+    movie: Dict[str, Any], region: str, index: Optional[Dict[str, Dict[int, date]]] = None
+) -> Optional[date]:
     """
-    Gets the release date for the given region if the details exist, otherwise
+    Gets the theatrical release date for the given region if the details exist, otherwise
     returns the default release_date
     """
-    for region_releases in movie["release_dates"]["results"]:
-        if region_releases["iso_3166_1"] == region:
-            for release_date in region_releases["release_dates"]:
-                # Type 3 is Theatrical release
-                if release_date["type"] == 3:
-                    try:
-                        return date.fromisoformat(release_date["release_date"][:10])
-                    except ValueError:
-                        pass
+    index = index_release_dates(movie) if index is None else index
+    theatrical = index.get(region, {}).get(THEATRICAL_RELEASE)
+    if theatrical is not None:
+        return theatrical
     try:
         return date.fromisoformat(movie["release_date"])
     except ValueError:
         return None
 
 
+def get_regional_release_dates(index: Dict[str, Dict[int, date]], release_date: date) -> Dict[str, date]:
+    """
+    Gets the theatrical release dates in REGIONS that differ from the movie's release_date
+    """
+    regional = {region: index.get(region, {}).get(THEATRICAL_RELEASE) for region in REGIONS}
+    return {region: d for region, d in regional.items() if d is not None and d != release_date}
+
+
 def handle_stale_yaml_path(existing: GoogleMediaEvent, yaml_path: Path) -> None:
     """
     Removes the yaml file if it is stale
@@ -80,41 +101,58 @@ def handle_stale_yaml_path(existing: GoogleMediaEvent, yaml_path: Path) -> None:
     existing.file_path.rename(yaml_path)
 
 
-def make_movie_yamls(dir_path: Path, movies: List[Dict[str, Any]], release_date_gte: date) -> None:
+def get_movie_data(movie: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
-    Makes the movie yamls for each movie from the json data
+    Gets the yaml data of a movie from its json data, with the release dates of every region
+    read from the one payload, or None if it doesn't have a release date
+    """
+    release_dates = index_release_dates(movie)
+    release_date = get_release_date(movie, "US", release_dates)
+    if release_date is None:
+        return None
+    movie_data: Dict[str, Any] = {"title": movie["title"], "release_date": release_date}
+    regional_release_dates = get_regional_release_dates(release_dates, release_date)
+    if regional_release_dates:
+        movie_data["regional_release_dates"] = regional_release_dates
+    movie_data["imdb_id"] = movie["imdb_id"].strip()
+    movie_data["description"] = f"https://www.imdb.com/title/{movie['imdb_id']}\n"
+    return movie_data
+
+
+def make_movie_yamls(
+    dir_path: Path, movies: List[Dict[str, Any]], release_date_gte: date, unchanged_imdb_ids: Collection[str] = ()
+) -> None:
     """
-    existing_movies = YamlCalendar.get_movies(dir_path)
-    untouched_movies = list(existing_movies)
+    Makes the movie yamls for each movie from the json data.  Movies with unchanged_imdb_ids were still
+    found, they just weren't refetched
+    """
+    # Only the hot yaml files are edited here, archived movies are rewritten as yaml if they change again
+    existing_movies = YamlCalendar.get_movies(dir_path, archived=False)
+    untouched_movies = {m.file_path: m for m in existing_movies}
+    existing_index = SearchIndex(existing_movies)
 
     for movie in movies:
         if movie["imdb_id"] is None:
             continue
-        release_date = get_release_date(movie, "US")
-        if release_date is None:
+        movie_data = get_movie_data(movie)
+        if movie_data is None:
             continue
         yaml_path = dir_path / (get_safe_title(movie["title"]) + ".yaml")
-        movie_data = {
-            "title": movie["title"],
-            "release_date": release_date,
-            "imdb_id": movie["imdb_id"].strip(),
-            "description": f"https://www.imdb.com/title/{movie['imdb_id']}\n",
-        }
         if dir_path.stem == "mcu-movies":
             official_link = get_mcu_movie_link(movie)
             if official_link is not None:
                 movie_data["description"] += f"{official_link}\n"
 
-        existing_movie = next((e for e in existing_movies if e.imdb_id == movie_data["imdb_id"]), None)
+        existing_movie = next(iter(existing_index.by_imdb_id(movie_data["imdb_id"])), None)
         if existing_movie:
             handle_stale_yaml_path(existing_movie, yaml_path)
-            untouched_movies.remove(existing_movie)
+            untouched_movies.pop(existing_movie.file_path, None)
 
         with open(yaml_path, "w", encoding="UTF-8") as yaml_file:
             yaml.safe_dump(movie_data, yaml_file, sort_keys=False)
 
-    for untouched_movie in untouched_movies:
-        if untouched_movie.release_date >= release_date_gte:
+    for untouched_movie in untouched_movies.values():
+        if untouched_movie.release_date >= release_date_gte and untouched_movie.imdb_id not in unchanged_imdb_ids:
             # If our query didn't find a movie that was already in the yaml, it probably was canceled
             untouched_movie.file_path.unlink()
 
@@ -161,10 +199,15 @@ def make_show_yamls(dir_path: Path, shows: List[Dict[str, Any]]) -> None:
                 yaml.safe_dump(show_data, yaml_file, sort_keys=False)
 
 
-def get_new_media(release_date_gte: date) -> None:
+# pylint: disable=too-many-locals
+def get_new_media(release_date_gte: date, refresh: bool = False, api: Optional[TmdbApi] = None) -> None:
     """
-    Gets all new media given the query definitions
+    Gets all new media given the query definitions.  A refresh only refetches (and rewrites) the
+    titles that are new or that TMDB says changed since the last refresh
     """
+    api = api or TmdbApi()
+    state = TmdbState() if refresh else None
+    today = date.today()
     movie_queries: Dict[str, Dict[str, Any]] = {
         "mcu-movies": {
             "with_companies": Companies.MARVEL_STUDIOS.value,
@@ -197,25 +240,52 @@ def get_new_media(release_date_gte: date) -> None:
     }
 
     data_dir = Path("data")
-    with create_progress() as progress:
-        task = progress.add_task("Working...", total=len(movie_queries) + len(show_queries))
-
-        for folder, payload in movie_queries.items():
-            movies = get_movies(payload)
-            print(folder, [s["title"] for s in movies])
-            make_movie_yamls(data_dir / folder, movies, release_date_gte)
-            progress.update(task, advance=1)
-
-        for folder, payload in show_queries.items():
-            shows = get_shows(payload)
-            print(folder, [s["name"] for s in shows])
-            make_show_yamls(data_dir / folder, shows)
-            progress.update(task, advance=1)
+    report = reporting.current()
+    changed = None if state is None else state.changed_ids(api, "movie", movie_queries, today)
+    for folder, payload in report.track(movie_queries.items(), "Movies..."):
+        fetch, unchanged = plan_refresh(discover_movies(payload, api), state.tracked(folder) if state else {}, changed)
+        movies = get_movie_details(fetch, api)
+        for movie in movies:
+            report.record("fetch", folder, movie["title"])
+        make_movie_yamls(data_dir / folder, movies, release_date_gte, {i for i in unchanged.values() if i})
+        if state is not None:
+            state.track(folder, {**unchanged, **{m["id"]: m["imdb_id"] for m in movies}})
+
+    changed = None if state is None else state.changed_ids(api, "tv", show_queries, today)
+    for folder, payload in report.track(show_queries.items(), "Shows..."):
+        fetch, unchanged = plan_refresh(discover_shows(payload, api), state.tracked(folder) if state else {}, changed)
+        shows = get_show_details(fetch, payload, api)
+        for show in shows:
+            report.record("fetch", folder, show["name"])
+        make_show_yamls(data_dir / folder, shows)
+        if state is not None:
+            state.track(folder, {**unchanged, **{s["id"]: s["external_ids"]["imdb_id"] for s in shows}})
+
+    if state is not None:
+        state.save(today)
 
 
 if __name__ == "__main__":
     parser = ArgumentParser(description="Update a google calendarwith MCU Release info")
     parser.add_argument("--release_date", type=date.fromisoformat, default=(date.today() - timedelta(weeks=4)))
+    parser.add_argument(
+        "--refresh", action="store_true", help="Only refetch titles that are new or changed since the last refresh"
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=transport.DEFAULT_POOL_MAXSIZE,
+        help="The most connections to keep alive to each host",
+    )
+    reporting.add_arguments(parser)
+    cassette.add_arguments(parser)
     args = parser.parse_args()
 
-    get_new_media(args.release_date)
+    tape = cassette.from_arguments(args)
+    transport.configure(pool_maxsize=args.pool_size, cassette=tape)
+    output = reporting.configure(reporting.OUTPUTS[args.output], args.verbose)
+    get_new_media(args.release_date, args.refresh)
+    output.note(f"HTTP: {transport.stats()}")
+    output.close()
+    if tape is not None and tape.recording:
+        tape.save()
@@ -2,13 +2,32 @@
 This script adds events to a google users calendar for Movies and TV shows defined in ./data/
 """
 
+import os
+import sys
 from argparse import ArgumentParser
+from datetime import date, timedelta
+from functools import partial
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict, List, Optional
 
 import yaml
 
+from mcu_calendar import cassette, reporting, transport
+from mcu_calendar.archive import seal_folder
+from mcu_calendar.catalog import Catalog
+from mcu_calendar.fanout import DEFAULT_SUBSCRIBERS_PATH, fanout_sync, load_subscribers
+from mcu_calendar.feedserver import serve
+from mcu_calendar.gitsync import incremental_sync
 from mcu_calendar.google_service_helper import MockService, create_service
+from mcu_calendar.ics import export_calendar
+from mcu_calendar.releaseindex import open_index
+from mcu_calendar.router import Router, load_calendars
+from mcu_calendar.scheduler import QuotaBudget
+from mcu_calendar.shards import DEFAULT_QUEUE_PATH, run_worker, shard_sync
+from mcu_calendar.streamsync import stream_calendars
+from mcu_calendar.syncstate import SyncState
+from mcu_calendar.validation import validate_folders
+from mcu_calendar.watcher import watch
 from mcu_calendar.yamlcalendar import YamlCalendar
 
 # If modifying these scopes, delete the file token.json.
@@ -45,69 +64,284 @@ def get_cal_ids(dry: bool) -> Dict[str, str]:
     }
 
 
-def main(dry: bool, force: bool) -> None:
+def get_calendars(ids: Dict[str, str], service: Any, rewrite: bool = False) -> Dict[str, YamlCalendar]:
     """
-    Main method that updates the users google calendar
+    Gets every calendar this project maintains from calendars.yaml, keyed by the same keys as get_cal_ids().
+    With rewrite, syncs rewrite every existing event whole instead of patching only what changed
+    """
+    calendars = load_calendars(ids, service)
+    for cal in calendars.values():
+        cal.rewrite = rewrite
+    return calendars
+
+
+def get_service(dry: bool, credentials: Optional[str] = None) -> Any:
+    """
+    Gets the google calendar events service, which doesn't make any changes for a dry run.  It uses
+    the default credentials unless given a credentials file
     """
-    service = create_service(SCOPES)
+    service = create_service(SCOPES, Path(credentials) if credentials else None)
     if dry:
         service = MockService(service)
+    return service
+
 
-    ids = get_cal_ids(dry)
-    data = Path("data")
-    calendars = [
-        YamlCalendar(
-            "MCU",
-            ids["mcu"],
-            [data / "mcu-movies"],
-            [data / "mcu-shows"],
-            service,
-        ),
-        YamlCalendar(
-            "MCU Movies",
-            ids["mcu-movies"],
-            [data / "mcu-movies"],
-            [],
-            service,
-        ),
-        YamlCalendar(
-            "MCU Shows",
-            ids["mcu-shows"],
-            [],
-            [data / "mcu-shows"],
-            service,
-        ),
-        YamlCalendar(
-            "MCU Adjacent Movies",
-            ids["mcu-adjacent"],
-            [data / "mcu-adjacent-movies"],
-            [],
-            service,
-        ),
-        YamlCalendar(
-            "DCEU",
-            ids["dceu"],
-            [data / "dceu-movies"],
-            [],
-            service,
-        ),
-        YamlCalendar(
-            "Starwars",
-            ids["starwars"],
-            [],
-            [data / "starwars-shows"],
-            service,
-        ),
-    ]
-
-    for cal in calendars:
-        cal.create_google_events(force)
+# pylint: disable=too-many-arguments
+def main(
+    dry: bool,
+    force: bool,
+    incremental: bool = False,
+    window_days: Optional[int] = None,
+    full_every: int = 7,
+    stream: bool = False,
+    rewrite: bool = False,
+    budget: Optional[int] = None,
+) -> None:
+    """
+    Main method that updates the users google calendar
+    """
+    calendars = get_calendars(get_cal_ids(dry), get_service(dry), rewrite)
+    if incremental:
+        state = SyncState()
+        for cal in calendars.values():
+            incremental_sync(cal, state, force, record=not dry)
+        return
+    if stream:
+        stream_calendars(calendars.values(), force, SyncState(), window_days, full_every, record=not dry)
+        return
+
+    state = SyncState()
+    # Usage is counted against today's quota even without a budget, so a budget set later knows what's left
+    quota = QuotaBudget(budget, state.quota_used(date.today()))
+    Router(calendars).sync(force, state, window_days, full_every, record=not dry, budget=quota)
+
+
+def export_ics(out_dir: Path, force: bool) -> None:
+    """
+    Exports every calendar to a static .ics feed in out_dir, skipping feeds whose data hasn't changed
+    """
+    # The feeds mirror the public calendars, so always use the public calendar ids
+    calendars = get_calendars(get_cal_ids(dry=True), None)
+    for key, cal in calendars.items():
+        ics_path = out_dir / f"{key}.ics"
+        if export_calendar(cal, ics_path, force):
+            print(f"{cal.name:<20} -> {ics_path}")
+        else:
+            print(f"{cal.name:<20} unchanged")
+
+
+def archive_media(age_days: int) -> None:
+    """
+    Seals every item whose last release was more than age_days ago into its folder's archive segment
+    """
+    catalog = Catalog.for_calendars(get_calendars(get_cal_ids(dry=True), None).values())
+    cutoff = date.today() - timedelta(days=age_days)
+    for folder in catalog.folders():
+        sealed = seal_folder(folder, folder in catalog.movie_dirs, cutoff)
+        print(f"{folder.name:<20} {len(sealed)} sealed")
+
+
+def query(start: date, end: date, folders: List[str], calendar_keys: List[str]) -> None:
+    """
+    Prints every release from start to end, from the persisted release index when the data hasn't changed
+    """
+    calendars = get_calendars(get_cal_ids(dry=True), None)
+    names = set(folders)
+    for key in calendar_keys:
+        names |= {folder.name for folder in [*calendars[key].movie_dirs, *calendars[key].show_dirs]}
+    index = open_index(Catalog.for_calendars(calendars.values()))
+    for release in index.query(start, end, names or None):
+        print(release)
+
+
+def search(text: str, imdb_id: bool, url: bool, limit: int) -> None:
+    """
+    Prints the media matching some title words, or exactly matching an imdb id or a url
+    """
+    catalog = Catalog.for_calendars(get_calendars(get_cal_ids(dry=True), None).values())
+    catalog.load()
+    if imdb_id:
+        items = catalog.search.by_imdb_id(text)
+    elif url:
+        items = catalog.search.by_url(text)
+    else:
+        items = catalog.search.search(text, limit)
+    for item in items:
+        print(f"{item.title:<50} {item.file_path}")
+
+
+def fanout(config_path: Path, dry: bool, force: bool, rewrite: bool) -> None:
+    """
+    Syncs one shared catalog to every subscriber calendar in the subscribers config
+    """
+    subscribers = load_subscribers(lambda credentials: get_service(dry, credentials), config_path)
+    for subscriber in subscribers:
+        subscriber.calendar.rewrite = rewrite
+    fanout_sync(subscribers, force)
+
+
+def load_calendars_for(dry: bool, rewrite: bool) -> Dict[str, YamlCalendar]:
+    """
+    Gets every calendar with its own service, so it can be called in each sharded sync worker
+    """
+    return get_calendars(get_cal_ids(dry), get_service(dry), rewrite)
+
+
+# pylint: disable=too-many-arguments
+def sharded(
+    dry: bool, force: bool, rewrite: bool, workers: int, shards: Optional[int], queue_path: Path, join: bool
+) -> None:
+    """
+    Syncs every calendar across worker processes, or joins a sharded sync started on another machine
+    """
+    calendars_for = partial(load_calendars_for, dry, rewrite)
+    if join:
+        run_worker(queue_path, calendars_for, force)
+    else:
+        shard_sync(calendars_for, workers, shards, force, queue_path)
+
+
+def validate() -> None:
+    """
+    Validates every data folder, printing each problem found and exiting with an error if there are any
+    """
+    catalog = Catalog.for_calendars(get_calendars(get_cal_ids(dry=True), None).values())
+    issues = validate_folders(catalog.movie_dirs, catalog.show_dirs)
+    for issue in issues:
+        print(issue)
+    if issues:
+        sys.exit(1)
+    print("All data is valid")
 
 
 if __name__ == "__main__":
     parser = ArgumentParser(description="Update a google calendarwith MCU Release info")
-    parser.add_argument("--force", action="store_true", help="Force update the existing events")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Check every field of the existing events, not just the ones that mark a change",
+    )
     parser.add_argument("--dry", action="store_true", help="A dry run where nothing is updated")
+    parser.add_argument(
+        "--rewrite",
+        action="store_true",
+        help="Rewrite every existing event whole, instead of patching only the fields that changed",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", help="Only sync files that changed in git since the last sync"
+    )
+    parser.add_argument("--window", type=int, metavar="DAYS", help="Only sync releases from this many days ago onwards")
+    parser.add_argument(
+        "--full-every",
+        type=int,
+        default=7,
+        metavar="DAYS",
+        help="Days between full syncs, which also recheck archived media",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the media and events through the sync instead of loading them all first, for huge catalogs",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        metavar="CALLS",
+        help="The most calendar api calls to make today, across runs.  The most urgent writes go first and the"
+        " rest are left for the next run",
+    )
+    reporting.add_arguments(parser)
+    cassette.add_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command")
+
+    ics_parser = subparsers.add_parser("ics", help="Export every calendar to static .ics feeds")
+    ics_parser.add_argument("--out", type=Path, default=Path("feeds"), help="The folder to write the feeds to")
+
+    serve_parser = subparsers.add_parser("serve", help="Serve every calendar's .ics and json feeds over http")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="The address to listen on")
+    serve_parser.add_argument("--port", type=int, default=8080, help="The port to listen on")
+    serve_parser.add_argument("--reload", type=float, default=5.0, help="Seconds between checks for data changes")
+
+    watch_parser = subparsers.add_parser("watch", help="Sync only the media that changes in ./data/ as it changes")
+    watch_parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls without inotify")
+    watch_parser.add_argument("--debounce", type=float, default=5.0, help="Seconds to wait for changes to settle")
+    archive_parser = subparsers.add_parser("archive", help="Seal long released media into archive segments")
+    archive_parser.add_argument(
+        "--age", type=int, default=365, metavar="DAYS", help="Seal media released more than this many days ago"
+    )
+    subparsers.add_parser("validate", help="Check every yaml file against the schemas and each other")
+    query_parser = subparsers.add_parser("query", help="List the releases in a date range from the release index")
+    query_parser.add_argument("--from", dest="start", type=date.fromisoformat, default=date.today())
+    query_parser.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today() + timedelta(days=30))
+    query_parser.add_argument("--folder", action="append", default=[], help="Only releases from this data folder")
+    query_parser.add_argument(
+        "--calendar", action="append", default=[], help="Only releases from this calendar's folders"
+    )
+    search_parser = subparsers.add_parser("search", help="Find media by title words, imdb id or url")
+    search_parser.add_argument("text", help="Title words (the last may be partial), or an imdb id or url")
+    search_parser.add_argument("--imdb", action="store_true", help="Find the media with this exact imdb id")
+    search_parser.add_argument("--url", action="store_true", help="Find the media with this url in its description")
+    search_parser.add_argument("--limit", type=int, default=10, help="The most title matches to list")
+    fanout_parser = subparsers.add_parser("fanout", help="Sync the catalog to every subscriber calendar")
+    fanout_parser.add_argument(
+        "--config", type=Path, default=DEFAULT_SUBSCRIBERS_PATH, help="The subscribers config to sync"
+    )
+    shard_parser = subparsers.add_parser("shard", help="Sync every calendar across worker processes or machines")
+    shard_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes to start")
+    shard_parser.add_argument(
+        "--shards", type=int, help="Work units to split each calendar into, one per worker by default"
+    )
+    shard_parser.add_argument(
+        "--queue", type=Path, default=DEFAULT_QUEUE_PATH, help="The sqlite file workers claim work units from"
+    )
+    shard_parser.add_argument(
+        "--join", action="store_true", help="Only work on the queue of a sharded sync started somewhere else"
+    )
     args = parser.parse_args()
+    if args.budget is not None and (args.incremental or args.stream):
+        parser.error("--budget only applies to the full sync, not --incremental or --stream")
+    report = reporting.configure(reporting.OUTPUTS[args.output], args.verbose)
+    tape = cassette.from_arguments(args)
+    if tape is not None:
+        transport.configure(cassette=tape)
 
-    main(args.dry, args.force)
+    # Closing flushes what the headless reporter buffered, which matters most when the command failed
+    try:
+        if args.command == "ics":
+            export_ics(args.out, args.force)
+        elif args.command == "serve":
+            serve(get_calendars(get_cal_ids(dry=True), None), args.host, args.port, args.reload)
+        elif args.command == "validate":
+            validate()
+        elif args.command == "query":
+            query(args.start, args.end, args.folder, args.calendar)
+        elif args.command == "search":
+            search(args.text, args.imdb, args.url, args.limit)
+        elif args.command == "fanout":
+            fanout(args.config, args.dry, args.force, args.rewrite)
+        elif args.command == "shard":
+            sharded(args.dry, args.force, args.rewrite, args.workers, args.shards, args.queue, args.join)
+        elif args.command == "archive":
+            archive_media(args.age)
+        elif args.command == "watch":
+            watch(
+                get_calendars(get_cal_ids(args.dry), get_service(args.dry), args.rewrite),
+                args.interval,
+                args.debounce,
+                args.force,
+            )
+        else:
+            main(
+                args.dry,
+                args.force,
+                args.incremental,
+                args.window,
+                args.full_every,
+                args.stream,
+                args.rewrite,
+                args.budget,
+            )
+    finally:
+        report.close()
+    if tape is not None and tape.recording:
+        tape.save()
@@ -0,0 +1,189 @@
+"""
+A sealed archive tier for media that was released long ago.  Old items are compacted out of their
+per file yaml into one pre-validated json segment per data folder, which loads in a single read
+and carries a content hash so syncs can skip diffing it until it changes.  New and upcoming media
+stays in the per file yaml that get_new_media.py edits
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import date
+from hashlib import sha256
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from .events import GoogleMediaEvent, Movie, Show
+
+ARCHIVE_FOLDER_NAME = "archive"
+
+# Bump this whenever the segment layout changes
+SEGMENT_VERSION = 1
+
+
+def segment_path(folder: Path) -> Path:
+    """
+    Gets the path of the archive segment for a data folder, e.g. data/archive/mcu-movies.json
+    """
+    return folder.parent / ARCHIVE_FOLDER_NAME / f"{folder.name}.json"
+
+
+class ArchiveSegment(NamedTuple):
+    """
+    The sealed items of a single data folder, keyed by the yaml file each was sealed from
+    """
+
+    folder: Path
+    content_hash: str
+    items: Dict[Path, GoogleMediaEvent]
+
+    def merged(self, hot_items: Iterable[GoogleMediaEvent]) -> List[GoogleMediaEvent]:
+        """
+        Gets the sealed and hot items together, sorted by file name.  A hot yaml file overrides the sealed
+        item with the same name, so an item can be unsealed just by writing its yaml file again
+        """
+        items = dict(self.items)
+        items.update((i.file_path, i) for i in hot_items)
+        return [item for _, item in sorted(items.items())]
+
+
+def _to_record(item: GoogleMediaEvent) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"file": item.file_path.name, "title": item.title}
+    if isinstance(item, Movie):
+        record["release_date"] = item.release_date.isoformat()
+        if item.regional_release_dates:
+            record["regional_release_dates"] = {r: d.isoformat() for r, d in item.regional_release_dates.items()}
+    elif isinstance(item, Show):
+        record["release_dates"] = [d.isoformat() for d in item.release_dates]
+    else:
+        raise TypeError(f"Can't archive {type(item).__name__} {item.title}")
+    record["description"] = item.description
+    if item.imdb_id:
+        record["imdb_id"] = item.imdb_id
+    return record
+
+
+def _from_record(kind: str, folder: Path, record: Dict[str, Any]) -> GoogleMediaEvent:
+    file_path = folder / record["file"]
+    imdb_id = record.get("imdb_id")
+    if kind == "movie":
+        release_date = date.fromisoformat(record["release_date"])
+        regional = {r: date.fromisoformat(d) for r, d in record.get("regional_release_dates", {}).items()}
+        return Movie(record["title"], record["description"], release_date, file_path, imdb_id, regional)
+    release_dates = [date.fromisoformat(d) for d in record["release_dates"]]
+    return Show(record["title"], release_dates, record["description"], file_path, imdb_id)
+
+
+def _validated_record(kind: str, item: GoogleMediaEvent) -> Dict[str, Any]:
+    """
+    Gets the record to seal an item as, checking it now so it never has to be checked on load
+    """
+    if not isinstance(item.title, str) or not item.title:
+        raise ValueError(f"{item.file_path}: title must be a non-empty string")
+    if not isinstance(item.description, str):
+        raise ValueError(f"{item.file_path}: description must be a string")
+    dates = (
+        [item.release_date, *item.regional_release_dates.values()]
+        if isinstance(item, Movie)
+        else getattr(item, "release_dates", [])
+    )
+    if not dates or not all(isinstance(d, date) for d in dates):
+        raise ValueError(f"{item.file_path}: release dates must be dates")
+
+    record = _to_record(item)
+    if _from_record(kind, item.file_path.parent, record) != item:
+        raise ValueError(f"{item.file_path}: doesn't survive being sealed")
+    return record
+
+
+def _content_hash(kind: str, records: Sequence[Dict[str, Any]]) -> str:
+    canonical = json.dumps({"kind": kind, "items": records}, sort_keys=True, separators=(",", ":"))
+    return sha256(canonical.encode("UTF-8")).hexdigest()
+
+
+def load_segment(folder: Path) -> Optional[ArchiveSegment]:
+    """
+    Loads the archive segment of a data folder in one read, or None if nothing in it has been sealed.
+    Segments were validated when they were sealed, so they're only validated again if they changed since
+    """
+    path = segment_path(folder)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="UTF-8") as segment_file:
+        return parse_segment(folder, segment_file.read())
+
+
+def parse_segment(folder: Path, content: str) -> ArchiveSegment:
+    """
+    Parses the content of a folder's archive segment.  The content hash is worked out from the items
+    rather than trusted, so a segment edited by hand since it was sealed is validated like sealing would
+    and gets a new hash, which makes syncs diff it again
+    """
+    segment = json.loads(content)
+    if segment.get("version") != SEGMENT_VERSION:
+        raise ValueError(f"{segment_path(folder)}: unsupported archive segment version {segment.get('version')}")
+    kind = segment["kind"]
+    items = [_from_record(kind, folder, record) for record in segment["items"]]
+    content_hash = _content_hash(kind, sorted((_to_record(item) for item in items), key=lambda r: r["file"]))
+    if content_hash != segment["hash"]:
+        for item in items:
+            _validated_record(kind, item)
+    return ArchiveSegment(folder, content_hash, {item.file_path: item for item in items})
+
+
+def write_segment(folder: Path, kind: str, records: Iterable[Dict[str, Any]]) -> str:
+    """
+    Writes a folder's archive segment, replacing the old one only once the new one is complete.
+    Returns the segment's content hash
+    """
+    records = sorted(records, key=lambda r: r["file"])
+    content_hash = _content_hash(kind, records)
+    path = segment_path(folder)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="UTF-8") as segment_file:
+        json.dump(
+            {"version": SEGMENT_VERSION, "kind": kind, "hash": content_hash, "items": records},
+            segment_file,
+            indent=1,
+            ensure_ascii=False,
+        )
+        segment_file.write("\n")
+    tmp_path.replace(path)
+    return content_hash
+
+
+def seal_folder(folder: Path, is_movie: bool, cutoff: date) -> List[Path]:
+    """
+    Moves every item in the folder whose last release was before the cutoff out of its yaml (and .patch)
+    file and into the folder's archive segment.  Returns the yaml files that were sealed
+    """
+    kind = "movie" if is_movie else "show"
+    segment = load_segment(folder)
+    records = {} if segment is None else {p.name: _to_record(i) for p, i in segment.items.items()}
+
+    sealed = []
+    for path in sorted(folder.glob("*.yaml")):
+        item = Movie.from_yaml(path) if is_movie else Show.from_yaml(path)
+        if item.last_release_date() < cutoff:
+            records[path.name] = _validated_record(kind, item)
+            sealed.append(path)
+    if not sealed:
+        return []
+
+    write_segment(folder, kind, records.values())
+    for path in sealed:
+        path.unlink()
+        path.with_suffix(".patch").unlink(missing_ok=True)
+    return sealed
+
+
+def archive_hash(segments: Iterable[Optional[ArchiveSegment]], salt: str = "") -> Optional[str]:
+    """
+    Gets one hash for a set of segments (and anything else, like a calendar's filter, that decides
+    what is synced from them), or None if none of them exist
+    """
+    hashes = sorted(f"{s.folder.name}:{s.content_hash}" for s in segments if s is not None)
+    if not hashes:
+        return None
+    return sha256("\n".join([salt, *hashes]).encode("UTF-8")).hexdigest()
@@ -0,0 +1,298 @@
+"""
+Record and replay of every outbound http call, for timing the sync and scrape pipelines on hosts
+without google or TMDB access.  Recording captures each request's response and how long it took
+into a cassette file, and replaying answers the same requests from the cassette without touching
+the network, either at the recorded latencies or with no latency at all.  Install a cassette with
+transport.configure(cassette=...), see benchmarks/pipeline_benchmark.py
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from collections import defaultdict, deque
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httplib2
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .transport import KeepAliveAdapter, Timeout
+
+# Bump this whenever the cassette layout changes
+CASSETTE_VERSION = 1
+
+# Query parameters that are credentials, which are never written to a cassette or used to match requests
+SECRET_PARAMS = {"api_key", "key", "access_token"}
+
+# Response headers that are kept, the rest (cookies, dates, tracing) would only make cassettes differ.
+# Content is recorded already decoded, so its content-encoding is never kept
+KEPT_HEADERS = {"content-type", "location"}
+
+
+class CassetteMiss(LookupError):
+    """
+    A replayed request that was never recorded
+    """
+
+
+class Interaction(NamedTuple):
+    """
+    A recorded response, and how long the request took in seconds
+    """
+
+    status: int
+    reason: str
+    headers: Dict[str, str]
+    content: bytes
+    latency: float
+
+
+def request_key(method: str, uri: str, body: Union[None, str, bytes] = None) -> str:
+    """
+    Gets what a request is matched by: its method, its uri without credentials and with its query
+    sorted, and a digest of its body
+    """
+    parts = urlsplit(uri)
+    query = urlencode(
+        sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS)
+    )
+    key = f"{method.upper()} {urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))}"
+    if body:
+        data = body.encode("UTF-8") if isinstance(body, str) else body
+        key += f" {hashlib.sha256(data).hexdigest()[:16]}"
+    return key
+
+
+class Cassette:
+    """
+    The responses to a run's requests, in the order they were made.  A request made more than once
+    replays each of its responses in turn, then keeps replaying the last.  Latencies are scaled by
+    speed when replaying, so 1 is the recorded latency and 0 is none
+    """
+
+    def __init__(self, path: Path, record: bool = False, speed: float = 1.0) -> None:
+        self.path = path
+        self.recording = record
+        self.speed = speed
+        self.interactions: Dict[str, List[Interaction]] = defaultdict(list)
+        self.replayed = 0
+        self._queues: Dict[str, Deque[Interaction]] = {}
+        self._lock = threading.Lock()
+        if not record:
+            self.load()
+
+    def __enter__(self) -> Cassette:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        if self.recording:
+            self.save()
+
+    def __len__(self) -> int:
+        return sum(len(i) for i in self.interactions.values())
+
+    def record(self, key: str, interaction: Interaction) -> None:
+        """
+        Adds a response to the cassette
+        """
+        with self._lock:
+            self.interactions[key].append(interaction)
+
+    def play(self, key: str) -> Interaction:
+        """
+        Gets the next response to a request, after waiting out its (scaled) latency
+        """
+        with self._lock:
+            if key not in self._queues:
+                if key not in self.interactions:
+                    raise CassetteMiss(f"{key} was not recorded in {self.path}")
+                self._queues[key] = deque(self.interactions[key])
+            queue = self._queues[key]
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+            self.replayed += 1
+        if self.speed > 0:
+            time.sleep(interaction.latency * self.speed)
+        return interaction
+
+    def rewind(self) -> None:
+        """
+        Starts replaying every request's responses from the first again
+        """
+        with self._lock:
+            self._queues = {}
+            self.replayed = 0
+
+    def save(self) -> None:
+        """
+        Writes the cassette, replacing the old one only once the new one is complete
+        """
+        interactions = [
+            {
+                "request": key,
+                "status": i.status,
+                "reason": i.reason,
+                "headers": i.headers,
+                "content": base64.b64encode(i.content).decode("ascii"),
+                "latency": round(i.latency, 6),
+            }
+            for key, recorded in sorted(self.interactions.items())
+            for i in recorded
+        ]
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="UTF-8") as cassette_file:
+            json.dump({"version": CASSETTE_VERSION, "interactions": interactions}, cassette_file, indent=1)
+        tmp_path.replace(self.path)
+
+    def load(self) -> None:
+        """
+        Reads the cassette's recorded responses
+        """
+        with open(self.path, "r", encoding="UTF-8") as cassette_file:
+            cassette = json.load(cassette_file)
+        if cassette.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"{self.path} is not a version {CASSETTE_VERSION} cassette")
+        self.interactions = defaultdict(list)
+        for i in cassette["interactions"]:
+            self.interactions[i["request"]].append(
+                Interaction(i["status"], i["reason"], i["headers"], base64.b64decode(i["content"]), i["latency"])
+            )
+        self.rewind()
+
+
+def _kept_headers(headers: Mapping[str, Any]) -> Dict[str, str]:
+    return {k.lower(): str(v) for k, v in headers.items() if k.lower() in KEPT_HEADERS}
+
+
+class CassetteAdapter(KeepAliveAdapter):
+    """
+    A requests adapter that records each response into a cassette, or answers from it without sending anything
+    """
+
+    def __init__(self, cassette: Cassette, pool_connections: int, pool_maxsize: int, timeout: Timeout) -> None:
+        super().__init__(pool_connections, pool_maxsize, timeout)
+        self.cassette = cassette
+
+    # pylint: disable=too-many-arguments
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Timeout = None,
+        verify: Union[bool, str] = True,
+        cert: Union[None, bytes, str, Tuple[Union[bytes, str], Union[bytes, str]]] = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        key = request_key(request.method or "GET", request.url or "", request.body)
+        if not self.cassette.recording:
+            return self._replay(request, self.cassette.play(key))
+
+        start = time.perf_counter()
+        response = super().send(request, stream, timeout, verify, cert, proxies)
+        # Reading the content here keeps the transfer time in the latency, and lets it be replayed later
+        content = response.content
+        self.cassette.record(
+            key,
+            Interaction(
+                response.status_code,
+                response.reason or "",
+                _kept_headers(response.headers),
+                content,
+                time.perf_counter() - start,
+            ),
+        )
+        return response
+
+    @staticmethod
+    def _replay(request: requests.PreparedRequest, interaction: Interaction) -> requests.Response:
+        response = requests.Response()
+        response.status_code = interaction.status
+        response.reason = interaction.reason
+        response.headers = CaseInsensitiveDict(interaction.headers)
+        response._content = interaction.content  # pylint: disable=protected-access
+        response.url = request.url or ""
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+
+class CassetteHttp(httplib2.Http):
+    """
+    An httplib2 object (what the google api client sends through) that records each response into a
+    cassette, or answers from it without sending anything
+    """
+
+    def __init__(self, cassette: Cassette, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    # pylint: disable=too-many-arguments
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Union[None, str, bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        redirections: int = httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type: Any = None,
+    ) -> Tuple[httplib2.Response, bytes]:
+        key = request_key(method, uri, body)
+        if not self.cassette.recording:
+            interaction = self.cassette.play(key)
+            response = httplib2.Response({"status": str(interaction.status), **interaction.headers})
+            response.reason = interaction.reason
+            return response, interaction.content
+
+        start = time.perf_counter()
+        response, content = super().request(uri, method, body, headers, redirections, connection_type)
+        self.cassette.record(
+            key,
+            Interaction(
+                response.status, response.reason or "", _kept_headers(response), content, time.perf_counter() - start
+            ),
+        )
+        return response, content
+
+
+def add_arguments(parser: ArgumentParser) -> None:
+    """
+    Adds the --record, --replay and --zero-latency options, see from_arguments()
+    """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--record", type=Path, metavar="CASSETTE", help="Record every http call to a cassette")
+    group.add_argument("--replay", type=Path, metavar="CASSETTE", help="Answer every http call from a cassette")
+    parser.add_argument("--zero-latency", action="store_true", help="Replay without the recorded latencies")
+
+
+def from_arguments(args: Namespace) -> Optional[Cassette]:
+    """
+    Gets the cassette the options of add_arguments() asked for, if any
+    """
+    if args.record is not None:
+        return Cassette(args.record, record=True)
+    if args.replay is not None:
+        return Cassette(args.replay, speed=0.0 if args.zero_latency else 1.0)
+    return None
@@ -0,0 +1,244 @@
+"""
+An in-memory catalog of every media event defined in the data folders, that can be
+kept warm and refreshed one file at a time as the yaml changes
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .archive import ArchiveSegment, archive_hash, load_segment, segment_path
+from .events import GoogleMediaEvent, Movie, Show
+from .search import SearchIndex
+from .validation import validate_or_raise
+from .yamlcalendar import DataLoadError, YamlCalendar
+
+FileStamp = Tuple[int, int]
+
+
+class CatalogChanges(NamedTuple):
+    """
+    The files that changed in the catalog since the last refresh
+    """
+
+    updated: List[Path]
+    removed: List[GoogleMediaEvent]
+
+    def __bool__(self) -> bool:
+        return bool(self.updated or self.removed)
+
+    def folders(self) -> List[Path]:
+        """
+        Gets every data folder touched by these changes
+        """
+        return sorted({p.parent for p in self.updated} | {i.file_path.parent for i in self.removed})
+
+    def merge(self, other: CatalogChanges) -> CatalogChanges:
+        """
+        Combines these changes with ones made after them
+        """
+        return CatalogChanges(sorted({*self.updated, *other.updated}), [*self.removed, *other.removed])
+
+
+def _stamp(path: Path) -> FileStamp:
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Catalog:
+    """
+    Every Movie and Show from a set of data folders, keyed by the yaml file that defines it
+    """
+
+    def __init__(self, movie_dirs: Iterable[Path], show_dirs: Iterable[Path]) -> None:
+        self.movie_dirs = sorted(set(movie_dirs))
+        self.show_dirs = sorted(set(show_dirs))
+        self.items: Dict[Path, GoogleMediaEvent] = {}
+        self.segments: Dict[Path, ArchiveSegment] = {}
+        self._stamps: Dict[Path, FileStamp] = {}
+        # Kept in step with items, so lookups by title words, imdb id or url never scan the catalog
+        self.search = SearchIndex()
+
+    @staticmethod
+    def for_calendars(calendars: Iterable[YamlCalendar]) -> Catalog:
+        """
+        Creates a catalog that covers every folder used by the given calendars
+        """
+        calendars = list(calendars)
+        return Catalog(
+            [d for cal in calendars for d in cal.movie_dirs],
+            [d for cal in calendars for d in cal.show_dirs],
+        )
+
+    def scan(self) -> Dict[Path, FileStamp]:
+        """
+        Gets the modification stamp of every yaml file and archive segment, with a .patch file folded
+        into its yaml file's stamp
+        """
+        stamps = {}
+        for folder in self.folders():
+            if segment_path(folder).exists():
+                stamps[segment_path(folder)] = _stamp(segment_path(folder))
+            for path in folder.glob("*.yaml"):
+                stamp = _stamp(path)
+                patch_path = path.with_suffix(".patch")
+                if patch_path.exists():
+                    patch_stamp = _stamp(patch_path)
+                    stamp = (max(stamp[0], patch_stamp[0]), stamp[1] + patch_stamp[1])
+                stamps[path] = stamp
+        return stamps
+
+    def load(self) -> None:
+        """
+        Validates and then loads every file in the catalog's folders, raising a CatalogValidationError
+        with every problem in the data if it isn't valid.  Each file is only parsed once, for both
+        """
+        parsed: Dict[Path, Any] = {}
+        for folder in self.folders():
+            parsed.update(YamlCalendar.get_data(folder))
+        validate_or_raise(self.movie_dirs, self.show_dirs, parsed)
+        self._stamps = self.scan()
+        self.items = {}
+        self.segments = {}
+        for folder in self.folders():
+            segment = load_segment(folder)
+            if segment is not None:
+                self.segments[folder] = segment
+                self.items.update(segment.items)
+        errors: List[Tuple[Path, Exception]] = []
+        for path, data in parsed.items():
+            try:
+                self.items[path] = self._from_data(path, data)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                errors.append((path, error))
+        if errors:
+            raise DataLoadError(errors)
+        self.search = SearchIndex(self.items.values())
+
+    def _from_data(self, path: Path, data: Dict[str, Any]) -> GoogleMediaEvent:
+        if path.parent in self.movie_dirs:
+            return Movie(**data, file_path=path)
+        return Show(**data, file_path=path)
+
+    def _load_file(self, path: Path) -> GoogleMediaEvent:
+        return self._from_data(path, GoogleMediaEvent.load_yaml(path))
+
+    def _sealed_item(self, path: Path) -> Optional[GoogleMediaEvent]:
+        segment = self.segments.get(path.parent)
+        return None if segment is None else segment.items.get(path)
+
+    def _refresh_segment(
+        self, folder: Path, hot_paths: Set[Path], previous: Dict[Path, GoogleMediaEvent]
+    ) -> List[Path]:
+        """
+        Reloads a folder's archive segment, returning the paths of the sealed items that changed
+        """
+        old_segment = self.segments.pop(folder, None)
+        segment = load_segment(folder)
+        if segment is not None:
+            self.segments[folder] = segment
+        new_items = {} if segment is None else segment.items
+
+        updated = []
+        for path in sorted({*(old_segment.items if old_segment else {}), *new_items}):
+            if path in hot_paths:
+                continue
+            item = new_items.get(path)
+            if item is None:
+                self.items.pop(path, None)
+                continue
+            self.items[path] = item
+            before = previous.get(path)
+            if before is None or before != item or before.title != item.title:
+                updated.append(path)
+        return updated
+
+    def refresh(self) -> CatalogChanges:
+        """
+        Reloads only the files that were added, changed or removed since the last load or refresh.
+        A changed archive segment is reloaded in one read, and only its items that actually changed
+        count as updated.  The folders with changed yaml files are validated the same way load() does
+        first, so data that doesn't pass raises a CatalogValidationError and leaves the catalog as it was
+        """
+        stamps = self.scan()
+        changed = sorted(p for p, stamp in stamps.items() if self._stamps.get(p) != stamp)
+        changed_folders = {p.parent for p in changed if p.suffix == ".yaml"}
+        if changed_folders:
+            validate_or_raise(
+                [f for f in self.movie_dirs if f in changed_folders],
+                [f for f in self.show_dirs if f in changed_folders],
+            )
+        gone = sorted(set(self._stamps) - set(stamps))
+        previous = dict(self.items)
+        updated: List[Path] = []
+
+        hot_paths = {p for p in stamps if p.suffix == ".yaml"}
+        for folder in self.folders():
+            if segment_path(folder) in changed or segment_path(folder) in gone:
+                updated += self._refresh_segment(folder, hot_paths, previous)
+
+        for path in gone:
+            if path.suffix == ".yaml":
+                # A yaml file that was sealed away lives on in its archive segment
+                sealed = self._sealed_item(path)
+                if sealed is None:
+                    self.items.pop(path, None)
+                else:
+                    self.items[path] = sealed
+        for path in changed:
+            if path.suffix == ".yaml":
+                self.items[path] = self._load_file(path)
+                updated.append(path)
+
+        removed = [item for path, item in previous.items() if path not in self.items]
+        for path in updated:
+            # Events are matched by title, so a renamed item's old event is gone too
+            if path in previous and previous[path].title != self.items[path].title:
+                removed.append(previous[path])
+        self._stamps = stamps
+        self.search.update(
+            (self.items[p] for p in set(updated)), (i.file_path for i in removed if i.file_path not in self.items)
+        )
+        return CatalogChanges(sorted(set(updated)), removed)
+
+    def has_changes(self) -> bool:
+        """
+        Checks if any file was added, changed or removed since the last load or refresh, without loading it
+        """
+        return self.scan() != self._stamps
+
+    def folders(self) -> List[Path]:
+        """
+        Gets every folder in the catalog
+        """
+        return [*self.movie_dirs, *self.show_dirs]
+
+    def items_in(self, folders: Iterable[Path]) -> List[GoogleMediaEvent]:
+        """
+        Gets every item defined in the given folders, in file order
+        """
+        folders = set(folders)
+        return [item for path, item in sorted(self.items.items()) if path.parent in folders]
+
+    def sealed_items(self, folders: Iterable[Path]) -> List[GoogleMediaEvent]:
+        """
+        Gets every archived item in the given folders that isn't overridden by a hot yaml file
+        """
+        segments = [self.segments[f] for f in folders if f in self.segments]
+        return [item for segment in segments for path, item in segment.items.items() if self.items.get(path) is item]
+
+    def archive_hash(self, calendar: YamlCalendar) -> Optional[str]:
+        """
+        Gets a hash of everything archived that goes into a calendar, or None if nothing is archived
+        """
+        folders = [*calendar.movie_dirs, *calendar.show_dirs]
+        salt = repr(calendar.item_filter) if calendar.region is None else f"{calendar.item_filter!r} {calendar.region}"
+        return archive_hash((self.segments.get(f) for f in folders), salt)
+
+    def calendar_items(self, calendar: YamlCalendar) -> List[GoogleMediaEvent]:
+        """
+        Gets every item that belongs on the given calendar, movies first then shows like YamlCalendar.iter_items()
+        """
+        items = [*self.items_in(calendar.movie_dirs), *self.items_in(calendar.show_dirs)]
+        return [calendar.localize(i) for i in items if calendar.includes(i)]
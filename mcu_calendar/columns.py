@@ -0,0 +1,150 @@
+"""
+A columnar view of a catalog, for asking bulk questions about release dates without looping over
+every Movie and Show.  Each item is a row in parallel numpy arrays, and every release date of every
+row is packed into one datetime64 array, with each row's dates found between its offsets (like a
+CSR matrix).  See benchmarks/columns_benchmark.py for how it compares to the object path.
+
+Nothing in the sync or query paths uses it yet, only the benchmark and tests do: syncs still filter
+Movie and Show objects, `main.py query` reads the release index, and what changed since the last run
+comes from Catalog.refresh()'s file stamps rather than a column here
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .events import GoogleMediaEvent, Movie, Show
+
+KIND_MOVIE = 0
+KIND_SHOW = 1
+
+# The schedules encode_recurrence can pick for a row's dates, in the order it prefers them
+SCHEDULE_SINGLE = 0
+SCHEDULE_WEEKLY = 1
+SCHEDULE_DAILY = 2
+SCHEDULE_WEEKLY_EXCEPTIONS = 3
+SCHEDULE_DAILY_EXCEPTIONS = 4
+SCHEDULE_DATES = 5
+
+
+def _day(value: date) -> np.datetime64:
+    return np.datetime64(value.isoformat(), "D")
+
+
+def classify_recurrence(recurrence: Optional[List[str]]) -> int:
+    """
+    Gets which schedule a recurrence from encode_recurrence is, the slow way round
+    """
+    if not recurrence:
+        return SCHEDULE_SINGLE
+    if recurrence[0].startswith("RDATE"):
+        return SCHEDULE_DATES
+    weekly = "FREQ=WEEKLY" in recurrence[0]
+    if len(recurrence) == 1:
+        return SCHEDULE_WEEKLY if weekly else SCHEDULE_DAILY
+    return SCHEDULE_WEEKLY_EXCEPTIONS if weekly else SCHEDULE_DAILY_EXCEPTIONS
+
+
+def _sum_by_row(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Sums the values that belong to each row.  Prefix sums are used rather than np.add.reduceat,
+    which doesn't handle empty rows
+    """
+    sums = np.concatenate(([0], np.cumsum(values, dtype=np.int64)))
+    return sums[offsets[1:]] - sums[offsets[:-1]]
+
+
+class CatalogColumns:
+    """
+    Parallel arrays over a list of items: which title, kind and imdb id each row is, and all of its
+    (sorted, distinct) release dates
+    """
+
+    def __init__(self, items: Iterable[GoogleMediaEvent], region: Optional[str] = None) -> None:
+        self.items = [item.for_region(region) for item in items]
+        title_index: Dict[str, int] = {}
+        dates: List[date] = []
+        lengths = []
+        for item in self.items:
+            title_index.setdefault(item.title, len(title_index))
+            item_dates = sorted(set(item.release_dates)) if isinstance(item, Show) else [item.last_release_date()]
+            dates += item_dates
+            lengths.append(len(item_dates))
+
+        self.titles = list(title_index)
+        self.title_index = np.array([title_index[i.title] for i in self.items], dtype=np.int32)
+        self.kind = np.array([KIND_MOVIE if isinstance(i, Movie) else KIND_SHOW for i in self.items], dtype=np.int8)
+        self.imdb_ids = np.array([i.imdb_id or "" for i in self.items], dtype=str)
+        self.dates = np.array(dates, dtype="datetime64[D]")
+        self.offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def lengths(self) -> np.ndarray:
+        """
+        Gets how many release dates each row has
+        """
+        return np.diff(self.offsets)
+
+    def first_dates(self) -> np.ndarray:
+        """
+        Gets each row's first release date
+        """
+        return self.dates[self.offsets[:-1]]
+
+    def last_dates(self) -> np.ndarray:
+        """
+        Gets each row's last release date
+        """
+        return self.dates[self.offsets[1:] - 1]
+
+    def in_window(self, window_start: Optional[date]) -> np.ndarray:
+        """
+        Gets a mask of the rows with any release on or after the start of a sync window,
+        like YamlCalendar.in_window()
+        """
+        if window_start is None:
+            return np.ones(len(self), dtype=bool)
+        return self.last_dates() >= _day(window_start)
+
+    def releasing_between(self, start: date, end: date) -> np.ndarray:
+        """
+        Gets a mask of the rows with any release from start to end, inclusive
+        """
+        hits = (self.dates >= _day(start)) & (self.dates <= _day(end))
+        return _sum_by_row(hits, self.offsets) > 0
+
+    def schedules(self) -> np.ndarray:
+        """
+        Gets which schedule encode_recurrence would pick for each row (one of the SCHEDULE_ values),
+        by counting how many dates sit on a weekly and a daily grid from each row's first date
+        """
+        lengths = self.lengths()
+        first = self.first_dates()
+        span = (self.last_dates() - first).astype(np.int64)
+        days_in = (self.dates - np.repeat(first, lengths)).astype(np.int64)
+
+        # Dates are distinct, so every date not on a grid is an RDATE and every grid day without a date is an EXDATE
+        on_weekly = _sum_by_row(days_in % 7 == 0, self.offsets)
+        weekly_cost = (lengths - on_weekly) + (span // 7 + 1 - on_weekly)
+        daily_cost = span + 1 - lengths
+
+        # Listing every date after the first as an RDATE always works, so a rule has to cost less than that
+        dates_cost = lengths - 1
+        irregular = np.where(weekly_cost < dates_cost, SCHEDULE_WEEKLY_EXCEPTIONS, SCHEDULE_DATES)
+        irregular = np.where(daily_cost < np.minimum(weekly_cost, dates_cost), SCHEDULE_DAILY_EXCEPTIONS, irregular)
+        return np.select(
+            [lengths <= 1, weekly_cost == 0, daily_cost == 0],
+            [SCHEDULE_SINGLE, SCHEDULE_WEEKLY, SCHEDULE_DAILY],
+            irregular,
+        ).astype(np.int8)
+
+    def select(self, mask: np.ndarray) -> List[GoogleMediaEvent]:
+        """
+        Gets the items of the rows in a mask
+        """
+        return [self.items[row] for row in np.flatnonzero(mask)]
@@ -13,6 +13,18 @@ from typing import Any, Dict, List
 import yaml
 
 from .helpers import truncate
+from .recurrence import encode_recurrence
+
+# The libyaml backed loader is several times faster than the pure python one, but isn't always installed
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def imdb_id_from_description(description: str) -> str | None:
+    """
+    Gets the imdb id out of the imdb link in a description, if it has one
+    """
+    matches = re_search("https://www.imdb.com/title/(.*)", description)
+    return matches.group(1).strip() if matches else None
 
 
 class GoogleMediaEvent(ABC):
@@ -25,17 +37,20 @@ class GoogleMediaEvent(ABC):
         self.description = description
         self.imdb_id = imdb_id
         self.file_path = file_path
+        self._google_event: Dict[str, Any] | None = None
 
         if not self.imdb_id:
-            matches = re_search("https://www.imdb.com/title/(.*)", self.description)
-            if matches:
-                self.imdb_id = matches.group(1).strip()
+            self.imdb_id = imdb_id_from_description(self.description)
 
     def to_google_event(self) -> Dict[str, Any]:
         """
-        Converts this object to a google calendar api event
+        Converts this object to a google calendar api event.  This is built once and shared by every
+        calendar the item is synced to, so callers must not modify it
         https://developers.google.com/calendar/v3/reference/events#resource
         """
+        if self._google_event is not None:
+            return self._google_event
+
         base_event = {
             "summary": self.title,
             "description": self.description,
@@ -45,7 +60,19 @@ class GoogleMediaEvent(ABC):
             },
             "transparency": "transparent",  # "transparent" means "Show me as Available "
         }
-        return {**base_event, **self._to_google_event_core()}
+        self._google_event = {**base_event, **self._to_google_event_core()}
+        return self._google_event
+
+    def changed_fields(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gets the fields of this item's google event that differ from an event on the calendar, to patch it
+        with.  Fields google leaves out of events when they're empty are unchanged if they're empty here too
+        """
+        return {
+            key: value
+            for key, value in self.to_google_event().items()
+            if value != event.get(key) and (value or key in event)
+        }
 
     @staticmethod
     def load_yaml(yaml_path: Path) -> Dict[str, Any]:
@@ -53,11 +80,11 @@ class GoogleMediaEvent(ABC):
         Factory method to create a Show object from yaml
         """
         with open(yaml_path, "r", encoding="UTF-8") as yaml_file:
-            yaml_data = yaml.safe_load(yaml_file)
+            yaml_data = yaml.load(yaml_file, Loader=YamlLoader)  # nosec B506 - this is always a safe loader
         patch_path = yaml_path.with_suffix(".patch")
         if patch_path.exists():
             with open(patch_path, "r", encoding="UTF-8") as yaml_file:
-                yaml_data = yaml_data | yaml.safe_load(yaml_file)
+                yaml_data = yaml_data | yaml.load(yaml_file, Loader=YamlLoader)  # nosec B506
         return yaml_data
 
     @abstractmethod
@@ -73,6 +100,20 @@ class GoogleMediaEvent(ABC):
         Gets the value that this object should be sorted by
         """
 
+    def last_release_date(self) -> Any:
+        """
+        Gets the last date this media has a release on
+        """
+        return self.sort_val()
+
+    # pylint: disable=unused-argument
+    def for_region(self, region: str | None) -> GoogleMediaEvent:
+        """
+        Gets this media as it releases in a region (an ISO 3166-1 code like "GB").  Media without
+        regional dates releases the same everywhere
+        """
+        return self
+
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, GoogleMediaEvent):
             return self.description == other.description
@@ -89,10 +130,19 @@ class Movie(GoogleMediaEvent):
 
     # pylint: disable=too-many-arguments
     def __init__(
-        self, title: str, description: str, release_date: date, file_path: Path, imdb_id: str | None = None
+        self,
+        title: str,
+        description: str,
+        release_date: date,
+        file_path: Path,
+        imdb_id: str | None = None,
+        regional_release_dates: Dict[str, date] | None = None,
     ) -> None:
         super().__init__(title, description, file_path, imdb_id)
         self.release_date = release_date
+        # The release dates in other regions, where they differ from release_date
+        self.regional_release_dates = regional_release_dates or {}
+        self._regional: Dict[str, Movie] = {}
 
     @staticmethod
     def from_yaml(yaml_path: Path) -> Movie:
@@ -111,11 +161,26 @@ class Movie(GoogleMediaEvent):
     def sort_val(self) -> Any:
         return self.release_date
 
+    def for_region(self, region: str | None) -> Movie:
+        if region is None or self.regional_release_dates.get(region, self.release_date) == self.release_date:
+            return self
+        # Kept so each region's google event is only built once too
+        if region not in self._regional:
+            release_date = self.regional_release_dates[region]
+            self._regional[region] = Movie(
+                self.title, self.description, release_date, self.file_path, self.imdb_id, self.regional_release_dates
+            )
+        return self._regional[region]
+
     def __eq__(self, other: Any) -> bool:
         if not super().__eq__(other):
             return False
         if isinstance(other, Movie):
-            return self.title == other.title and self.release_date == other.release_date
+            return (
+                self.title == other.title
+                and self.release_date == other.release_date
+                and self.regional_release_dates == other.regional_release_dates
+            )
         event = self.to_google_event()
         return (
             event.get("summary") == other.get("summary")
@@ -148,37 +213,19 @@ class Show(GoogleMediaEvent):
         yaml_data = GoogleMediaEvent.load_yaml(yaml_path)
         return Show(**yaml_data, file_path=yaml_path)
 
-    def _rfc5545_weekday(self) -> str:
-        _recurrence_weekday = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
-        return _recurrence_weekday[self.start_date.weekday()]
-
     def _to_google_event_core(self) -> Dict[str, Any]:
-        event_data: Dict[str, Any] = {
+        return {
             "start": {"date": self.start_date.isoformat()},
             "end": {"date": (self.start_date + timedelta(days=1)).isoformat()},
+            "recurrence": encode_recurrence(self.release_dates),
         }
 
-        schedule = {j - i for i, j in zip(self.release_dates[:-1], self.release_dates[1:])}
-        if len(self.release_dates) == 1:
-            event_data["recurrence"] = None
-        elif len(schedule) == 1:
-            [recurrence] = schedule
-            if recurrence == timedelta(days=7):
-                event_data["recurrence"] = [
-                    f"RRULE:FREQ=WEEKLY;WKST=SU;COUNT={len(self.release_dates)};BYDAY={self._rfc5545_weekday()}"
-                ]
-            elif recurrence == timedelta(days=1):
-                event_data["recurrence"] = [f"RRULE:FREQ=DAILY;COUNT={len(self.release_dates)}"]
-            else:
-                event_data["recurrence"] = None
-        else:
-            event_data["recurrence"] = None
-
-        return event_data
-
     def sort_val(self) -> Any:
         return self.start_date
 
+    def last_release_date(self) -> Any:
+        return max(self.release_dates)
+
     def __eq__(self, other: Any) -> bool:
         if not super().__eq__(other):
             return False
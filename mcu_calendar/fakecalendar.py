@@ -0,0 +1,382 @@
+"""
+A local fake of the Google Calendar v3 events api, for testing and load testing syncs without
+google.  It serves list (with pages, sync tokens, timeMin and timeMax), get, insert, update, patch, delete
+and batch requests over http, with configurable latency, a request quota and injected failures.
+Point the real api client at it with fake_service(), see benchmarks/calendar_loadtest.py
+https://developers.google.com/calendar/api/v3/reference/events
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from email.message import Message
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from uuid import uuid4
+
+import httplib2
+from googleapiclient.discovery import Resource, build
+from googleapiclient.http import BatchHttpRequest
+
+API_PREFIX = "/calendar/v3"
+BATCH_PATH = "/batch/calendar/v3"
+
+# The most events list() returns in a page when not asked for fewer (the real api's default)
+DEFAULT_PAGE_SIZE = 250
+MAX_PAGE_SIZE = 2500
+
+ApiResponse = Tuple[int, Optional[Dict[str, Any]]]
+
+
+def api_error(status: int, reason: str, message: str, domain: str = "global") -> ApiResponse:
+    """
+    Gets an error response shaped like the real api's
+    """
+    return status, {
+        "error": {
+            "code": status,
+            "message": message,
+            "errors": [{"domain": domain, "reason": reason, "message": message}],
+        }
+    }
+
+
+def _event_end(event: Dict[str, Any]) -> str:
+    end = event.get("end", {})
+    return end.get("date") or end.get("dateTime", "")[:10]
+
+
+def _event_start(event: Dict[str, Any]) -> str:
+    start = event.get("start", {})
+    return start.get("date") or start.get("dateTime", "")[:10]
+
+
+# pylint: disable=too-many-instance-attributes
+class FakeCalendarApi:
+    """
+    Every calendar's events and the calls made on them.  Each change is stamped with a sequence number,
+    so a sync token is just the last sequence number a list saw, and deleted events are kept as
+    cancelled for as long as they might be in a sync
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        latency: float = 0.0,
+        quota: Optional[int] = None,
+        quota_window: float = 1.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.quota = quota
+        self.quota_window = quota_window
+        self.failure_rate = failure_rate
+        self.calendars: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.counts: Counter[str] = Counter()
+        self._seq = 0
+        self._random = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+        self._lock = threading.Lock()
+
+    def seed_events(self, cal_id: str, events: List[Dict[str, Any]]) -> None:
+        """
+        Puts events on a calendar without counting them as calls
+        """
+        with self._lock:
+            for event in events:
+                self._store(cal_id, dict(event), event.get("id") or uuid4().hex)
+
+    def count(self, call: str) -> None:
+        """
+        Counts a call that isn't made through handle()
+        """
+        with self._lock:
+            self.counts[call] += 1
+
+    def events(self, cal_id: str) -> List[Dict[str, Any]]:
+        """
+        Gets a calendar's (not cancelled) events
+        """
+        with self._lock:
+            return [e for e in self.calendars.get(cal_id, {}).values() if e["status"] != "cancelled"]
+
+    def _store(self, cal_id: str, event: Dict[str, Any], event_id: str) -> Dict[str, Any]:
+        self._seq += 1
+        event.update(
+            {
+                "kind": "calendar#event",
+                "id": event_id,
+                "status": event.get("status", "confirmed"),
+                "etag": f'"{self._seq}"',
+                "updated": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+                "_seq": self._seq,
+            }
+        )
+        self.calendars.setdefault(cal_id, {})[event_id] = event
+        return event
+
+    def _admit(self) -> Optional[ApiResponse]:
+        """
+        Counts a call against the quota and rolls for an injected failure, returning the error if there is one
+        """
+        now = time.monotonic()
+        if now - self._window_start >= self.quota_window:
+            self._window_start, self._window_calls = now, 0
+        self._window_calls += 1
+        if self.quota is not None and self._window_calls > self.quota:
+            self.counts["throttled"] += 1
+            return api_error(403, "rateLimitExceeded", "Rate Limit Exceeded", "usageLimits")
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.counts["failed"] += 1
+            return api_error(503, "backendError", "Backend Error")
+        return None
+
+    def handle(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> ApiResponse:
+        """
+        Handles one api call, the path being everything after /calendar/v3 with its query
+        """
+        parts = urlsplit(path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        segments = [unquote(s) for s in parts.path.strip("/").split("/")]
+        if len(segments) not in (3, 4) or segments[0] != "calendars" or segments[2] != "events":
+            return api_error(404, "notFound", "Not Found")
+        cal_id = segments[1]
+        event_id = segments[3] if len(segments) == 4 else None
+
+        with self._lock:
+            error = self._admit()
+            if error is not None:
+                return error
+            if event_id is None and method == "GET":
+                self.counts["list"] += 1
+                return self._list(cal_id, query)
+            if event_id is None and method == "POST":
+                self.counts["insert"] += 1
+                return 200, self._public(self._store(cal_id, dict(body or {}), uuid4().hex))
+            if event_id is not None:
+                return self._handle_event(method, cal_id, event_id, body)
+        return api_error(405, "methodNotAllowed", "Method Not Allowed")
+
+    def _handle_event(self, method: str, cal_id: str, event_id: str, body: Optional[Dict[str, Any]]) -> ApiResponse:
+        event = self.calendars.get(cal_id, {}).get(event_id)
+        if event is None or event["status"] == "cancelled":
+            return api_error(404, "notFound", "Not Found")
+        if method == "GET":
+            self.counts["get"] += 1
+            return 200, self._public(event)
+        if method == "PUT":
+            self.counts["update"] += 1
+            return 200, self._public(self._store(cal_id, dict(body or {}), event_id))
+        if method == "PATCH":
+            self.counts["patch"] += 1
+            return 200, self._public(self._store(cal_id, {**event, **(body or {})}, event_id))
+        if method == "DELETE":
+            self.counts["delete"] += 1
+            self._store(cal_id, {**event, "status": "cancelled"}, event_id)
+            return 204, None
+        return api_error(405, "methodNotAllowed", "Method Not Allowed")
+
+    def _list(self, cal_id: str, query: Dict[str, str]) -> ApiResponse:
+        page_size = min(int(query.get("maxResults", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        # A page token is where the page starts in the list, and the sequence number the list started at
+        offset, list_seq = (int(p) for p in query.get("pageToken", f"0.{self._seq}").split("."))
+        events = sorted(self.calendars.get(cal_id, {}).values(), key=lambda e: e["_seq"])
+        events = [e for e in events if e["_seq"] <= list_seq]
+
+        if "syncToken" in query:
+            since = int(query["syncToken"]) if query["syncToken"].isdigit() else -1
+            if since < 0 or since > self._seq:
+                return api_error(410, "fullSyncRequired", "Sync token is no longer valid, a full sync is required.")
+            events = [e for e in events if e["_seq"] > since]
+        else:
+            if query.get("showDeleted") != "true":
+                events = [e for e in events if e["status"] != "cancelled"]
+            if "timeMin" in query:
+                events = [e for e in events if _event_end(e) > query["timeMin"][:10]]
+            if "timeMax" in query:
+                events = [e for e in events if _event_start(e) < query["timeMax"][:10]]
+
+        page = events[offset:][:page_size]
+        result: Dict[str, Any] = {"kind": "calendar#events", "items": [self._public(e) for e in page]}
+        if offset + page_size < len(events):
+            result["nextPageToken"] = f"{offset + page_size}.{list_seq}"
+        else:
+            result["nextSyncToken"] = str(list_seq)
+        return 200, result
+
+    @staticmethod
+    def _public(event: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in event.items() if not k.startswith("_")}
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    """
+    Serves a FakeCalendarApi over http, including multipart batch requests
+    """
+
+    protocol_version = "HTTP/1.1"
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+    server: FakeCalendarServer
+
+    # pylint: disable=invalid-name
+    def do_GET(self) -> None:  # noqa: N802
+        """
+        Handles GET requests
+        """
+        self._handle()
+
+    def do_POST(self) -> None:  # noqa: N802
+        """
+        Handles POST requests
+        """
+        self._handle()
+
+    def do_PUT(self) -> None:  # noqa: N802
+        """
+        Handles PUT requests
+        """
+        self._handle()
+
+    def do_PATCH(self) -> None:  # noqa: N802
+        """
+        Handles PATCH requests
+        """
+        self._handle()
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        """
+        Handles DELETE requests
+        """
+        self._handle()
+
+    def _handle(self) -> None:
+        api = self.server.api
+        content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if api.latency:
+            time.sleep(api.latency)
+        if self.path.startswith(BATCH_PATH):
+            self._send_batch(content)
+            return
+        if not self.path.startswith(API_PREFIX):
+            self._send_json(*api_error(404, "notFound", "Not Found"))
+            return
+        body = json.loads(content) if content else None
+        self._send_json(*api.handle(self.command, self.path.removeprefix(API_PREFIX), body))
+
+    def _send_json(self, status: int, body: Optional[Dict[str, Any]]) -> None:
+        data = b"" if body is None else json.dumps(body).encode("UTF-8")
+        self.send_response(status)
+        if body is not None:
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_batch(self, content: bytes) -> None:
+        """
+        Answers each part of a multipart/mixed batch with a part holding its http response
+        https://developers.google.com/calendar/api/guides/batch
+        """
+        self.server.api.count("batch")
+        message = BytesParser().parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("UTF-8") + content
+        )
+        boundary = f"batch_{uuid4().hex}"
+        parts = []
+        for part in message.get_payload():
+            if isinstance(part, Message):
+                parts.append(
+                    f"--{boundary}\r\nContent-Type: application/http\r\n"
+                    f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n{self._answer_part(part)}\r\n"
+                )
+        data = ("".join(parts) + f"--{boundary}--\r\n").encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _answer_part(self, part: Message) -> str:
+        """
+        Makes the api call in a part of a batch, and gets its http response
+        """
+        request_line, _, rest = str(part.get_payload()).partition("\n")
+        method, path, _ = request_line.strip().split(" ", 2)
+        body_text = rest.replace("\r\n", "\n").partition("\n\n")[2].strip()
+        status, body = self.server.api.handle(
+            method, path.removeprefix(API_PREFIX), json.loads(body_text) if body_text else None
+        )
+        response = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        if body is None:
+            return response + "Content-Length: 0\r\n\r\n"
+        return response + f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(body)}"
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+
+class FakeCalendarServer(ThreadingHTTPServer):
+    """
+    A threaded http server for a FakeCalendarApi, that can run in the background of a test or benchmark
+    """
+
+    daemon_threads = True
+
+    def __init__(self, api: Optional[FakeCalendarApi] = None, address: Tuple[str, int] = ("127.0.0.1", 0)) -> None:
+        super().__init__(address, FakeCalendarHandler)
+        self.host = address[0]
+        self.api = api or FakeCalendarApi()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """
+        The server's root url
+        """
+        return f"http://{self.host}:{self.server_address[1]}"
+
+    def __enter__(self) -> FakeCalendarServer:
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-calendar", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def service(self) -> Resource:
+        """
+        Gets an events service on the real api client that talks to this server
+        """
+        return fake_service(self.url)
+
+    def new_batch(self) -> BatchHttpRequest:
+        """
+        Gets a batch request that is sent to this server
+        """
+        return BatchHttpRequest(batch_uri=self.url + BATCH_PATH)
+
+
+def fake_service(url: str, http: Optional[httplib2.Http] = None) -> Resource:
+    """
+    Builds the events service the same way google_service_helper.create_service() does, pointed at a
+    fake server's url
+    """
+    return build(
+        serviceName="calendar",
+        version="v3",
+        http=http or httplib2.Http(timeout=30),
+        client_options={"api_endpoint": url + API_PREFIX + "/"},
+        static_discovery=True,
+    ).events()
@@ -0,0 +1,325 @@
+"""
+Fans one catalog out to many subscriber calendars, like per team copies of the public calendars.
+The media is loaded once and every google event payload is built once, however many subscribers
+it goes to.  Subscribers can use different credentials, and each credential's calls are limited to
+its own quota, with its writes taken from its subscribers in turn so no one calendar gets ahead
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import yaml
+from googleapiclient.errors import HttpError
+
+from . import reporting
+from .catalog import Catalog
+from .events import GoogleMediaEvent
+from .router import DEFAULT_CONFIG_PATH, calendar_from_route, load_routes
+from .scheduler import SyncCall, plan_calls
+from .yamlcalendar import YamlCalendar
+
+DEFAULT_SUBSCRIBERS_PATH = Path("subscribers.yaml")
+
+# The calls a second each credential makes when the config doesn't give it a quota
+DEFAULT_QUOTA = 10.0
+
+# How many times a rate limited call is retried, waiting twice as long each time
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+
+# The reasons google gives for a 403 that only means the call was made too soon
+_RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+
+class FanoutError(Exception):
+    """
+    Raised when the sync to one or more subscribers failed, after every other subscriber was synced
+    """
+
+    def __init__(self, errors: Dict[str, Exception]) -> None:
+        self.errors = errors
+        details = "\n".join(f"  {key}: {type(error).__name__}: {error}" for key, error in errors.items())
+        super().__init__(f"Failed to sync {len(errors)} subscriber(s):\n{details}")
+
+
+class RateLimiter:
+    """
+    A token bucket that lets through rate calls a second on average, and bursts of up to burst calls.
+    It's shared by every thread making calls with the same credentials
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Waits until a call can be made.  Tokens are taken before waiting for them, so callers queue up
+        in the order they asked instead of racing for each new token
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate
+        if wait > 0:
+            self.sleep(wait)
+
+    def back_off(self, attempt: int) -> None:
+        """
+        Waits after the attempt'th call in a row was rate limited anyway, e.g. by a quota shared with
+        another process
+        """
+        self.sleep(BACKOFF_SECONDS * 2**attempt)
+
+
+def is_rate_limited(error: HttpError) -> bool:
+    """
+    Checks if the call failed only because too many calls were made
+    """
+    if error.status_code == 429:
+        return True
+    details = error.error_details if isinstance(error.error_details, list) else []
+    return error.status_code == 403 and any(d.get("reason") in _RATE_LIMIT_REASONS for d in details)
+
+
+class _QuotaRequest:  # pylint: disable=too-few-public-methods
+    """
+    A google api request that waits for its limiter before it's executed
+    """
+
+    def __init__(self, request: Any, limiter: RateLimiter) -> None:
+        self.request = request
+        self.limiter = limiter
+
+    def execute(self) -> Any:
+        """
+        Executes the request, retrying it while it's rate limited
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                return self.request.execute()
+            except HttpError as error:
+                if attempt == MAX_RETRIES or not is_rate_limited(error):
+                    raise
+                self.limiter.back_off(attempt)
+        raise AssertionError("unreachable")
+
+
+class QuotaService:  # pylint: disable=too-few-public-methods
+    """
+    Wraps a google calendar events service so every call made through it is rate limited
+    """
+
+    def __init__(self, service: Any, limiter: RateLimiter) -> None:
+        self.service = service
+        self.limiter = limiter
+
+    def __getattr__(self, method: str) -> Callable[..., _QuotaRequest]:
+        call = getattr(self.service, method)
+        return lambda **kwargs: _QuotaRequest(call(**kwargs), self.limiter)
+
+
+class Subscriber(NamedTuple):
+    """
+    A calendar the catalog is fanned out to, and the credentials (None for the default ones) it's written with
+    """
+
+    key: str
+    calendar: YamlCalendar
+    credentials: Optional[str] = None
+
+
+def calendar_groups(catalog: Catalog, calendar: YamlCalendar) -> List[List[GoogleMediaEvent]]:
+    """
+    Gets the calendar's movies and its shows from the catalog, localized and inside its sync window
+    """
+    groups = []
+    for dirs in (calendar.movie_dirs, calendar.show_dirs):
+        items = [calendar.localize(i) for i in catalog.items_in(dirs) if calendar.includes(i)]
+        groups.append([i for i in items if calendar.in_window(i)])
+    return groups
+
+
+def load_subscribers(
+    service_for: Callable[[Optional[str]], Any],
+    config_path: Path = DEFAULT_SUBSCRIBERS_PATH,
+    routes_path: Path = DEFAULT_CONFIG_PATH,
+    data_dir: Path = Path("data"),
+) -> List[Subscriber]:
+    """
+    Creates every subscriber in the subscribers config.  A subscriber either names a route in the routing
+    config to copy, or lists its own folders, filters and region the same way a route does.  Each distinct
+    credentials file gets one service from service_for, rate limited to its quota in the config
+
+        quotas:
+          default: 10                   # calls a second for subscribers without credentials
+          secrets/team-a.json: 5
+        subscribers:
+          team-a:
+            calendar_id: <google calendar id>
+            credentials: secrets/team-a.json
+            route: mcu                  # a key in calendars.yaml
+          team-b:
+            calendar_id: <google calendar id>
+            name: Team B
+            movies: [mcu-movies]
+            filters:
+              released_after: 2020-01-01
+    """
+    with open(config_path, "r", encoding="UTF-8") as config_file:
+        config = yaml.safe_load(config_file)
+    routes = load_routes(routes_path) if any("route" in s for s in config["subscribers"].values()) else {}
+    quotas = {"default": DEFAULT_QUOTA, **config.get("quotas", {})}
+    services = {
+        credentials: QuotaService(
+            service_for(credentials), RateLimiter(float(quotas.get(credentials, quotas["default"])))
+        )
+        for credentials in dict.fromkeys(s.get("credentials") for s in config["subscribers"].values())
+    }
+
+    subscribers = []
+    for key, subscriber in config["subscribers"].items():
+        credentials = subscriber.get("credentials")
+        route = routes[subscriber["route"]] if "route" in subscriber else subscriber
+        calendar = calendar_from_route(
+            subscriber.get("name", route.get("name", key)),
+            subscriber["calendar_id"],
+            route,
+            services[credentials],
+            data_dir,
+        )
+        subscribers.append(Subscriber(key, calendar, credentials))
+    return subscribers
+
+
+class _Fanout:
+    """
+    The state shared by every credential's worker during a fan out sync
+    """
+
+    def __init__(self, catalog: Catalog, force: bool) -> None:
+        self.catalog = catalog
+        self.force = force
+        self.counts: Dict[str, Counter[str]] = {}
+        self.errors: Dict[str, Exception] = {}
+        # Reporters aren't thread safe, and each line should be about one subscriber
+        self.lock = threading.Lock()
+
+    def plan(self, subscriber: Subscriber) -> List[SyncCall]:
+        """
+        Lists the subscriber's calendar and works out the calls to sync it
+        """
+        cal = subscriber.calendar
+        calls, skipped = plan_calls(
+            calendar_groups(self.catalog, cal), list(cal.iter_google_events()), self.force, cal.rewrite
+        )
+        with self.lock:
+            self.counts[subscriber.key]["skip"] = len(skipped)
+            reporting.current().note(
+                f"    FANOUT {cal.name} ({subscriber.key}): {len(calls)} changes, {len(skipped)} skipped"
+            )
+        return calls
+
+    def run(self, subscribers: Sequence[Subscriber]) -> None:
+        """
+        Syncs subscribers that share credentials, taking one call from each of them in turn
+        """
+        queues: Deque[Tuple[Subscriber, Deque[SyncCall]]] = deque()
+        for subscriber in subscribers:
+            try:
+                queues.append((subscriber, deque(self.plan(subscriber))))
+            except HttpError as error:
+                self.fail(subscriber, error)
+
+        report = reporting.current()
+        while queues:
+            subscriber, calls = queues.popleft()
+            if not calls:
+                continue
+            call = calls.popleft()
+            cal = subscriber.calendar
+            start = time.perf_counter()
+            try:
+                getattr(cal.google_service, call.method)(calendarId=cal.cal_id, **call.kwargs).execute()
+            except HttpError as error:
+                # Only this subscriber's remaining calls are dropped, the others carry on
+                self.fail(subscriber, error)
+                continue
+            with self.lock:
+                self.counts[subscriber.key][call.action] += 1
+                report.record(call.action, cal.name, call.title, time.perf_counter() - start, call.text)
+            queues.append((subscriber, calls))
+
+    def fail(self, subscriber: Subscriber, error: Exception) -> None:
+        """
+        Remembers that the subscriber's sync failed
+        """
+        with self.lock:
+            self.errors[subscriber.key] = error
+            reporting.current().note(f"    FAILED {subscriber.calendar.name} ({subscriber.key}): {error}")
+
+
+def fanout_sync(subscribers: Iterable[Subscriber], force: bool = False) -> Dict[str, Counter[str]]:
+    """
+    Syncs every subscriber's calendar from one shared catalog.  Subscribers with different credentials
+    are synced at the same time, and those sharing credentials take turns.  A failing subscriber doesn't
+    stop the others, but once they're all done a FanoutError is raised for it.  Returns how many of
+    each call were made for each subscriber
+    """
+    subscribers = list(subscribers)
+    catalog = Catalog.for_calendars(s.calendar for s in subscribers)
+    catalog.load()
+
+    fanout = _Fanout(catalog, force)
+    by_credentials: Dict[Optional[str], List[Subscriber]] = {}
+    for subscriber in subscribers:
+        fanout.counts[subscriber.key] = Counter()
+        by_credentials.setdefault(subscriber.credentials, []).append(subscriber)
+
+    with ThreadPoolExecutor(max(1, len(by_credentials))) as executor:
+        for future in [executor.submit(fanout.run, group) for group in by_credentials.values()]:
+            future.result()
+
+    report = reporting.current()
+    for subscriber in subscribers:
+        counts = fanout.counts[subscriber.key]
+        report.note(
+            f"    {subscriber.key}: {counts['insert']} added, {counts['update']} updated,"
+            f" {counts['delete']} deleted, {counts['skip']} skipped"
+        )
+    report.note()
+    if fanout.errors:
+        raise FanoutError(fanout.errors)
+    return fanout.counts
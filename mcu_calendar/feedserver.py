@@ -0,0 +1,238 @@
+"""
+A long running http server that serves every calendar as an .ics and a json feed from an
+in-memory catalog, hot reloading the catalog as the yaml data changes
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import sha256
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+
+from .catalog import Catalog
+from .events import GoogleMediaEvent
+from .ics import iter_ics
+from .yamlcalendar import YamlCalendar
+
+
+# pylint: disable=too-few-public-methods
+class RenderedFeed:
+    """
+    A pre-rendered (and pre-compressed) http response body
+    """
+
+    def __init__(self, body: bytes, content_type: str, modified: datetime) -> None:
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.content_type = content_type
+        self.etag = f'"{sha256(body).hexdigest()[:32]}"'
+        self.modified = modified.replace(microsecond=0)
+        self.last_modified = format_datetime(self.modified, usegmt=True)
+
+    def is_not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """
+        Checks the conditional GET headers against this feed
+        https://datatracker.ietf.org/doc/html/rfc9110#section-13.2.2
+        """
+        if if_none_match is not None:
+            etags = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+            return "*" in etags or self.etag in etags
+        if if_modified_since is not None:
+            try:
+                return self.modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def render_ics(calendar: YamlCalendar, items: Iterable[GoogleMediaEvent], modified: datetime) -> RenderedFeed:
+    """
+    Renders a calendar's .ics feed
+    """
+    body = "".join(iter_ics(calendar.name, items, modified)).encode("UTF-8")
+    return RenderedFeed(body, "text/calendar; charset=utf-8", modified)
+
+
+def render_json(calendar: YamlCalendar, items: Iterable[GoogleMediaEvent], modified: datetime) -> RenderedFeed:
+    """
+    Renders a calendar's json feed, which is the google calendar api event for every item
+    """
+    data = {"name": calendar.name, "events": [i.to_google_event() for i in items]}
+    body = json.dumps(data, separators=(",", ":"), default=str).encode("UTF-8")
+    return RenderedFeed(body, "application/json", modified)
+
+
+class FeedStore:
+    """
+    Every rendered feed, keyed by the url path it is served from.  The whole feed dict is swapped
+    at once on reload so request threads never need a lock
+    """
+
+    def __init__(self, calendars: Dict[str, YamlCalendar]) -> None:
+        self.calendars = calendars
+        self.catalog = Catalog.for_calendars(calendars.values())
+        self.feeds: Dict[str, RenderedFeed] = {}
+        self._lock = threading.Lock()
+        # Set when a reload failed part way, which may have left the catalog half refreshed
+        self._stale = False
+
+    def _render(self, keys: Iterable[str], modified: datetime) -> Dict[str, RenderedFeed]:
+        feeds = dict(self.feeds)
+        for key in keys:
+            calendar = self.calendars[key]
+            items = self.catalog.calendar_items(calendar)
+            feeds[f"/{key}.ics"] = render_ics(calendar, items, modified)
+            feeds[f"/{key}.json"] = render_json(calendar, items, modified)
+        return feeds
+
+    def load(self) -> None:
+        """
+        Loads the whole catalog and renders every feed
+        """
+        with self._lock:
+            self.catalog.load()
+            self.feeds = self._render(self.calendars, datetime.now(timezone.utc))
+
+    def reload(self) -> List[str]:
+        """
+        Reloads any changed yaml files, and re-renders only the feeds that use them.  If that fails the
+        last good feeds are kept, and the next reload that works re-renders every feed
+        """
+        with self._lock:
+            try:
+                changes = self.catalog.refresh()
+            except Exception:
+                self._stale = True
+                raise
+            if self._stale:
+                keys = list(self.calendars)
+                self._stale = False
+            elif not changes:
+                return []
+            else:
+                folders = set(changes.folders())
+                keys = [k for k, cal in self.calendars.items() if folders & {*cal.movie_dirs, *cal.show_dirs}]
+            self.feeds = self._render(keys, datetime.now(timezone.utc))
+            return keys
+
+    def index(self) -> RenderedFeed:
+        """
+        Renders the list of every feed that is served
+        """
+        body = json.dumps(sorted(self.feeds), separators=(",", ":")).encode("UTF-8")
+        return RenderedFeed(body, "application/json", max(f.modified for f in self.feeds.values()))
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the feeds in a FeedStore with support for conditional GETs and gzip
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Buffer the headers and body so they go out in one write, and don't let Nagle's
+    # algorithm hold back a response waiting on a delayed ACK
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+    server: FeedServer
+
+    # pylint: disable=invalid-name
+    def do_GET(self) -> None:  # noqa: N802
+        """
+        Handles GET requests
+        """
+        self._send_feed(include_body=True)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        """
+        Handles HEAD requests
+        """
+        self._send_feed(include_body=False)
+
+    def _send_feed(self, include_body: bool) -> None:
+        path = self.path.split("?", 1)[0]
+        feed = self.server.store.index() if path == "/" else self.server.store.feeds.get(path)
+        if feed is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        if feed.is_not_modified(self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", feed.etag)
+            self.send_header("Last-Modified", feed.last_modified)
+            self.end_headers()
+            return
+
+        body = feed.body
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        if use_gzip:
+            body = feed.gzip_body
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", feed.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", feed.etag)
+        self.send_header("Last-Modified", feed.last_modified)
+        self.send_header("Cache-Control", "public, max-age=300")
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        # Logging every request to stderr costs more than serving it
+        pass
+
+
+class FeedServer(ThreadingHTTPServer):
+    """
+    A threaded http server that serves a FeedStore and hot reloads it in the background
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], store: FeedStore, reload_interval: float = 5.0) -> None:
+        super().__init__(address, FeedRequestHandler)
+        self.store = store
+        self.reload_interval = reload_interval
+        self._stop_reload = threading.Event()
+
+    def _reload_loop(self) -> None:
+        while not self._stop_reload.wait(self.reload_interval):
+            try:
+                keys = self.store.reload()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # Usually a file that's only half saved, so keep serving and try again on the next tick
+                print(f"Reload failed, serving the last good feeds: {error}")
+                continue
+            if keys:
+                print("Reloaded", ", ".join(keys))
+
+    def serve_forever(self, poll_interval: float = 0.5) -> None:
+        reloader = threading.Thread(target=self._reload_loop, name="feed-reloader", daemon=True)
+        reloader.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stop_reload.set()
+
+
+def serve(calendars: Dict[str, YamlCalendar], host: str, port: int, reload_interval: float = 5.0) -> None:
+    """
+    Serves every calendar's feeds at http://host:port/{key}.ics and http://host:port/{key}.json
+    """
+    store = FeedStore(calendars)
+    store.load()
+    with FeedServer((host, port), store, reload_interval) as server:
+        print(f"Serving {len(store.feeds)} feeds on http://{host}:{server.server_address[1]}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,194 @@
+"""
+Incremental syncing driven by git history, so a run after merging the auto update PR only
+pushes the handful of files that PR touched instead of diffing every calendar in full
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import yaml
+
+from . import reporting
+from .archive import load_segment, parse_segment, segment_path
+from .events import GoogleMediaEvent, Movie, Show
+from .helpers import run_git
+from .syncstate import SyncState
+from .yamlcalendar import YamlCalendar
+
+
+class GitChange(NamedTuple):
+    """
+    A single line of `git diff --name-status`
+    """
+
+    status: str
+    path: Path
+    old_path: Optional[Path] = None
+
+
+def head_commit() -> Optional[str]:
+    """
+    Gets the commit that is currently checked out
+    """
+    output = run_git("rev-parse", "HEAD")
+    return output.strip() if output else None
+
+
+def git_changes(since: str, folders: Sequence[Path]) -> Optional[List[GitChange]]:
+    """
+    Gets every file added, modified, deleted or renamed in the folders since the given commit, or
+    None if that can't be worked out (e.g. the commit isn't in a shallow clone's history)
+    """
+    output = run_git("diff", "--name-status", "-z", "-M", since, "HEAD", "--", *(str(f) for f in folders))
+    if output is None:
+        return None
+
+    fields = output.split("\0")
+    changes = []
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i][0]
+        if status in ("R", "C"):
+            changes.append(GitChange(status, Path(fields[i + 2]), Path(fields[i + 1])))
+            i += 3
+        else:
+            changes.append(GitChange(status, Path(fields[i + 1])))
+            i += 2
+    return changes
+
+
+def _load_old_item(commit: str, path: Path, is_movie: bool) -> Optional[GoogleMediaEvent]:
+    """
+    Loads an item as it was defined at the given commit, .patch file and all
+    """
+    # A ./ path is relative to the current folder, not the root of the repo
+    content = run_git("show", f"{commit}:./{path.as_posix()}")
+    if content is None:
+        return None
+    yaml_data = yaml.safe_load(content)
+    patch = run_git("show", f"{commit}:./{path.with_suffix('.patch').as_posix()}")
+    if patch is not None:
+        yaml_data = yaml_data | (yaml.safe_load(patch) or {})
+    if is_movie:
+        return Movie(**yaml_data, file_path=path)
+    return Show(**yaml_data, file_path=path)
+
+
+def _load_old_segment(commit: str, folder: Path) -> Dict[Path, GoogleMediaEvent]:
+    """
+    Loads a folder's archived items as they were at the given commit
+    """
+    content = run_git("show", f"{commit}:./{segment_path(folder).as_posix()}")
+    return {} if content is None else parse_segment(folder, content).items
+
+
+def _segment_changes(
+    since: str, folder: Path, updated: List[GoogleMediaEvent], removed: List[GoogleMediaEvent], seen: Set[Path]
+) -> None:
+    """
+    Adds the archived items of a folder that changed since the given commit, skipping any that a
+    yaml file overrides
+    """
+    old_items = _load_old_segment(since, folder)
+    segment = load_segment(folder)
+    new_items = {} if segment is None else segment.items
+    for path in sorted({*old_items, *new_items}):
+        if path in seen or path.exists():
+            continue
+        old, new = old_items.get(path), new_items.get(path)
+        if new is not None and (old is None or old != new or old.title != new.title):
+            updated.append(new)
+            seen.add(path)
+        if old is not None and (new is None or old.title != new.title):
+            removed.append(old)
+
+
+def _sealed_items(folders: Set[Path]) -> Dict[Path, GoogleMediaEvent]:
+    """
+    Gets every item currently in the folders' archive segments
+    """
+    sealed: Dict[Path, GoogleMediaEvent] = {}
+    for folder in folders:
+        segment = load_segment(folder)
+        if segment is not None:
+            sealed.update(segment.items)
+    return sealed
+
+
+def affected_media(
+    calendar: YamlCalendar, since: str, changes: Sequence[GitChange]
+) -> Tuple[List[GoogleMediaEvent], List[GoogleMediaEvent]]:
+    """
+    Gets the items that were added or changed, and the items (as they were) that were removed or
+    renamed away from, for just this calendar's folders
+    """
+    movie_dirs = set(calendar.movie_dirs)
+    show_dirs = set(calendar.show_dirs)
+    updated: List[GoogleMediaEvent] = []
+    removed: List[GoogleMediaEvent] = []
+    seen: Set[Path] = set()
+
+    segments = {segment_path(folder): folder for folder in movie_dirs | show_dirs}
+    for change in changes:
+        if change.path in segments:
+            _segment_changes(since, segments[change.path], updated, removed, seen)
+    sealed = _sealed_items(movie_dirs | show_dirs)
+
+    for change in changes:
+        if change.path in segments:
+            continue
+        # A yaml file that was deleted because it was sealed away still has its item in the archive
+        if change.status == "D" and change.path in sealed and change.path not in seen:
+            updated.append(sealed[change.path])
+            seen.add(change.path)
+        # A .patch file change means its yaml file's item changed
+        yaml_path = change.path.with_suffix(".yaml")
+        is_patch = change.path.suffix == ".patch"
+        if (change.status != "D" or is_patch) and yaml_path not in seen and yaml_path.exists():
+            if yaml_path.parent in movie_dirs:
+                updated.append(Movie.from_yaml(yaml_path))
+                seen.add(yaml_path)
+            elif yaml_path.parent in show_dirs:
+                updated.append(Show.from_yaml(yaml_path))
+                seen.add(yaml_path)
+
+        # Events are matched by title, so the old version of a modified item is needed in case its title changed,
+        # and any change to a .patch file can have changed its yaml file's title
+        old_path = change.path if change.status in ("D", "M") or is_patch else change.old_path
+        if old_path is None or old_path.suffix not in (".yaml", ".patch") or change.status == "C":
+            continue
+        old_path = old_path.with_suffix(".yaml")
+        if old_path.parent in movie_dirs | show_dirs:
+            old_item = _load_old_item(since, old_path, old_path.parent in movie_dirs)
+            if old_item is not None:
+                removed.append(old_item)
+
+    return updated, removed
+
+
+def incremental_sync(calendar: YamlCalendar, state: SyncState, force: bool = False, record: bool = True) -> None:
+    """
+    Syncs only what changed in git since this calendar was last synced, falling back to a full
+    sync when there's no record of the last sync or its commit isn't in the history
+    """
+    head = head_commit()
+    cal_state = state.calendar(calendar.cal_id)
+    since: Optional[str] = cal_state.get("commit")
+    changes = None
+    if since is not None and head is not None:
+        folders = [*calendar.movie_dirs, *calendar.show_dirs]
+        changes = git_changes(since, [*folders, *(segment_path(f) for f in folders)])
+
+    if since is None or changes is None:
+        calendar.create_google_events(force)
+    elif changes:
+        updated, removed = affected_media(calendar, since, changes)
+        calendar.update_google_events(updated, removed, force)
+    else:
+        reporting.current().note("    UNCHANGED", calendar.name)
+
+    if record and head is not None:
+        cal_state["commit"] = head
+        state.save()
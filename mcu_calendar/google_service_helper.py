@@ -5,15 +5,18 @@ Helper methods for creating google api client services
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, List, Sequence
+from typing import Any, List, Optional, Sequence
 
-from google.api_core.client_options import ClientOptions
+import google.auth
 from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import Resource, build
 
+from . import transport
+
 
 def update_creds_token(creds: Credentials) -> None:
     """
@@ -75,6 +78,9 @@ class MockService:
     def update(self, **kwargs: dict) -> MockService:
         return self
 
+    def patch(self, **kwargs: dict) -> MockService:
+        return self
+
     def delete(self, **kwargs: dict) -> MockService:
         return self
 
@@ -85,17 +91,23 @@ class MockService:
         pass
 
 
-def create_service(scopes: List[str]) -> Resource:
+def create_service(scopes: List[str], credentials_path: Optional[Path] = None) -> Resource:
     """
-    Creates a service with the given scopes, and uses either a service token or local credentials
+    Creates a service with the given scopes, and uses either the given credentials file, a service token
+    or local credentials
     """
-    # pylint: disable=no-member
-    token_path = Path.home() / "secrets" / "service_token.json"
-    if token_path.exists():
-        return build(
-            serviceName="calendar",
-            version="v3",
-            client_options=ClientOptions(credentials_file=str(token_path), scopes=scopes),
-        ).events()
+    cassette = transport.active_cassette()
+    if cassette is not None and not cassette.recording:
+        # Replayed calls are never sent, so there's nothing to authorize them with
+        return build(serviceName="calendar", version="v3", http=transport.google_http()).events()
 
-    return build(serviceName="calendar", version="v3", credentials=get_local_creds(scopes)).events()
+    # pylint: disable=no-member
+    token_path = credentials_path or Path.home() / "secrets" / "service_token.json"
+    if credentials_path is not None or token_path.exists():
+        creds, _ = google.auth.load_credentials_from_file(str(token_path), scopes=scopes)
+    else:
+        creds = get_local_creds(scopes)
+
+    # Every calendar call goes through one http object, so they share its kept alive connection
+    http = AuthorizedHttp(creds, http=transport.google_http())
+    return build(serviceName="calendar", version="v3", http=http).events()
@@ -2,6 +2,10 @@
 Generic helper methods that eny of the modules here might want to use
 """
 
+import re
+import subprocess  # nosec B404 - only ever runs git with fixed arguments
+from typing import Optional
+
 from rich.progress import BarColumn, Progress, TimeElapsedColumn
 
 
@@ -22,3 +26,25 @@ def truncate(string: str, length: int) -> str:
     Truncates a string to a given length with "..." at the end if needed
     """
     return string[: (length - 3)].ljust(length, ".")
+
+
+def get_safe_title(title: str) -> str:
+    """
+    Gets a url-safe title (mostly trying to match the format I already had)
+    """
+    safe_title = re.sub(r"\s+", "_", title)
+    safe_title = safe_title.replace("-", "_")
+    safe_title = "".join(c for c in safe_title if c.isalnum() or c == "_")
+    safe_title = safe_title.lower()
+    return safe_title
+
+
+def run_git(*args: str) -> Optional[str]:
+    """
+    Runs a git command, returning None if git isn't available or the command fails
+    """
+    try:
+        result = subprocess.run(["git", *args], capture_output=True, check=True, text=True)  # nosec B603 B607
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
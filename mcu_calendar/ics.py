@@ -0,0 +1,184 @@
+"""
+Renders calendars straight to RFC 5545 iCalendar (.ics) feeds, so subscribers don't need
+every change to round trip through the Google Calendar api
+https://datatracker.ietf.org/doc/html/rfc5545
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from hashlib import sha256
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+
+from .events import GoogleMediaEvent
+from .yamlcalendar import YamlCalendar
+
+PRODID = "-//SirIndubitable//MCU Calendar//EN"
+UID_DOMAIN = "mcu-calendar.github.com"
+DIGEST_PROPERTY = "X-MCU-SOURCE-DIGEST"
+
+# Bump this whenever the rendered output changes, so every feed gets regenerated
+FORMAT_VERSION = "1"
+
+
+def escape_text(text: str) -> str:
+    """
+    Escapes a TEXT property value
+    https://datatracker.ietf.org/doc/html/rfc5545#section-3.3.11
+    """
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def fold_line(line: str) -> str:
+    """
+    Folds a content line so that no physical line is longer than 75 octets, and terminates it with CRLF
+    https://datatracker.ietf.org/doc/html/rfc5545#section-3.1
+    """
+    encoded = line.encode("UTF-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+
+    parts = []
+    limit = 75
+    start = 0
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a multibyte UTF-8 character across lines
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode("UTF-8"))
+        start = end
+        # Continuation lines start with a space, which counts towards the line length
+        limit = 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def event_uid(item: GoogleMediaEvent) -> str:
+    """
+    Gets a UID for the item that stays the same across exports, based on the yaml file that defines it
+    """
+    if item.file_path.stem:
+        key = f"{item.file_path.parent.name}-{item.file_path.stem}"
+    else:
+        key = sha256(item.title.encode("UTF-8")).hexdigest()[:16]
+    return f"{key}@{UID_DOMAIN}"
+
+
+def _ics_date(iso_date: str) -> str:
+    return iso_date.replace("-", "")
+
+
+def _ics_stamp(stamp: datetime) -> str:
+    return stamp.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def event_lines(item: GoogleMediaEvent, stamp: datetime) -> Iterator[str]:
+    """
+    Gets the unfolded content lines of the VEVENT for the given item, built from the same
+    google event data (including the RRULE recurrence) that is synced to google calendar
+    """
+    event = item.to_google_event()
+    yield "BEGIN:VEVENT"
+    yield f"UID:{event_uid(item)}"
+    yield f"DTSTAMP:{_ics_stamp(stamp)}"
+    yield f"DTSTART;VALUE=DATE:{_ics_date(event['start']['date'])}"
+    yield f"DTEND;VALUE=DATE:{_ics_date(event['end']['date'])}"
+    for rule in event.get("recurrence") or []:
+        yield rule
+    yield f"SUMMARY:{escape_text(event['summary'])}"
+    if event.get("description"):
+        yield f"DESCRIPTION:{escape_text(event['description'].strip())}"
+    if event.get("transparency") == "transparent":
+        yield "TRANSP:TRANSPARENT"
+    yield "END:VEVENT"
+
+
+def iter_ics(
+    name: str, items: Iterable[GoogleMediaEvent], stamp: datetime, digest: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Lazily renders a whole VCALENDAR, one folded CRLF terminated line at a time
+    """
+    header = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ]
+    if digest is not None:
+        header.append(f"{DIGEST_PROPERTY}:{digest}")
+    for line in header:
+        yield fold_line(line)
+
+    for item in items:
+        for line in event_lines(item, stamp):
+            yield fold_line(line)
+
+    yield fold_line("END:VCALENDAR")
+
+
+def write_ics(
+    stream: IO[str], name: str, items: Iterable[GoogleMediaEvent], stamp: datetime, digest: Optional[str] = None
+) -> None:
+    """
+    Streams a VCALENDAR to the given text stream without building the whole feed in memory
+    """
+    stream.writelines(iter_ics(name, items, stamp, digest))
+
+
+def source_digest(calendar: YamlCalendar) -> str:
+    """
+    Gets a hash of everything that a calendar's feed is rendered from
+    """
+    digest = sha256(FORMAT_VERSION.encode("UTF-8"))
+    digest.update(calendar.name.encode("UTF-8"))
+    digest.update(repr(calendar.item_filter).encode("UTF-8"))
+    if calendar.region is not None:
+        digest.update(calendar.region.encode("UTF-8"))
+    for path in calendar.source_files():
+        digest.update(path.as_posix().encode("UTF-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def read_digest(ics_path: Path) -> Optional[str]:
+    """
+    Reads the source digest out of the header of a previously exported feed
+    """
+    if not ics_path.exists():
+        return None
+    digest = None
+    with open(ics_path, "r", encoding="UTF-8", newline="") as ics_file:
+        for line in ics_file:
+            if digest is not None:
+                # Unfold any continuation lines of the digest property
+                if not line.startswith(" "):
+                    break
+                digest += line[1:].rstrip("\r\n")
+            elif line.startswith("BEGIN:VEVENT"):
+                break
+            elif line.startswith(f"{DIGEST_PROPERTY}:"):
+                digest = line.split(":", 1)[1].rstrip("\r\n")
+    return digest
+
+
+def export_calendar(calendar: YamlCalendar, ics_path: Path, force: bool = False) -> bool:
+    """
+    Exports the calendar to an .ics file, only if the data that it is built from has changed.
+    Returns whether the file was (re)written
+    """
+    digest = source_digest(calendar)
+    if not force and read_digest(ics_path) == digest:
+        return False
+
+    ics_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = ics_path.with_suffix(".ics.tmp")
+    with open(tmp_path, "w", encoding="UTF-8", newline="") as ics_file:
+        write_ics(ics_file, calendar.name, calendar.iter_items(), datetime.now(timezone.utc), digest)
+    tmp_path.replace(ics_path)
+    return True
@@ -0,0 +1,93 @@
+"""
+Encodes a season's release dates as a single RFC 5545 recurrence, no matter how irregular the
+schedule is, and expands those recurrences back into dates
+https://datatracker.ietf.org/doc/html/rfc5545#section-3.8.5
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+RFC5545_WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+
+def rfc5545_weekday(day: date) -> str:
+    """
+    Gets the RFC 5545 BYDAY name of the day's weekday
+    """
+    return RFC5545_WEEKDAYS[day.weekday()]
+
+
+def _date_list(prop: str, dates: Iterable[date]) -> str:
+    return f"{prop};VALUE=DATE:" + ",".join(d.strftime("%Y%m%d") for d in sorted(dates))
+
+
+def _rrule(start: date, days: int, count: int) -> str:
+    if days == 7:
+        return f"RRULE:FREQ=WEEKLY;WKST=SU;COUNT={count};BYDAY={rfc5545_weekday(start)}"
+    return f"RRULE:FREQ=DAILY;COUNT={count}"
+
+
+def encode_recurrence(release_dates: Iterable[date]) -> Optional[List[str]]:
+    """
+    Gets the shortest recurrence that expands to exactly the given dates, starting from the first one.
+    Regular weekly/daily schedules are a plain RRULE, irregular ones are a weekly/daily RRULE with
+    RDATE/EXDATE exceptions, or just a list of RDATEs when no rule fits better
+    """
+    dates = sorted(set(release_dates))
+    if len(dates) <= 1:
+        return None
+
+    start = dates[0]
+    date_set = set(dates)
+    best: Optional[List[str]] = None
+    # Listing every date after the first as an RDATE always works, a rule has to beat that
+    best_cost = len(dates) - 1
+    for days in (7, 1):
+        count = (dates[-1] - start).days // days + 1
+        expected = {start + timedelta(days=days * i) for i in range(count)}
+        extra = date_set - expected
+        missing = expected - date_set
+        cost = len(extra) + len(missing)
+        if cost == 0:
+            return [_rrule(start, days, count)]
+        if cost < best_cost:
+            best_cost = cost
+            best = [_rrule(start, days, count)]
+            if extra:
+                best.append(_date_list("RDATE", extra))
+            if missing:
+                best.append(_date_list("EXDATE", missing))
+
+    if best is None:
+        best = [_date_list("RDATE", dates[1:])]
+    return best
+
+
+def _parse_dates(value: str) -> Set[date]:
+    return {date(int(d[:4]), int(d[4:6]), int(d[6:8])) for d in value.split(",")}
+
+
+def expand_recurrence(start: date, recurrence: Optional[Iterable[str]]) -> List[date]:
+    """
+    Expands the recurrences created by encode_recurrence back into every date they describe
+    """
+    dates = {start}
+    excluded: Set[date] = set()
+    for line in recurrence or []:
+        name, value = line.split(":", 1)
+        prop = name.split(";", 1)[0]
+        if prop == "RDATE":
+            dates |= _parse_dates(value)
+        elif prop == "EXDATE":
+            excluded |= _parse_dates(value)
+        elif prop == "RRULE":
+            parts: Dict[str, str] = dict(p.split("=", 1) for p in value.split(";"))
+            days = {"WEEKLY": 7, "DAILY": 1}[parts["FREQ"]]
+            if "BYDAY" in parts and parts["BYDAY"] != rfc5545_weekday(start):
+                raise ValueError(f"Unsupported recurrence rule {line}")
+            dates |= {start + timedelta(days=days * i) for i in range(int(parts["COUNT"]))}
+        else:
+            raise ValueError(f"Unsupported recurrence property {line}")
+    return sorted(dates - excluded)
@@ -0,0 +1,156 @@
+"""
+A persisted index of every release date in the catalog, for answering "what's coming out between
+X and Y" with a bisect instead of loading every folder.  Movies have one entry and shows have one
+per release date, all sorted by date.  The index remembers the stamps of the files it was built
+from, so checking that it's still fresh only needs a stat of each file, not parsing any yaml
+"""
+
+from __future__ import annotations
+
+import json
+from bisect import bisect_left, bisect_right
+from datetime import date
+from pathlib import Path
+from typing import Collection, Dict, List, NamedTuple, Optional, Tuple
+
+from .catalog import Catalog, FileStamp
+from .events import Movie, Show
+
+INDEX_NAME = ".release_index.json"
+
+# Bump this whenever the index layout changes
+INDEX_VERSION = 1
+
+
+class Release(NamedTuple):
+    """
+    A single release of a movie, or of one of a show's episodes
+    """
+
+    release_date: date
+    title: str
+    kind: str
+    folder: str
+
+    def __str__(self) -> str:
+        return f"{self.release_date.isoformat()}  {self.title}  [{self.folder}]"
+
+
+def _stamp_keys(stamps: Dict[Path, FileStamp]) -> Dict[str, List[int]]:
+    return {path.as_posix(): list(stamp) for path, stamp in sorted(stamps.items())}
+
+
+class ReleaseIndex:
+    """
+    Release dates (as ordinals) sorted ascending, in parallel with the row of the item each one is for
+    """
+
+    def __init__(
+        self,
+        ordinals: List[int],
+        rows: List[int],
+        items: List[Tuple[str, str, str]],
+        stamps: Dict[str, List[int]],
+    ) -> None:
+        self.ordinals = ordinals
+        self.rows = rows
+        # (title, kind, folder name) of each item
+        self.items = items
+        self.stamps = stamps
+
+    @staticmethod
+    def build(catalog: Catalog, stamps: Dict[Path, FileStamp]) -> ReleaseIndex:
+        """
+        Builds the index from a loaded catalog, and the stamps of the files it was loaded from
+        """
+        entries: List[Tuple[int, int]] = []
+        items: List[Tuple[str, str, str]] = []
+        for path, item in sorted(catalog.items.items()):
+            if isinstance(item, Show):
+                dates = sorted(set(item.release_dates))
+            elif isinstance(item, Movie):
+                dates = [item.release_date]
+            else:
+                continue
+            entries += ((d.toordinal(), len(items)) for d in dates)
+            items.append((item.title, "show" if isinstance(item, Show) else "movie", path.parent.name))
+        entries.sort()
+        return ReleaseIndex([o for o, _ in entries], [r for _, r in entries], items, _stamp_keys(stamps))
+
+    def is_fresh(self, stamps: Dict[Path, FileStamp]) -> bool:
+        """
+        Checks if the index was built from exactly the files with these stamps
+        """
+        return self.stamps == _stamp_keys(stamps)
+
+    def query(self, start: date, end: date, folders: Optional[Collection[str]] = None) -> List[Release]:
+        """
+        Gets every release from start to end (inclusive) in date order, only from the named folders if given
+        """
+        low = bisect_left(self.ordinals, start.toordinal())
+        high = bisect_right(self.ordinals, end.toordinal())
+        releases = []
+        for ordinal, row in zip(self.ordinals[low:high], self.rows[low:high]):
+            title, kind, folder = self.items[row]
+            if folders is None or folder in folders:
+                releases.append(Release(date.fromordinal(ordinal), title, kind, folder))
+        return releases
+
+    def save(self, path: Path) -> None:
+        """
+        Writes the index, replacing the old one only once the new one is complete
+        """
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="UTF-8") as index_file:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "stamps": self.stamps,
+                    "items": self.items,
+                    "ordinals": self.ordinals,
+                    "rows": self.rows,
+                },
+                index_file,
+                separators=(",", ":"),
+            )
+        tmp_path.replace(path)
+
+    @staticmethod
+    def load(path: Path) -> Optional[ReleaseIndex]:
+        """
+        Loads a saved index, or None if there isn't a usable one
+        """
+        try:
+            with open(path, "r", encoding="UTF-8") as index_file:
+                index = json.load(index_file)
+            if index.get("version") != INDEX_VERSION:
+                return None
+            items = [(item[0], item[1], item[2]) for item in index["items"]]
+            return ReleaseIndex(index["ordinals"], index["rows"], items, index["stamps"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+def default_index_path(catalog: Catalog) -> Path:
+    """
+    Gets where a catalog's index is kept, next to its folders (e.g. data/.release_index.json)
+    """
+    folders = catalog.folders()
+    return (folders[0].parent if folders else Path("data")) / INDEX_NAME
+
+
+def open_index(catalog: Catalog, path: Optional[Path] = None) -> ReleaseIndex:
+    """
+    Gets the saved index of an (unloaded) catalog if none of its files changed since it was built,
+    otherwise loads the catalog and saves a new index
+    """
+    path = path or default_index_path(catalog)
+    stamps = catalog.scan()
+    index = ReleaseIndex.load(path)
+    if index is not None and index.is_fresh(stamps):
+        return index
+
+    catalog.load()
+    index = ReleaseIndex.build(catalog, stamps)
+    index.save(path)
+    return index
@@ -0,0 +1,192 @@
+"""
+How syncs report what they do.  In a terminal every item is rendered live under rich progress bars,
+but when stdout isn't a terminal (like in CI) that rendering is wasted time and makes huge logs, so
+instead the changes are buffered and written as json lines, with a one line summary at the end
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from rich.progress import Progress
+
+from .helpers import create_progress
+
+T = TypeVar("T")
+
+# How each action is labelled, and its colour under a progress bar
+LABELS = {
+    "insert": ("(Adding)", "red"),
+    "update": ("(Updating)", "yellow"),
+    "skip": ("(Skipping)", "cyan"),
+    "delete": ("(Deleting)", "red"),
+    "fetch": ("(Fetched)", "green"),
+}
+
+# The most json lines held before they're written out
+BUFFER_SIZE = 256
+
+# Whether each --output choice is headless, None picks for stdout
+OUTPUTS = {"auto": None, "live": False, "json": True}
+
+
+class Reporter:
+    """
+    Renders progress bars and every item live, for a terminal
+    """
+
+    headless = False
+
+    def __init__(self, verbose: bool = True) -> None:
+        self.verbose = verbose
+        # How many of each action were taken, by calendar
+        self.counts: Dict[str, Counter[str]] = {}
+        self._progress: Optional[Progress] = None
+
+    def track(self, items: Iterable[T], description: str) -> Iterator[T]:
+        """
+        Iterates over the items, with a progress bar while records are rendered above it
+        """
+        with create_progress() as progress:
+            self._progress = progress
+            try:
+                yield from progress.track(items, description=description)
+            finally:
+                self._progress = None
+
+    # pylint: disable=too-many-arguments,unused-argument
+    def record(
+        self, action: str, calendar: str, title: str, latency: Optional[float] = None, text: Optional[str] = None
+    ) -> None:
+        """
+        Reports an action taken on a title (optionally rendered as text), and how long it took in seconds.
+        Outside of track() records are printed plainly, since rich's render caches grow with every distinct line
+        """
+        self.counts.setdefault(calendar, Counter())[action] += 1
+        if action == "skip" and not self.verbose:
+            return
+        label, colour = LABELS.get(action, (f"({action.title()})", "reset"))
+        if self._progress is not None:
+            self._progress.print(f"[reset]{text or title}", f"[{colour}]{label}")
+        else:
+            print(text or title, label)
+
+    def note(self, *values: Any) -> None:
+        """
+        Prints a line meant for people watching, not for logs
+        """
+        print(*values)
+
+    def close(self) -> None:
+        """
+        Finishes the report
+        """
+
+
+class HeadlessReporter(Reporter):
+    """
+    Buffers json lines of the actions taken, leaving out skipped items and notes unless verbose, and
+    ends with a summary of every calendar's counts (if anything was recorded)
+    """
+
+    headless = True
+
+    def __init__(self, verbose: bool = False) -> None:
+        super().__init__(verbose)
+        self.started = time.perf_counter()
+        self._lines: List[str] = []
+
+    def track(self, items: Iterable[T], description: str) -> Iterator[T]:
+        return iter(items)
+
+    # pylint: disable=too-many-arguments
+    def record(
+        self, action: str, calendar: str, title: str, latency: Optional[float] = None, text: Optional[str] = None
+    ) -> None:
+        self.counts.setdefault(calendar, Counter())[action] += 1
+        if action == "skip" and not self.verbose:
+            return
+        line: Dict[str, Any] = {"action": action, "calendar": calendar, "title": title}
+        if latency is not None:
+            line["latency_ms"] = round(latency * 1000, 1)
+        self._write(line)
+
+    def note(self, *values: Any) -> None:
+        text = " ".join(str(v) for v in values).strip()
+        if self.verbose and text:
+            self._write({"action": "note", "text": text})
+
+    def _write(self, line: Dict[str, Any]) -> None:
+        self._lines.append(json.dumps(line, separators=(",", ":")))
+        if len(self._lines) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes out the buffered lines
+        """
+        if self._lines:
+            sys.stdout.write("\n".join(self._lines) + "\n")
+            sys.stdout.flush()
+            self._lines = []
+
+    def close(self) -> None:
+        if not self.counts:
+            self.flush()
+            return
+        self._write(
+            {
+                "action": "summary",
+                "elapsed_s": round(time.perf_counter() - self.started, 3),
+                "calendars": {calendar: dict(sorted(counts.items())) for calendar, counts in self.counts.items()},
+            }
+        )
+        self.flush()
+        self.counts = {}
+        self.started = time.perf_counter()
+
+
+_REPORTER: Optional[Reporter] = None
+
+
+def configure(headless: Optional[bool] = None, verbose: Optional[bool] = None) -> Reporter:
+    """
+    Replaces the shared reporter, which is headless when stdout isn't a terminal unless told otherwise.
+    Live reports show every item, headless ones only the changes, unless told otherwise
+    """
+    # pylint: disable=global-statement
+    global _REPORTER
+    if headless is None:
+        headless = not sys.stdout.isatty()
+    if headless:
+        _REPORTER = HeadlessReporter(bool(verbose))
+    else:
+        _REPORTER = Reporter(verbose is None or verbose)
+    return _REPORTER
+
+
+def add_arguments(parser: ArgumentParser) -> None:
+    """
+    Adds the --output and --verbose options, see configure()
+    """
+    parser.add_argument(
+        "--output",
+        choices=list(OUTPUTS),
+        default="auto",
+        help="Render progress live, or log json lines (the default when stdout isn't a terminal)",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", default=None, help="Report unchanged items too, even when logging json"
+    )
+
+
+def current() -> Reporter:
+    """
+    Gets the shared reporter, picking one for stdout the first time
+    """
+    return _REPORTER if _REPORTER is not None else configure()
@@ -0,0 +1,140 @@
+"""
+Routes media to calendars from a declarative config, loading each media item and building its
+google event only once no matter how many calendars it is synced to
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import yaml
+
+from . import reporting
+from .catalog import Catalog
+from .events import GoogleMediaEvent
+from .scheduler import QuotaBudget
+from .syncstate import SyncState
+from .yamlcalendar import YamlCalendar
+
+DEFAULT_CONFIG_PATH = Path("calendars.yaml")
+
+
+class MediaFilter:
+    """
+    Filters the media in a calendar's folders by release date
+    """
+
+    def __init__(self, released_after: Optional[date] = None, released_before: Optional[date] = None) -> None:
+        self.released_after = released_after
+        self.released_before = released_before
+
+    def __call__(self, item: GoogleMediaEvent) -> bool:
+        release_date: Any = item.sort_val()
+        if self.released_after is not None and release_date < self.released_after:
+            return False
+        if self.released_before is not None and release_date > self.released_before:
+            return False
+        return True
+
+    def __repr__(self) -> str:
+        return f"MediaFilter(released_after={self.released_after}, released_before={self.released_before})"
+
+
+def calendar_from_route(name: str, cal_id: str, route: Dict[str, Any], service: Any, data_dir: Path) -> YamlCalendar:
+    """
+    Creates a calendar from a route in the routing config
+    """
+    filters = route.get("filters")
+    return YamlCalendar(
+        name,
+        cal_id,
+        [data_dir / folder for folder in route.get("movies", [])],
+        [data_dir / folder for folder in route.get("shows", [])],
+        service,
+        MediaFilter(**filters) if filters else None,
+        route.get("region"),
+    )
+
+
+def load_routes(config_path: Path = DEFAULT_CONFIG_PATH) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads the routing config
+    """
+    with open(config_path, "r", encoding="UTF-8") as config_file:
+        return yaml.safe_load(config_file)
+
+
+def load_calendars(
+    ids: Dict[str, str], service: Any, config_path: Path = DEFAULT_CONFIG_PATH, data_dir: Path = Path("data")
+) -> Dict[str, YamlCalendar]:
+    """
+    Creates every calendar defined in the routing config, keyed by the same keys as the config
+    """
+    return {
+        key: calendar_from_route(route["name"], ids[key], route, service, data_dir)
+        for key, route in load_routes(config_path).items()
+    }
+
+
+class Router:
+    """
+    Syncs many calendars from one shared catalog
+    """
+
+    def __init__(self, calendars: Dict[str, YamlCalendar]) -> None:
+        self.calendars = calendars
+        self.catalog = Catalog.for_calendars(calendars.values())
+
+    def load(self) -> None:
+        """
+        Loads every folder used by any calendar, once
+        """
+        self.catalog.load()
+
+    # pylint: disable=too-many-arguments
+    def sync(
+        self,
+        force: bool = False,
+        state: Optional[SyncState] = None,
+        window_days: Optional[int] = None,
+        full_every: int = 7,
+        record: bool = True,
+        budget: Optional[QuotaBudget] = None,
+    ) -> None:
+        """
+        Fans every loaded item out to each calendar it belongs on.  Items are shared, so each google
+        event payload is only built the first time any calendar compares or writes it.
+        With window_days (and a state to remember full syncs in) only releases from that many days ago
+        onwards are synced, with a full reconciliation every full_every days.  With a state, archived
+        items are only diffed when their segments changed since the last sync, on full reconciliations, or with force.
+        With a budget, calendars stop writing once it's spent, and a calendar that couldn't finish isn't
+        remembered as synced so the next run carries on with it.  Syncs are only remembered if record is set
+        """
+        if not self.catalog.items:
+            self.load()
+        today = date.today()
+        for cal in self.calendars.values():
+            if budget is not None and budget.spent:
+                reporting.current().note("    DEFERRED", cal.name, "(the quota budget is spent)")
+                continue
+            cal.budget = budget
+            sealed = []
+            archive_hash = self.catalog.archive_hash(cal)
+            if state is not None:
+                cal.window_start = state.window_start(cal.cal_id, window_days, full_every, today)
+                unchanged = archive_hash is not None and state.calendar(cal.cal_id).get("archive") == archive_hash
+                if unchanged and not force and not state.full_sync_due(cal.cal_id, full_every, today):
+                    sealed = self.catalog.sealed_items([*cal.movie_dirs, *cal.show_dirs])
+            deferred = cal.sync_google_events(
+                self.catalog.items_in(cal.movie_dirs), self.catalog.items_in(cal.show_dirs), force, sealed
+            )
+            if state is not None and record:
+                state.record_deferred(cal.cal_id, deferred)
+                if not deferred:
+                    state.record_sync(cal.cal_id, cal.window_start, today)
+                    state.calendar(cal.cal_id)["archive"] = archive_hash
+                if budget is not None:
+                    state.record_quota(today, budget.used)
+                state.save()
@@ -0,0 +1,233 @@
+"""
+Plans the calls that sync a calendar, and schedules them most urgent first under a quota budget.
+Upcoming releases are written before media whose data changed recently, which are written before
+the back catalog, so when a big sync (a new calendar, --force or a new franchise) runs out of the
+daily Calendar API quota it's the old releases that wait for the next run
+"""
+
+from __future__ import annotations
+
+import math
+from collections import deque
+from datetime import date, timedelta
+from pathlib import Path
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .events import GoogleMediaEvent
+from .helpers import run_git, truncate
+
+# What each kind of call costs against the Calendar API quota, which counts every request the same
+CALL_COSTS = {"list": 1, "insert": 1, "update": 1, "patch": 1, "delete": 1}
+
+# The most events the Calendar API returns in a page when listing
+LIST_PAGE_SIZE = 250
+
+# Media whose yaml was committed in this many days counts as recently changed
+RECENT_DAYS = 7
+
+
+class SyncCall(NamedTuple):
+    """
+    An insert, update, patch or delete to make on a calendar, with when the media it's for releases (or
+    the stale event started) and the yaml file the media is from, which decide how urgent it is
+    """
+
+    method: str
+    kwargs: Dict[str, Any]
+    title: str
+    text: str
+    release: Optional[date] = None
+    source: Optional[Path] = None
+
+    @property
+    def action(self) -> str:
+        """
+        The change the call makes, as it's reported and counted.  Patches are reported as updates
+        """
+        return "update" if self.method == "patch" else self.method
+
+
+def _item_call(method: str, kwargs: Dict[str, Any], item: GoogleMediaEvent) -> SyncCall:
+    """
+    Gets a call that writes an item's event
+    """
+    return SyncCall(method, kwargs, item.title, str(item), item.last_release_date(), item.file_path)
+
+
+def _delete_call(event: Dict) -> SyncCall:
+    """
+    Gets the call that deletes a stale event
+    """
+    summary = event.get("summary", "")
+    item_time = date.fromisoformat(event["start"]["date"])
+    text = f"{truncate(summary, 26)} {item_time.strftime('%b %d, %Y')}"
+    return SyncCall("delete", {"eventId": event["id"]}, summary, text, item_time)
+
+
+def plan_calls(
+    groups: Sequence[Sequence[GoogleMediaEvent]], events: List[Dict], force: bool = False, rewrite: bool = False
+) -> Tuple[List[SyncCall], List[GoogleMediaEvent]]:
+    """
+    Works out the calls that sync a calendar's events to the groups of items (movies then shows) the
+    same way YamlCalendar._create_google_event() does, and which items were already up to date
+    """
+    by_summary: Dict[str, Deque[Dict]] = {}
+    for event in events:
+        if "summary" in event:
+            by_summary.setdefault(event["summary"], deque()).append(event)
+
+    calls = []
+    skipped = []
+    for items in groups:
+        for item in sorted(items, key=lambda i: i.sort_val()):
+            matches = by_summary.get(item.title)
+            match = matches.popleft() if matches else None
+            if match is None:
+                calls.append(_item_call("insert", {"body": item.to_google_event()}, item))
+                continue
+            changes = item.changed_fields(match) if force or item != match else {}
+            if rewrite:
+                calls.append(_item_call("update", {"eventId": match["id"], "body": item.to_google_event()}, item))
+            elif changes:
+                calls.append(_item_call("patch", {"eventId": match["id"], "body": changes}, item))
+            else:
+                skipped.append(item)
+
+    # Events are matched in the order they were listed, so whatever is left over is stale
+    unmatched = {id(e) for matches in by_summary.values() for e in matches}
+    stale = [e for e in events if "summary" not in e or id(e) in unmatched]
+    calls += [_delete_call(e) for e in sorted(stale, key=lambda e: date.fromisoformat(e["start"]["date"]))]
+    return calls, skipped
+
+
+def estimate_cost(calls: Sequence[SyncCall], listed_events: int = 0) -> int:
+    """
+    Estimates the quota a plan costs, including listing the events it was planned from
+    """
+    pages = max(1, math.ceil(listed_events / LIST_PAGE_SIZE))
+    return pages * CALL_COSTS["list"] + sum(CALL_COSTS[call.method] for call in calls)
+
+
+def _resolve(name: str) -> Path:
+    """
+    Resolves a path git printed, counting a .patch as a change to the yaml it patches
+    """
+    path = Path.cwd() / name
+    return (path.with_suffix(".yaml") if path.suffix == ".patch" else path).resolve()
+
+
+def change_dates(paths: Iterable[Path], today: date) -> Dict[Path, date]:
+    """
+    Gets the day each media yaml (or its .patch) was last committed, with uncommitted changes counting
+    as today.  Commit dates are used rather than mtimes since a fresh checkout gives every file the
+    same mtime.  Commits without parents (the first commit, or where a shallow clone was cut off) add
+    every file, so they don't count as changing any.  Files git doesn't know about get no date
+    """
+    wanted = {path.resolve(): path for path in paths}
+    folders = sorted({str(path.parent) for path in wanted.values()})
+    if not folders:
+        return {}
+
+    changed: Dict[Path, date] = {}
+    log = run_git(
+        "-c", "core.quotePath=false", "log", "--format=%x00%P %cs", "--name-only", "--relative", "--", *folders
+    )
+    for commit in (log or "").split("\0")[1:]:
+        header, *names = commit.split("\n")
+        parents, day = header.rsplit(" ", 1)
+        if parents:
+            for name in filter(None, names):
+                changed.setdefault(_resolve(name), date.fromisoformat(day))
+
+    # Log is newest first so the first date seen for a file is its last change, but edits that
+    # haven't been committed are newer still
+    uncommitted = [
+        run_git("-c", "core.quotePath=false", "diff", "--name-only", "--relative", "HEAD", "--", *folders),
+        run_git("-c", "core.quotePath=false", "ls-files", "--others", "--exclude-standard", "--", *folders),
+    ]
+    for name in "\n".join(output or "" for output in uncommitted).splitlines():
+        changed[_resolve(name)] = today
+    return {wanted[path]: day for path, day in changed.items() if path in wanted}
+
+
+def urgency(
+    call: SyncCall, today: date, changed: Optional[Mapping[Path, date]] = None, recent_days: int = RECENT_DAYS
+) -> Tuple[int, int, int]:
+    """
+    Gets the key that orders calls most urgent first: upcoming (and still releasing) media soonest
+    first, then media that was released or changed (see change_dates()) in the last recent_days most
+    recent first, then the back catalog newest first.  Ties go to the newest release
+    """
+    release = call.release if call.release is not None else date.min
+    if release >= today:
+        return 0, release.toordinal(), 0
+    recent = today - timedelta(days=recent_days)
+    modified = (changed or {}).get(call.source) if call.source is not None else None
+    if release >= recent or (modified is not None and modified >= recent):
+        return 1, -max(release, modified or date.min).toordinal(), -release.toordinal()
+    return 2, -release.toordinal(), 0
+
+
+class QuotaBudget:
+    """
+    How many calendar api calls may still be made, shared by every calendar synced in a run.  With no
+    limit it only counts what was used
+    """
+
+    def __init__(self, limit: Optional[int] = None, used: int = 0) -> None:
+        self.limit = limit
+        self.used = used
+
+    @property
+    def spent(self) -> bool:
+        """
+        Checks if there's no quota left for even one call
+        """
+        return self.limit is not None and self.used >= self.limit
+
+    def charge(self, cost: int) -> None:
+        """
+        Counts calls that were made whether or not they fit in the budget, like listing
+        """
+        self.used += cost
+
+    def spend(self, cost: int) -> bool:
+        """
+        Counts calls that are about to be made, unless they don't fit in the budget
+        """
+        if self.limit is not None and self.used + cost > self.limit:
+            return False
+        self.used += cost
+        return True
+
+
+def schedule(
+    calls: Sequence[SyncCall], today: date, budget: Optional[QuotaBudget] = None
+) -> Tuple[List[SyncCall], List[SyncCall]]:
+    """
+    Orders the calls most urgent first, and splits them into those the budget allows now and those that
+    have to wait for the next run.  Once one call doesn't fit nothing after it is made, so a smaller call
+    never jumps ahead of a more urgent one.  Without a limit every call is made this run anyway, so the
+    recently changed media isn't looked up in git to rank it
+    """
+    changed: Dict[Path, date] = {}
+    if budget is not None and budget.limit is not None:
+        changed = change_dates((call.source for call in calls if call.source is not None), today)
+    ordered = sorted(calls, key=lambda call: urgency(call, today, changed))
+    if budget is None:
+        return ordered, []
+    for index, call in enumerate(ordered):
+        if not budget.spend(CALL_COSTS[call.method]):
+            return ordered[:index], ordered[index:]
+    return ordered, []
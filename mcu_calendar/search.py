@@ -0,0 +1,195 @@
+"""
+An inverted index over the catalog, for finding media by (partial or misspelled) title words, by
+imdb id, by a url in its description, or by the file name its title would get
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from difflib import get_close_matches
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from .events import GoogleMediaEvent
+from .helpers import get_safe_title
+
+URL_PATTERN = re.compile(r"https?://\S+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Postings weights, so a word in a title outranks the same word in a description
+TITLE_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+# How close a misspelled word has to be to a known word (see difflib.SequenceMatcher.ratio)
+FUZZY_CUTOFF = 0.8
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase words
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def normalize_url(url: str) -> str:
+    """
+    Gets the form urls are indexed by, so trailing slashes and the scheme don't matter
+    """
+    return url.split("://", 1)[-1].rstrip("/").lower()
+
+
+class _Entry(NamedTuple):
+    """
+    Everything an item was indexed under, so it can be removed again
+    """
+
+    item: GoogleMediaEvent
+    postings: Dict[str, int]
+    imdb_id: Optional[str]
+    urls: Set[str]
+    safe_title: str
+
+
+class SearchIndex:
+    """
+    Token to media postings, plus exact lookups by imdb id, url and safe title, all keyed by yaml file
+    """
+
+    def __init__(self, items: Iterable[GoogleMediaEvent] = ()) -> None:
+        self._entries: Dict[Path, _Entry] = {}
+        self._postings: Dict[str, Dict[Path, int]] = {}
+        self._imdb_ids: Dict[str, Set[Path]] = {}
+        self._urls: Dict[str, Set[Path]] = {}
+        self._safe_titles: Dict[str, Set[Path]] = {}
+        # The sorted vocabulary for prefix matches, rebuilt the first time it's needed after a change
+        self._vocabulary: Optional[List[str]] = None
+        for item in items:
+            self.add(item)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, item: GoogleMediaEvent) -> None:
+        """
+        Indexes an item, replacing whatever was indexed for its file before
+        """
+        self.remove(item.file_path)
+        postings = dict.fromkeys(tokenize(URL_PATTERN.sub(" ", item.description)), DESCRIPTION_WEIGHT)
+        postings.update(dict.fromkeys(tokenize(item.title), TITLE_WEIGHT))
+        urls = {normalize_url(url) for url in URL_PATTERN.findall(item.description)}
+        entry = _Entry(item, postings, item.imdb_id, urls, get_safe_title(item.title))
+
+        path = item.file_path
+        self._entries[path] = entry
+        for token, weight in postings.items():
+            if token not in self._postings:
+                self._postings[token] = {}
+                self._vocabulary = None
+            self._postings[token][path] = weight
+        if entry.imdb_id:
+            self._imdb_ids.setdefault(entry.imdb_id, set()).add(path)
+        for url in urls:
+            self._urls.setdefault(url, set()).add(path)
+        self._safe_titles.setdefault(entry.safe_title, set()).add(path)
+
+    def remove(self, path: Path) -> None:
+        """
+        Removes whatever was indexed for a file, if anything
+        """
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        for token in entry.postings:
+            _discard(self._postings, token, path)
+            if token not in self._postings:
+                self._vocabulary = None
+        if entry.imdb_id:
+            _discard(self._imdb_ids, entry.imdb_id, path)
+        for url in entry.urls:
+            _discard(self._urls, url, path)
+        _discard(self._safe_titles, entry.safe_title, path)
+
+    def update(self, items: Iterable[GoogleMediaEvent], removed_paths: Iterable[Path]) -> None:
+        """
+        Reindexes only the items that changed and removes the files that are gone
+        """
+        for path in removed_paths:
+            self.remove(path)
+        for item in items:
+            self.add(item)
+
+    def _matching_tokens(self, word: str, is_prefix: bool) -> List[str]:
+        """
+        Gets the known words a query word matches: itself, the words it starts if it's the word being
+        typed, or failing those the closest spellings
+        """
+        if word in self._postings and not is_prefix:
+            return [word]
+        if is_prefix:
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self._postings)
+            matches = []
+            start = bisect_left(self._vocabulary, word)
+            for token in self._vocabulary[start:]:
+                if not token.startswith(word):
+                    break
+                matches.append(token)
+            if matches:
+                return matches
+        return get_close_matches(word, list(self._postings), n=3, cutoff=FUZZY_CUTOFF)
+
+    def search(self, query: str, limit: int = 10) -> List[GoogleMediaEvent]:
+        """
+        Gets the media matching every word of the query, best matches first.  The last word also
+        matches as a prefix, and words that match nothing are matched to their closest spellings
+        """
+        words = tokenize(query)
+        scores: Optional[Dict[Path, int]] = None
+        for i, word in enumerate(words):
+            word_scores: Dict[Path, int] = {}
+            for token in self._matching_tokens(word, is_prefix=i == len(words) - 1):
+                for path, weight in self._postings[token].items():
+                    word_scores[path] = max(word_scores.get(path, 0), weight)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {path: score + word_scores[path] for path, score in scores.items() if path in word_scores}
+            if not scores:
+                return []
+
+        ranked = sorted((scores or {}).items(), key=lambda s: (-s[1], self._entries[s[0]].item.title, s[0]))
+        return [self._entries[path].item for path, _ in ranked[:limit]]
+
+    def _items(self, paths: Optional[Set[Path]]) -> List[GoogleMediaEvent]:
+        return [self._entries[path].item for path in sorted(paths or ())]
+
+    def by_imdb_id(self, imdb_id: str) -> List[GoogleMediaEvent]:
+        """
+        Gets the media with an imdb id (every season of a show shares one)
+        """
+        return self._items(self._imdb_ids.get(imdb_id.strip()))
+
+    def by_url(self, url: str) -> List[GoogleMediaEvent]:
+        """
+        Gets the media with a url in its description
+        """
+        return self._items(self._urls.get(normalize_url(url)))
+
+    def by_safe_title(self, safe_title: str) -> List[GoogleMediaEvent]:
+        """
+        Gets the media whose title makes the given file name (see helpers.get_safe_title)
+        """
+        return self._items(self._safe_titles.get(safe_title))
+
+
+def _discard(index: Dict[str, Set[Path]] | Dict[str, Dict[Path, int]], key: str, path: Path) -> None:
+    paths = index.get(key)
+    if paths is None:
+        return
+    if isinstance(paths, dict):
+        paths.pop(path, None)
+    else:
+        paths.discard(path)
+    if not paths:
+        del index[key]
@@ -0,0 +1,390 @@
+"""
+A sharded sync, for fan outs too big for one interpreter.  Each calendar's media is split by release
+date into work units, which are queued in a sqlite file.  Worker processes (on this machine, or on any
+machine that can open the file on a shared disk) claim units under a lease they keep renewing while they
+work, so if a worker crashes its lease runs out and the unit is claimed again by another one.  Each
+worker reports the calls it made to the queue, and they're merged into one report once every unit is done
+"""
+
+from __future__ import annotations
+
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from . import reporting
+from .catalog import Catalog
+from .fanout import calendar_groups
+from .scheduler import plan_calls
+from .yamlcalendar import YamlCalendar
+
+DEFAULT_QUEUE_PATH = Path(".shard_queue.sqlite")
+
+# Seconds a claimed unit is held for without its worker renewing the lease
+DEFAULT_LEASE = 60.0
+
+# How many times a unit is claimed before it's given up on
+MAX_ATTEMPTS = 3
+
+# Seconds an idle worker waits before checking for expired leases again
+POLL_SECONDS = 1.0
+
+
+class ShardError(Exception):
+    """
+    Raised when one or more work units failed on every attempt
+    """
+
+    def __init__(self, failures: List[Tuple[WorkUnit, str]]) -> None:
+        self.failures = failures
+        details = "\n".join(f"  {unit}: {error}" for unit, error in failures)
+        super().__init__(f"{len(failures)} work unit(s) failed:\n{details}")
+
+
+class WorkUnit(NamedTuple):
+    """
+    The media in one calendar whose events start from start (inclusive) to end (exclusive), as iso
+    dates, with None for no bound
+    """
+
+    calendar: str
+    start: Optional[str] = None
+    end: Optional[str] = None
+
+    def __str__(self) -> str:
+        return f"{self.calendar} [{self.start or '...'}, {self.end or '...'})"
+
+    def contains(self, event: Dict[str, Any]) -> bool:
+        """
+        Checks if a google event starts inside this unit's range
+        """
+        start = event["start"]["date"]
+        return (self.start is None or start >= self.start) and (self.end is None or start < self.end)
+
+
+class ClaimedUnit(NamedTuple):
+    """
+    A work unit a worker holds the lease on
+    """
+
+    unit_id: int
+    unit: WorkUnit
+    attempt: int
+
+
+def plan_units(calendars: Dict[str, YamlCalendar], catalog: Catalog, shards: int) -> List[WorkUnit]:
+    """
+    Splits each calendar into up to shards work units with about the same number of items each.  Units
+    always cover every date, so events outside the range of any media are still found to be stale
+    """
+    units = []
+    for key, cal in calendars.items():
+        starts = sorted(i.to_google_event()["start"]["date"] for group in calendar_groups(catalog, cal) for i in group)
+        bounds = sorted({starts[len(starts) * n // shards] for n in range(1, shards)} if starts else set())
+        edges: List[Optional[str]] = [None, *bounds, None]
+        units += [WorkUnit(key, start, end) for start, end in zip(edges, edges[1:])]
+    return units
+
+
+class WorkQueue:
+    """
+    Work units in a sqlite file that any number of workers claim from.  Claims are made in an immediate
+    transaction, so two workers can never claim the same unit unless its lease has run out
+    """
+
+    def __init__(self, path: Path = DEFAULT_QUEUE_PATH, lease: float = DEFAULT_LEASE) -> None:
+        self.path = path
+        self.lease = lease
+        # Transactions are begun explicitly, so that claims can take the write lock up front.  The default
+        # rollback journal is kept rather than WAL, since WAL doesn't work when the file is on a network disk
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS units (id INTEGER PRIMARY KEY, calendar TEXT NOT NULL, range_start TEXT,"
+            " range_end TEXT, status TEXT NOT NULL DEFAULT 'pending', owner TEXT, lease_until REAL,"
+            " attempts INTEGER DEFAULT 0, counts TEXT, error TEXT)"
+        )
+
+    def __enter__(self) -> WorkQueue:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def plan(self, units: Iterable[WorkUnit]) -> None:
+        """
+        Replaces everything in the queue with the given units
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.execute("DELETE FROM units")
+        self.db.executemany("INSERT INTO units (calendar, range_start, range_end) VALUES (?, ?, ?)", units)
+        self.db.execute("COMMIT")
+
+    def claim(self, worker: str) -> Optional[ClaimedUnit]:
+        """
+        Claims the first pending unit, or unit whose lease ran out, if there is one.  Units whose lease
+        ran out MAX_ATTEMPTS times are failed instead
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(
+                "UPDATE units SET status = 'failed', error = 'The lease ran out on every attempt'"
+                " WHERE status = 'claimed' AND lease_until < ? AND attempts >= ?",
+                (now, MAX_ATTEMPTS),
+            )
+            row = self.db.execute(
+                "SELECT id, calendar, range_start, range_end, attempts FROM units"
+                " WHERE status = 'pending' OR (status = 'claimed' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                self.db.execute(
+                    "UPDATE units SET status = 'claimed', owner = ?, lease_until = ?, attempts = attempts + 1"
+                    " WHERE id = ?",
+                    (worker, now + self.lease, row[0]),
+                )
+        finally:
+            self.db.execute("COMMIT")
+        return None if row is None else ClaimedUnit(row[0], WorkUnit(*row[1:4]), row[4] + 1)
+
+    def renew(self, unit_id: int, worker: str) -> bool:
+        """
+        Extends the worker's lease on a unit, returning False if it has lost the lease to another worker
+        """
+        cursor = self.db.execute(
+            "UPDATE units SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'claimed'",
+            (time.time() + self.lease, unit_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, unit_id: int, worker: str, counts: Counter[str]) -> bool:
+        """
+        Marks the worker's unit as done with the calls it made, returning False if it had lost the lease
+        """
+        cursor = self.db.execute(
+            "UPDATE units SET status = 'done', counts = ? WHERE id = ? AND owner = ? AND status = 'claimed'",
+            (json.dumps(counts), unit_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, unit_id: int, worker: str, error: str) -> None:
+        """
+        Gives up the worker's unit after an error, so it's claimed again unless it has run out of attempts
+        """
+        self.db.execute(
+            "UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ?"
+            " WHERE id = ? AND owner = ? AND status = 'claimed'",
+            (MAX_ATTEMPTS, error, unit_id, worker),
+        )
+
+    def unfinished(self) -> int:
+        """
+        Counts the units that are neither done nor failed
+        """
+        return self.db.execute("SELECT COUNT(*) FROM units WHERE status IN ('pending', 'claimed')").fetchone()[0]
+
+    def results(self) -> Tuple[Dict[str, Counter[str]], List[Tuple[WorkUnit, str]]]:
+        """
+        Gets the calls made to each calendar by every done unit merged together, and every failed unit's error
+        """
+        counts: Dict[str, Counter[str]] = {}
+        failures = []
+        for calendar, start, end, status, unit_counts, error in self.db.execute(
+            "SELECT calendar, range_start, range_end, status, counts, error FROM units ORDER BY id"
+        ):
+            counts.setdefault(calendar, Counter())
+            if status == "done":
+                counts[calendar].update(json.loads(unit_counts))
+            elif status == "failed":
+                failures.append((WorkUnit(calendar, start, end), error))
+        return counts, failures
+
+    def close(self) -> None:
+        """
+        Closes the queue's database connection
+        """
+        self.db.close()
+
+
+class _LeaseKeeper:
+    """
+    Renews a worker's lease on a background thread, on its own connection, until it's stopped
+    """
+
+    def __init__(self, path: Path, lease: float, claimed: ClaimedUnit, worker: str) -> None:
+        self.path = path
+        self.lease = lease
+        self.claimed = claimed
+        self.worker = worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"LeaseKeeper {claimed.unit_id}", daemon=True)
+
+    def __enter__(self) -> _LeaseKeeper:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        with WorkQueue(self.path, self.lease) as queue:
+            while not self._stop.wait(self.lease / 3):
+                if not queue.renew(self.claimed.unit_id, self.worker):
+                    self.lost = True
+                    return
+
+
+def list_unit_events(calendar: YamlCalendar, unit: WorkUnit) -> List[Dict]:
+    """
+    Gets the events on the calendar that start inside the unit's range
+    """
+    kwargs: Dict[str, Any] = {"calendarId": calendar.cal_id}
+    if unit.start is not None:
+        kwargs["timeMin"] = f"{unit.start}T00:00:00Z"
+    if unit.end is not None:
+        kwargs["timeMax"] = f"{unit.end}T00:00:00Z"
+    events = []
+    while True:
+        events_result = calendar.google_service.list(**kwargs).execute()
+        events += events_result.get("items", [])
+        if not events_result.get("nextPageToken"):
+            # Listing finds events that overlap the range, but only those starting in it belong to the unit
+            return [e for e in events if unit.contains(e)]
+        kwargs["pageToken"] = events_result["nextPageToken"]
+
+
+def sync_unit(calendar: YamlCalendar, catalog: Catalog, unit: WorkUnit, force: bool = False) -> Counter[str]:
+    """
+    Syncs the part of the calendar in the unit's range, returning how many of each call were made
+    """
+    groups = [[i for i in group if unit.contains(i.to_google_event())] for group in calendar_groups(catalog, calendar)]
+    calls, skipped = plan_calls(groups, list_unit_events(calendar, unit), force, calendar.rewrite)
+    report = reporting.current()
+    counts: Counter[str] = Counter(skip=len(skipped))
+    for call in calls:
+        start = time.perf_counter()
+        getattr(calendar.google_service, call.method)(calendarId=calendar.cal_id, **call.kwargs).execute()
+        counts[call.action] += 1
+        report.record(call.action, calendar.name, call.title, time.perf_counter() - start, call.text)
+    return counts
+
+
+def worker_name() -> str:
+    """
+    Gets a name for this process that's unique across every machine sharing a queue
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# pylint: disable=too-many-arguments
+def run_worker(
+    queue_path: Path,
+    calendars_for: Callable[[], Dict[str, YamlCalendar]],
+    force: bool = False,
+    lease: float = DEFAULT_LEASE,
+    worker: Optional[str] = None,
+    poll: float = POLL_SECONDS,
+) -> int:
+    """
+    Claims and syncs work units until every unit in the queue is done or failed, returning how many
+    this worker did.  The calendars are created (and their media loaded) in the worker, once
+    """
+    worker = worker or worker_name()
+    calendars = calendars_for()
+    catalog = Catalog.for_calendars(calendars.values())
+    catalog.load()
+    done = 0
+    with WorkQueue(queue_path, lease) as queue:
+        while True:
+            claimed = queue.claim(worker)
+            if claimed is None:
+                if not queue.unfinished():
+                    return done
+                # Other workers hold the rest, wait in case one of them dies and its lease runs out
+                time.sleep(poll)
+                continue
+            with _LeaseKeeper(queue_path, lease, claimed, worker) as keeper:
+                try:
+                    counts = sync_unit(calendars[claimed.unit.calendar], catalog, claimed.unit, force)
+                except HttpError as error:
+                    queue.fail(claimed.unit_id, worker, f"{type(error).__name__}: {error}")
+                    continue
+            if queue.complete(claimed.unit_id, worker, counts):
+                done += 1
+            elif keeper.lost:
+                reporting.current().note(f"    LOST LEASE {claimed.unit} (attempt {claimed.attempt})")
+
+
+def _worker_process(*args: Any) -> None:
+    """
+    Runs a worker in a child process, flushing what it reported before the process exits
+    """
+    try:
+        run_worker(*args)
+    finally:
+        reporting.current().close()
+
+
+# pylint: disable=too-many-arguments
+def shard_sync(
+    calendars_for: Callable[[], Dict[str, YamlCalendar]],
+    workers: int,
+    shards: Optional[int] = None,
+    force: bool = False,
+    queue_path: Path = DEFAULT_QUEUE_PATH,
+    lease: float = DEFAULT_LEASE,
+) -> Dict[str, Counter[str]]:
+    """
+    Splits every calendar into shards work units (one per worker by default), queues them, and syncs
+    them across worker processes.  calendars_for has to be picklable, since each worker creates its own
+    calendars and services.  Other machines can help by running run_worker() on the same queue file.
+    Returns the calls made to each calendar, and raises a ShardError if any unit failed
+    """
+    calendars = calendars_for()
+    catalog = Catalog.for_calendars(calendars.values())
+    catalog.load()
+    with WorkQueue(queue_path, lease) as queue:
+        queue.plan(plan_units(calendars, catalog, shards or workers))
+
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(queue_path, calendars_for, force, lease), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    # A worker only exits once the queue is finished, unless it crashed, so finish whatever is left here
+    with WorkQueue(queue_path, lease) as queue:
+        if queue.unfinished():
+            run_worker(queue_path, calendars_for, force, lease)
+        return report_results(queue)
+
+
+def report_results(queue: WorkQueue) -> Dict[str, Counter[str]]:
+    """
+    Reports the merged calls made to each calendar, raising a ShardError if any unit failed
+    """
+    counts, failures = queue.results()
+    report = reporting.current()
+    for calendar, calendar_counts in counts.items():
+        report.note(
+            f"    {calendar}: {calendar_counts['insert']} added, {calendar_counts['update']} updated,"
+            f" {calendar_counts['delete']} deleted, {calendar_counts['skip']} skipped"
+        )
+    report.note()
+    if failures:
+        raise ShardError(failures)
+    return counts
@@ -0,0 +1,214 @@
+"""
+A streaming sync for catalogs too big to hold in memory.  Media is streamed from disk one file at a
+time in file name order, the calendar's events are streamed a page at a time into a disk backed index
+keyed by summary, and each item is joined against that index as it's read.  The resulting inserts,
+updates and deletes go through a bounded queue to a writer thread, so reading and writing overlap
+without either getting far ahead of the other.  See benchmarks/stream_benchmark.py for its memory use
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date
+from queue import Queue
+from types import TracebackType
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Type
+
+from . import reporting
+from .helpers import truncate
+from .syncstate import SyncState
+from .yamlcalendar import YamlCalendar
+
+# The most mutations that can be waiting on the writer before reading pauses
+DEFAULT_MAX_PENDING = 64
+
+# The only parts of an event that syncing compares, patches or needs, everything else is dropped before it's indexed
+_EVENT_KEYS = ("id", "summary", "description", "source", "transparency", "start", "end", "recurrence")
+
+# Caps sqlite's page cache at about 2MB (negative sizes are in KiB)
+_INDEX_CACHE_SIZE = -2000
+
+
+class RemoteIndex:
+    """
+    The calendar's events, indexed by summary in a temporary on disk sqlite database.  The calendar api
+    can't list events in summary order, so rather than sorting both sides for a merge join each
+    local item looks its event up here, and whatever is never looked up is stale
+    """
+
+    def __init__(self) -> None:
+        # An empty file name is a private on disk database, which sqlite deletes when it's closed
+        self.db = sqlite3.connect("")
+        self.db.execute(f"PRAGMA cache_size = {_INDEX_CACHE_SIZE}")
+        self.db.execute("CREATE TABLE events (seq INTEGER PRIMARY KEY, summary TEXT, event TEXT NOT NULL)")
+        self.db.execute("CREATE INDEX events_summary ON events (summary)")
+
+    def __enter__(self) -> RemoteIndex:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def add(self, events: Iterable[Dict]) -> None:
+        """
+        Indexes the events, in the order they're given
+        """
+        self.db.executemany(
+            "INSERT INTO events (summary, event) VALUES (?, ?)",
+            ((event.get("summary"), json.dumps({k: event[k] for k in _EVENT_KEYS if k in event})) for event in events),
+        )
+
+    def pop(self, summary: str) -> Optional[Dict]:
+        """
+        Removes and returns the first indexed event with the summary, if there is one
+        """
+        row = self.db.execute(
+            "SELECT seq, event FROM events WHERE summary = ? ORDER BY seq LIMIT 1", (summary,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.db.execute("DELETE FROM events WHERE seq = ?", (row[0],))
+        return json.loads(row[1])
+
+    def remaining(self) -> Iterator[Dict]:
+        """
+        Lazily gets every event that hasn't been popped, in the order they were added
+        """
+        for (event,) in self.db.execute("SELECT event FROM events ORDER BY seq"):
+            yield json.loads(event)
+
+    def close(self) -> None:
+        """
+        Closes and deletes the index
+        """
+        self.db.close()
+
+
+class SyncWriter:
+    """
+    Makes calendar api calls on a background thread, in the order they're queued.  The queue is bounded,
+    so queuing blocks while the writer is max_pending calls behind.  If a call fails the rest are
+    dropped, and the error is raised by the next put() or on exit
+    """
+
+    def __init__(self, service: Any, cal_id: str, max_pending: int = DEFAULT_MAX_PENDING) -> None:
+        self.service = service
+        self.cal_id = cal_id
+        self.counts: Counter[str] = Counter()
+        self.error: Optional[BaseException] = None
+        self._queue: Queue[Optional[Tuple[str, Dict[str, Any]]]] = Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name=f"SyncWriter {cal_id}", daemon=True)
+
+    def __enter__(self) -> SyncWriter:
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        if exc is None and self.error is not None:
+            raise self.error
+
+    def put(self, method: str, **kwargs: Any) -> None:
+        """
+        Queues a call to the service's insert, update, patch or delete method
+        """
+        if self.error is not None:
+            raise self.error
+        self._queue.put((method, kwargs))
+
+    def _run(self) -> None:
+        while True:
+            call = self._queue.get()
+            if call is None:
+                return
+            # Keep draining the queue after an error, so put() never blocks on a writer that has given up
+            if self.error is not None:
+                continue
+            method, kwargs = call
+            try:
+                getattr(self.service, method)(calendarId=self.cal_id, **kwargs).execute()
+                self.counts[method] += 1
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                self.error = error
+
+
+def stream_sync(calendar: YamlCalendar, force: bool = False, max_pending: int = DEFAULT_MAX_PENDING) -> Counter[str]:
+    """
+    Syncs the calendar to its media the same way YamlCalendar.sync_google_events() does, without ever
+    holding all of the media or all of the events in memory.  Changes are reported without progress bars,
+    so they're printed as plain lines when live.  Returns how many of each call were made
+    """
+    report = reporting.current()
+    if calendar.window_start is None:
+        report.note("    STREAMING", calendar.name)
+    else:
+        report.note("    STREAMING", calendar.name, f"(since {calendar.window_start.isoformat()})")
+
+    skipped = 0
+    with RemoteIndex() as remote, SyncWriter(calendar.google_service, calendar.cal_id, max_pending) as writer:
+        remote.add(calendar.iter_google_events())
+        for item in calendar.iter_items():
+            if not calendar.in_window(item):
+                continue
+            event = remote.pop(item.title)
+            if event is None:
+                report.record("insert", calendar.name, item.title, text=str(item))
+                writer.put("insert", body=item.to_google_event())
+            elif calendar.rewrite:
+                report.record("update", calendar.name, item.title, text=str(item))
+                writer.put("update", eventId=event["id"], body=item.to_google_event())
+            else:
+                changes = item.changed_fields(event) if force or item != event else {}
+                if changes:
+                    report.record("update", calendar.name, item.title, text=str(item))
+                    writer.put("patch", eventId=event["id"], body=changes)
+                else:
+                    report.record("skip", calendar.name, item.title, text=str(item))
+                    skipped += 1
+
+        for event in remote.remaining():
+            item_time = date.fromisoformat(event["start"]["date"])
+            item_str = f"{truncate(event['summary'], 26)} {item_time.strftime('%b %d, %Y')}"
+            report.record("delete", calendar.name, event["summary"], text=item_str)
+            writer.put("delete", eventId=event["id"])
+
+    counts = Counter(writer.counts)
+    counts["update"] += counts.pop("patch", 0)
+    counts["skip"] = skipped
+    report.note(
+        f"    {counts['insert']} added, {counts['update']} updated, {counts['delete']} deleted, {skipped} skipped"
+    )
+    report.note()
+    return counts
+
+
+# pylint: disable=too-many-arguments
+def stream_calendars(
+    calendars: Iterable[YamlCalendar],
+    force: bool = False,
+    state: Optional[SyncState] = None,
+    window_days: Optional[int] = None,
+    full_every: int = 7,
+    record: bool = True,
+) -> None:
+    """
+    Stream syncs each calendar in turn, with the same sync windows as Router.sync().  Archived media is
+    always diffed, since nothing is loaded up front to tell which of it is unchanged
+    """
+    today = date.today()
+    for cal in calendars:
+        if state is not None:
+            cal.window_start = state.window_start(cal.cal_id, window_days, full_every, today)
+        stream_sync(cal, force)
+        if state is not None and record:
+            state.record_sync(cal.cal_id, cal.window_start, today)
+            state.save()
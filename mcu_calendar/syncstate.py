@@ -0,0 +1,90 @@
+"""
+Remembers what was last synced to each calendar between runs
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import yaml
+
+DEFAULT_STATE_PATH = Path(".sync_state.yaml")
+
+
+class SyncState:
+    """
+    Per calendar sync bookkeeping, keyed by calendar id and stored in a yaml file
+    """
+
+    def __init__(self, path: Path = DEFAULT_STATE_PATH) -> None:
+        self.path = path
+        self.calendars: Dict[str, Dict[str, Any]] = {}
+        # The calendar api calls made on the last day anything was synced, which share one daily quota
+        self.quota: Dict[str, Any] = {}
+        if path.exists():
+            with open(path, "r", encoding="UTF-8") as state_file:
+                data = yaml.safe_load(state_file) or {}
+            self.calendars = data.get("calendars", {})
+            self.quota = data.get("quota", {})
+
+    def calendar(self, cal_id: str) -> Dict[str, Any]:
+        """
+        Gets the (mutable) state for a single calendar
+        """
+        return self.calendars.setdefault(cal_id, {})
+
+    def window_start(self, cal_id: str, window_days: Optional[int], full_every: int, today: date) -> Optional[date]:
+        """
+        Gets the start of the sync window for a calendar, or None when it is due a full reconciliation
+        because it has never had one or hasn't had one in full_every days
+        """
+        if window_days is None or self.full_sync_due(cal_id, full_every, today):
+            return None
+        return today - timedelta(days=window_days)
+
+    def full_sync_due(self, cal_id: str, full_every: int, today: date) -> bool:
+        """
+        Checks if a calendar has never had a full sync, or hasn't had one in full_every days
+        """
+        last_full_sync = self.calendar(cal_id).get("last_full_sync")
+        return last_full_sync is None or (today - last_full_sync).days >= full_every
+
+    def record_sync(self, cal_id: str, window_start: Optional[date], today: date) -> None:
+        """
+        Records a successful sync, and when it covered the whole calendar
+        """
+        if window_start is None:
+            self.calendar(cal_id)["last_full_sync"] = today
+
+    def record_deferred(self, cal_id: str, deferred: int) -> None:
+        """
+        Records how many writes a sync had to leave for the next run, which then syncs the same way again
+        since the sync isn't recorded as done
+        """
+        if deferred:
+            self.calendar(cal_id)["deferred"] = deferred
+        else:
+            self.calendar(cal_id).pop("deferred", None)
+
+    def quota_used(self, today: date) -> int:
+        """
+        Gets how many calendar api calls have been made today
+        """
+        return self.quota.get("used", 0) if self.quota.get("date") == today else 0
+
+    def record_quota(self, today: date, used: int) -> None:
+        """
+        Records how many calendar api calls have been made today
+        """
+        self.quota = {"date": today, "used": used}
+
+    def save(self) -> None:
+        """
+        Writes the state back to disk, replacing the old file only once the new one is complete
+        """
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="UTF-8") as state_file:
+            yaml.safe_dump({"calendars": self.calendars, "quota": self.quota}, state_file, sort_keys=True)
+        tmp_path.replace(self.path)
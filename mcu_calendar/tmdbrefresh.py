@@ -0,0 +1,105 @@
+"""
+Incremental refreshes from themoviedb.org, which use TMDB's /changes endpoints to only refetch the
+tracked titles that changed since the last run, plus anything newly discovered
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+import yaml
+
+from .webscraping import TmdbApi
+
+DEFAULT_TMDB_STATE_PATH = Path(".tmdb_state.yaml")
+
+# TMDB only reports changes for up to 14 days at a time
+MAX_CHANGES_DAYS = 14
+
+
+class TmdbState:
+    """
+    The date of the last refresh, and the TMDB ids (with their imdb ids) of the titles found in each data folder
+    """
+
+    def __init__(self, path: Path = DEFAULT_TMDB_STATE_PATH) -> None:
+        self.path = path
+        self.last_run: Optional[date] = None
+        self.folders: Dict[str, Dict[int, Optional[str]]] = {}
+        if path.exists():
+            with open(path, "r", encoding="UTF-8") as state_file:
+                state = yaml.safe_load(state_file) or {}
+            self.last_run = state.get("last_run")
+            self.folders = state.get("folders", {})
+
+    def tracked(self, folder: str) -> Dict[int, Optional[str]]:
+        """
+        Gets the titles found in a data folder on the last refresh, as TMDB id to imdb id
+        """
+        return self.folders.get(folder, {})
+
+    def track(self, folder: str, titles: Dict[int, Optional[str]]) -> None:
+        """
+        Replaces the titles found in a data folder
+        """
+        self.folders[folder] = dict(titles)
+
+    def changed_ids(self, api: TmdbApi, kind: str, folders: Iterable[str], today: date) -> Optional[Set[int]]:
+        """
+        Gets which "movie" or "tv" titles tracked in the folders changed on TMDB since the last refresh,
+        or None if everything needs refetching
+        """
+        tracked = [title_id for folder in folders for title_id in self.tracked(folder)]
+        return changed_ids(api, kind, tracked, self.last_run, today)
+
+    def save(self, last_run: date) -> None:
+        """
+        Writes the state back to disk as of the given run, replacing the old file only once the new one is complete
+        """
+        self.last_run = last_run
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="UTF-8") as state_file:
+            yaml.safe_dump({"last_run": last_run, "folders": self.folders}, state_file, sort_keys=True)
+        tmp_path.replace(self.path)
+
+
+def changed_ids(
+    api: TmdbApi, kind: str, tracked: Collection[int], since: Optional[date], until: date
+) -> Optional[Set[int]]:
+    """
+    Gets which of the tracked "movie" or "tv" ids changed on TMDB between the dates, or None when that
+    can't be known (there was no last run, or it was too long ago) and everything needs refetching
+    """
+    if since is None or (until - since).days > MAX_CHANGES_DAYS:
+        return None
+    if not tracked:
+        return set()
+
+    first_page = api.changes(kind, since, until, 1)
+    pages = first_page.get("total_pages") or 1
+    # The changes list covers every title on TMDB, so when paging through all of it would take more
+    # calls than asking about each tracked title on its own, ask about each title instead
+    if pages > len(tracked):
+        return {i for i in tracked if api.title_changes(kind, i, since, until)}
+
+    changed = {result["id"] for result in first_page["results"]}
+    for page in range(2, pages + 1):
+        changed |= {result["id"] for result in api.changes(kind, since, until, page)["results"]}
+    return changed & set(tracked)
+
+
+def plan_refresh(
+    discovered: List[Dict[str, Any]], tracked: Dict[int, Optional[str]], changed: Optional[Set[int]]
+) -> Tuple[List[Dict[str, Any]], Dict[int, Optional[str]]]:
+    """
+    Splits the discovered titles into the ones that need (re)fetching, because they're new or they
+    changed, and the tracked ones that are unchanged (as TMDB id to imdb id)
+    """
+    if changed is None:
+        return discovered, {}
+    fetch = [d for d in discovered if d["id"] not in tracked or d["id"] in changed]
+    fetch_ids = {d["id"] for d in fetch}
+    unchanged = {d["id"]: tracked[d["id"]] for d in discovered if d["id"] not in fetch_ids}
+    return fetch, unchanged
@@ -0,0 +1,168 @@
+"""
+The shared HTTP transport for every outbound call: a single keep-alive requests session with sized
+connection pools and a default timeout (used by tmdbsimple and the google search calls), and the
+httplib2 object the google calendar client is built on.  Either can record to or replay from a cassette
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Mapping, NamedTuple, Optional, Tuple, Union
+
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+
+if TYPE_CHECKING:
+    from .cassette import Cassette
+
+DEFAULT_POOL_CONNECTIONS = 4
+DEFAULT_POOL_MAXSIZE = 8
+DEFAULT_TIMEOUT = 30.0
+
+Timeout = Union[None, float, Tuple[float, float], Tuple[float, None]]
+
+
+class TransportStats(NamedTuple):
+    """
+    How many requests went out, and how many new connections they needed
+    """
+
+    requests: int
+    connections: int
+
+    @property
+    def reused(self) -> int:
+        """
+        The number of requests that reused a kept alive connection
+        """
+        return max(self.requests - self.connections, 0)
+
+    def __str__(self) -> str:
+        return f"{self.requests} request(s) over {self.connections} connection(s), {self.reused} reused"
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """
+    An adapter that keeps connections alive even when asked not to, and applies a timeout to requests without one
+    """
+
+    def __init__(self, pool_connections: int, pool_maxsize: int, timeout: Timeout) -> None:
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.timeout = timeout
+
+    # pylint: disable=too-many-arguments
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Timeout = None,
+        verify: Union[bool, str] = True,
+        cert: Union[None, bytes, str, Tuple[Union[bytes, str], Union[bytes, str]]] = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        # tmdbsimple sends "Connection: close" with every request, which would throw away each pooled connection
+        if request.headers.get("Connection", "").lower() == "close":
+            del request.headers["Connection"]
+        return super().send(request, stream, self.timeout if timeout is None else timeout, verify, cert, proxies)
+
+    def stats(self) -> TransportStats:
+        """
+        Totals the requests and new connections of every host's pool
+        """
+        pools = self.poolmanager.pools
+        counts = [(pools[key].num_requests, pools[key].num_connections) for key in pools.keys()]
+        return TransportStats(sum(r for r, _ in counts), sum(c for _, c in counts))
+
+
+class PooledSession(requests.Session):
+    """
+    A requests session that sends everything through a single KeepAliveAdapter, or through a
+    CassetteAdapter when given a cassette
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        timeout: Timeout = DEFAULT_TIMEOUT,
+        cassette: Optional[Cassette] = None,
+    ) -> None:
+        super().__init__()
+        if cassette is None:
+            self.adapter = KeepAliveAdapter(pool_connections, pool_maxsize, timeout)
+        else:
+            # Imported here since the cassette adapters are built on this module's KeepAliveAdapter, so
+            # importing them at the top would be circular
+            # pylint: disable-next=import-outside-toplevel
+            from .cassette import CassetteAdapter
+
+            self.adapter = CassetteAdapter(cassette, pool_connections, pool_maxsize, timeout)
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+
+    def stats(self) -> TransportStats:
+        """
+        Gets the connection reuse stats of this session
+        """
+        return self.adapter.stats()
+
+
+_SESSION: Optional[PooledSession] = None
+_CASSETTE: Optional[Cassette] = None
+
+
+def configure(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    timeout: Timeout = DEFAULT_TIMEOUT,
+    cassette: Optional[Cassette] = None,
+) -> PooledSession:
+    """
+    Replaces the shared session with one using the given pool sizes and timeout, and hands it to tmdbsimple.
+    With a cassette, the session and every google_http() record to or replay from it
+    """
+    # pylint: disable=global-statement
+    global _SESSION, _CASSETTE
+    if _SESSION is not None:
+        _SESSION.close()
+    _CASSETTE = cassette
+    _SESSION = PooledSession(pool_connections, pool_maxsize, timeout, cassette)
+
+    # Imported here so tmdbsimple only picks up its api key from the environment when it's used
+    import tmdbsimple  # pylint: disable=import-outside-toplevel
+
+    tmdbsimple.REQUESTS_SESSION = _SESSION
+    return _SESSION
+
+
+def session() -> PooledSession:
+    """
+    Gets the shared session, creating it with the default settings the first time
+    """
+    return _SESSION if _SESSION is not None else configure()
+
+
+def stats() -> TransportStats:
+    """
+    Gets the connection reuse stats of the shared session
+    """
+    return session().stats()
+
+
+def active_cassette() -> Optional[Cassette]:
+    """
+    Gets the cassette calls are recorded to or replayed from, if there is one
+    """
+    return _CASSETTE
+
+
+def google_http(timeout: Optional[float] = DEFAULT_TIMEOUT, **kwargs: Any) -> httplib2.Http:
+    """
+    Creates the httplib2 object for the google api client.  httplib2 keeps one connection alive per
+    host for the life of the object, so a service should be built on a single one of these
+    """
+    if _CASSETTE is not None:
+        from .cassette import CassetteHttp  # pylint: disable=import-outside-toplevel
+
+        return CassetteHttp(_CASSETTE, timeout=timeout, **kwargs)
+    return httplib2.Http(timeout=timeout, **kwargs)
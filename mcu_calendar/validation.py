@@ -0,0 +1,374 @@
+"""
+Validates the yaml data against data/movie-schema.yaml and data/show-schema.yaml, plus the
+invariants between files that a per file schema can't express.  The schemas are compiled into
+plain python checks once, and each file's result is cached by the hash of its content so
+revalidating an unchanged tree only costs reading it
+"""
+
+from __future__ import annotations
+
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from functools import lru_cache
+from hashlib import sha256
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+import yaml
+
+from .events import GoogleMediaEvent, imdb_id_from_description
+from .helpers import get_safe_title
+
+MOVIE_SCHEMA_NAME = "movie-schema.yaml"
+SHOW_SCHEMA_NAME = "show-schema.yaml"
+CACHE_NAME = ".validation_cache.json"
+
+# Bump this whenever the checks change, so every cached result is thrown away
+VALIDATOR_VERSION = "2"
+
+# A compiled schema, which yields an error message for everything wrong with a value
+Check = Callable[[Any, str], Iterator[str]]
+
+# Keywords that only document a schema
+_ANNOTATIONS = {"$schema", "$id", "id", "title", "description", "style", "default", "examples"}
+_SUPPORTED = {"allOf", "type", "properties", "required", "additionalProperties", "items", "minItems", "format", "enum"}
+_TYPES: Dict[str, tuple] = {
+    "object": (dict,),
+    "array": (list,),
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "null": (type(None),),
+}
+
+
+class ValidationIssue(NamedTuple):
+    """
+    One problem with one data file
+    """
+
+    path: Path
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.message}"
+
+
+class CatalogValidationError(Exception):
+    """
+    Raised when the data folders don't pass validation, with every issue found
+    """
+
+    def __init__(self, issues: Sequence[ValidationIssue]) -> None:
+        self.issues = list(issues)
+        details = "\n".join(f"  {issue}" for issue in self.issues)
+        super().__init__(f"Found {len(self.issues)} problem(s) in the data:\n{details}")
+
+
+def _is_date(value: Any) -> bool:
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return True
+    if isinstance(value, str):
+        try:
+            date.fromisoformat(value)
+            return True
+        except ValueError:
+            return False
+    return False
+
+
+def _all_of(checks: List[Check]) -> Check:
+    def check(value: Any, location: str) -> Iterator[str]:
+        for sub_check in checks:
+            yield from sub_check(value, location)
+
+    return check
+
+
+def _compile_type(type_name: str, date_format: bool) -> Check:
+    expected = _TYPES[type_name]
+
+    def check(value: Any, location: str) -> Iterator[str]:
+        # yaml loads unquoted dates as dates, which stand in for "format: date" strings
+        if date_format and _is_date(value):
+            return
+        if not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected):
+            yield f"{location} should be a {type_name}, not {type(value).__name__}"
+
+    return check
+
+
+def _compile_object(schema: Dict[str, Any]) -> Check:
+    properties = {name: compile_schema(sub_schema) for name, sub_schema in schema.get("properties", {}).items()}
+    required = list(schema.get("required", []))
+    additional = schema.get("additionalProperties", True)
+    # additionalProperties is either whether any other property is allowed, or the schema they all must match
+    additional_check = None if isinstance(additional, bool) else compile_schema(additional)
+
+    def check(value: Any, location: str) -> Iterator[str]:
+        if not isinstance(value, dict):
+            return
+        for name in required:
+            if name not in value:
+                yield f"{location} is missing {name}"
+        for name, item in value.items():
+            if name in properties:
+                yield from properties[name](item, f"{location}.{name}")
+            elif additional_check is not None:
+                yield from additional_check(item, f"{location}.{name}")
+            elif not additional:
+                yield f"{location} has unexpected property {name}"
+
+    return check
+
+
+def _compile_array(schema: Dict[str, Any]) -> Check:
+    items = compile_schema(schema["items"]) if "items" in schema else None
+    min_items = schema.get("minItems")
+
+    def check(value: Any, location: str) -> Iterator[str]:
+        if not isinstance(value, list):
+            return
+        if min_items is not None and len(value) < min_items:
+            yield f"{location} should have at least {min_items} item(s)"
+        if items is not None:
+            for i, item in enumerate(value):
+                yield from items(item, f"{location}[{i}]")
+
+    return check
+
+
+def _compile_format(format_name: str) -> Check:
+    if format_name != "date":
+        raise ValueError(f"Unsupported schema format {format_name}")
+
+    def check(value: Any, location: str) -> Iterator[str]:
+        if isinstance(value, (str, date)) and not _is_date(value):
+            yield f"{location} should be a date, not {value!r}"
+
+    return check
+
+
+def _compile_enum(options: List[Any]) -> Check:
+    def check(value: Any, location: str) -> Iterator[str]:
+        if value not in options:
+            yield f"{location} should be one of {options}, not {value!r}"
+
+    return check
+
+
+def compile_schema(schema: Dict[str, Any]) -> Check:
+    """
+    Compiles the subset of JSON schema (draft 4) that this project's schemas use into a single check.
+    Unsupported keywords are an error rather than silently ignored
+    """
+    unsupported = set(schema) - _SUPPORTED - _ANNOTATIONS
+    if unsupported:
+        raise ValueError(f"Unsupported schema keyword(s) {sorted(unsupported)}")
+
+    checks: List[Check] = []
+    if "allOf" in schema:
+        checks.append(_all_of([compile_schema(sub_schema) for sub_schema in schema["allOf"]]))
+    if "type" in schema:
+        checks.append(_compile_type(schema["type"], schema.get("format") == "date"))
+    if {"properties", "required", "additionalProperties"} & set(schema):
+        checks.append(_compile_object(schema))
+    if {"items", "minItems"} & set(schema):
+        checks.append(_compile_array(schema))
+    if "format" in schema:
+        checks.append(_compile_format(schema["format"]))
+    if "enum" in schema:
+        checks.append(_compile_enum(schema["enum"]))
+    return _all_of(checks)
+
+
+@lru_cache(maxsize=None)
+def load_schema(schema_path: Path) -> Optional[Check]:
+    """
+    Loads and compiles a schema file once, or None if there is no such schema
+    """
+    if not schema_path.exists():
+        return None
+    with open(schema_path, "r", encoding="UTF-8") as schema_file:
+        return compile_schema(yaml.safe_load(schema_file))
+
+
+class FileResult(NamedTuple):
+    """
+    What validating a single file found, and the keys the cross file checks index it by
+    """
+
+    errors: List[str]
+    title: Optional[str]
+    imdb_id: Optional[str]
+
+
+def _read_source(path: Path) -> bytes:
+    """
+    Reads a yaml file along with its .patch file, the same way GoogleMediaEvent.load_yaml merges them
+    """
+    content = path.read_bytes()
+    patch_path = path.with_suffix(".patch")
+    if patch_path.exists():
+        content += b"\0" + patch_path.read_bytes()
+    return content
+
+
+def validate_file(path: Path, check: Optional[Check], is_movie: bool) -> FileResult:
+    """
+    Validates a single yaml (and .patch) file
+    """
+    try:
+        data = GoogleMediaEvent.load_yaml(path)
+    except (yaml.YAMLError, TypeError) as error:
+        return FileResult([f"couldn't be loaded: {error}"], None, None)
+    return validate_data(data, check, is_movie)
+
+
+def validate_data(data: Any, check: Optional[Check], is_movie: bool) -> FileResult:
+    """
+    Validates the already parsed data of a single yaml (and .patch) file
+    """
+    errors = [] if check is None else list(check(data, "$"))
+    if not isinstance(data, dict):
+        return FileResult(errors, None, None)
+
+    if not is_movie:
+        release_dates = data.get("release_dates")
+        if isinstance(release_dates, list) and all(isinstance(d, date) for d in release_dates):
+            if release_dates != sorted(release_dates):
+                errors.append("release_dates aren't sorted")
+            if len(set(release_dates)) != len(release_dates):
+                errors.append("release_dates has duplicates")
+
+    title = data.get("title") if isinstance(data.get("title"), str) else None
+    imdb_id = data.get("imdb_id")
+    if not imdb_id and isinstance(data.get("description"), str):
+        imdb_id = imdb_id_from_description(data["description"])
+    return FileResult(errors, title, imdb_id if isinstance(imdb_id, str) else None)
+
+
+class ValidationCache:
+    """
+    The results of validating each file, keyed by the hash of its content (and of the schema it was checked against)
+    """
+
+    def __init__(self, path: Optional[Path]) -> None:
+        self.path = path
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        if path is not None and path.exists():
+            try:
+                with open(path, "r", encoding="UTF-8") as cache_file:
+                    cache = json.load(cache_file)
+                if cache.get("version") == VALIDATOR_VERSION:
+                    self.results = cache["files"]
+            except (OSError, ValueError, KeyError):
+                self.results = {}
+        self._used: Dict[str, Dict[str, Any]] = {}
+
+    def result(
+        self, path: Path, schema_path: Path, is_movie: bool, parsed: Optional[Mapping[Path, Any]] = None
+    ) -> FileResult:
+        """
+        Gets a file's validation result, only validating it if it changed since it was last validated, and
+        without parsing it again if its data is in parsed
+        """
+        digest = sha256(_read_source(path))
+        if schema_path.exists():
+            digest.update(schema_path.read_bytes())
+        key = digest.hexdigest()
+
+        cached = self.results.get(path.as_posix())
+        if cached is not None and cached["hash"] == key:
+            self.hits += 1
+            result = FileResult(cached["errors"], cached["title"], cached["imdb_id"])
+        else:
+            self.misses += 1
+            if parsed is not None and path in parsed:
+                result = validate_data(parsed[path], load_schema(schema_path), is_movie)
+            else:
+                result = validate_file(path, load_schema(schema_path), is_movie)
+        self._used[path.as_posix()] = {"hash": key, **result._asdict()}
+        return result
+
+    def save(self) -> None:
+        """
+        Writes the results used since this cache was loaded, dropping the results for files that are gone
+        """
+        if self.path is None or (self.misses == 0 and set(self._used) == set(self.results)):
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="UTF-8") as cache_file:
+            json.dump({"version": VALIDATOR_VERSION, "files": self._used}, cache_file, sort_keys=True)
+        tmp_path.replace(self.path)
+
+
+def _duplicates(index: Dict[str, List[Path]], what: str) -> Iterator[ValidationIssue]:
+    for key, paths in index.items():
+        for path in paths[1:]:
+            yield ValidationIssue(path, f"{what} {key!r} is already used by {paths[0].name}")
+
+
+def validate_folders(
+    movie_dirs: Iterable[Path],
+    show_dirs: Iterable[Path],
+    use_cache: bool = True,
+    parsed: Optional[Mapping[Path, Any]] = None,
+) -> List[ValidationIssue]:
+    """
+    Validates every yaml file in the folders in a single pass, against the schema next to each folder
+    (e.g. data/movie-schema.yaml for data/mcu-movies), then checks the invariants between files:
+    unique movie imdb ids, and titles that don't collide once they're made into file names.
+    Results are cached in a .validation_cache.json next to the folders, and the files whose data is
+    in parsed (see YamlCalendar.get_data()) are checked without being parsed again
+    """
+    caches: Dict[Path, ValidationCache] = {}
+    issues: List[ValidationIssue] = []
+    for folder, is_movie in [(f, True) for f in movie_dirs] + [(f, False) for f in show_dirs]:
+        root = folder.parent
+        if root not in caches:
+            caches[root] = ValidationCache(root / CACHE_NAME if use_cache else None)
+        schema_path = root / (MOVIE_SCHEMA_NAME if is_movie else SHOW_SCHEMA_NAME)
+
+        imdb_ids: Dict[str, List[Path]] = defaultdict(list)
+        safe_titles: Dict[str, List[Path]] = defaultdict(list)
+        for path in sorted(folder.glob("*.yaml")):
+            result = caches[root].result(path, schema_path, is_movie, parsed)
+            issues += (ValidationIssue(path, error) for error in result.errors)
+            # Every season of a show shares the show's imdb id, so only movies need a unique one
+            if is_movie and result.imdb_id:
+                imdb_ids[result.imdb_id].append(path)
+            if result.title:
+                safe_titles[get_safe_title(result.title)].append(path)
+        issues += _duplicates(imdb_ids, "imdb_id")
+        issues += _duplicates(safe_titles, "title")
+
+    for cache in caches.values():
+        cache.save()
+    return issues
+
+
+def validate_or_raise(
+    movie_dirs: Iterable[Path], show_dirs: Iterable[Path], parsed: Optional[Mapping[Path, Any]] = None
+) -> None:
+    """
+    Validates the folders, raising a CatalogValidationError with every issue if there are any
+    """
+    issues = validate_folders(movie_dirs, show_dirs, parsed=parsed)
+    if issues:
+        raise CatalogValidationError(issues)
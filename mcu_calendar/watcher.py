@@ -0,0 +1,147 @@
+"""
+A daemon that watches the data folders and syncs only the media that changed to the
+calendars that include it, keeping the parsed catalog warm between changes
+"""
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from . import reporting
+from .archive import segment_path
+from .catalog import Catalog, CatalogChanges
+from .yamlcalendar import YamlCalendar
+
+try:
+    import inotify_simple
+except ImportError:  # pragma: no cover - polling is used instead
+    inotify_simple = None
+
+
+# pylint: disable=too-few-public-methods
+class DataWatcher:
+    """
+    Blocks until the files in a catalog's folders change, using inotify when inotify_simple is
+    installed and polling file stamps otherwise.  Bursts of changes (like the daily bot PR being
+    merged) are debounced into a single wake up
+    """
+
+    def __init__(self, catalog: Catalog, interval: float = 2.0, debounce: float = 5.0, max_delay: float = 60.0) -> None:
+        self.catalog = catalog
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.mode = "polling"
+        self._inotify: Optional[inotify_simple.INotify] = None
+        if inotify_simple is not None:
+            self.mode = "inotify"
+            self._inotify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.CREATE | flags.DELETE
+            for folder in catalog.folders():
+                self._inotify.add_watch(folder, mask)
+            for archive_folder in {segment_path(f).parent for f in catalog.folders()}:
+                if archive_folder.exists():
+                    self._inotify.add_watch(archive_folder, mask)
+
+    def _wait_for_event(self, timeout: Optional[float]) -> bool:
+        """
+        Waits up to timeout seconds (forever when None) for any change, returning whether there was one
+        """
+        if self._inotify is not None:
+            events = self._inotify.read(timeout=None if timeout is None else int(timeout * 1000))
+            return any(Path(e.name).suffix in (".yaml", ".patch", ".json") for e in events)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            if self.catalog.has_changes():
+                return True
+            wait = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            time.sleep(max(wait, 0))
+        return False
+
+    def wait(self) -> None:
+        """
+        Waits for a change, then until there have been no more changes for the debounce period
+        """
+        while not self._wait_for_event(None):
+            pass
+
+        first_change = time.monotonic()
+        if self._inotify is not None:
+            while time.monotonic() - first_change < self.max_delay and self._wait_for_event(self.debounce):
+                pass
+            return
+
+        # Polling can only tell that the files differ from the catalog, so wait for the stamps to settle
+        last_scan = self.catalog.scan()
+        while time.monotonic() - first_change < self.max_delay:
+            time.sleep(self.debounce)
+            scan = self.catalog.scan()
+            if scan == last_scan:
+                return
+            last_scan = scan
+
+
+def sync_changes(
+    calendars: Iterable[YamlCalendar], catalog: Catalog, changes: CatalogChanges, force: bool = False
+) -> List[YamlCalendar]:
+    """
+    Pushes the changed media to only the calendars that include the folders they're in
+    """
+    synced = []
+    for cal in calendars:
+        folders = {*cal.movie_dirs, *cal.show_dirs}
+        items = [catalog.items[p] for p in changes.updated if p.parent in folders]
+        removed = [i for i in changes.removed if i.file_path.parent in folders]
+        if not items and not removed:
+            continue
+        cal.update_google_events(items, removed, force=force)
+        synced.append(cal)
+    return synced
+
+
+def sync_batch(
+    calendars: Iterable[YamlCalendar], catalog: Catalog, pending: CatalogChanges, force: bool = False
+) -> CatalogChanges:
+    """
+    Refreshes the catalog and syncs what changed, along with the pending changes of a batch that failed
+    before.  Errors are printed instead of raised so a long running watch keeps going, and the changes
+    that still need syncing are returned
+    """
+    try:
+        changes = pending.merge(catalog.refresh())
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        # Usually a file that's only half saved, which is synced once it's fixed
+        print(f"Couldn't load the changes, waiting for them to be fixed: {error}")
+        return pending
+    if not changes:
+        return changes
+    print(f"{len(changes.updated)} changed, {len(changes.removed)} removed")
+    try:
+        sync_changes(calendars, catalog, changes, force)
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        print(f"Sync failed, retrying with the next changes: {error}")
+        return changes
+    finally:
+        reporting.current().close()
+    return CatalogChanges([], [])
+
+
+def watch(calendars: Dict[str, YamlCalendar], interval: float, debounce: float, force: bool = False) -> None:
+    """
+    Loads the catalog once, then syncs each debounced batch of changes until interrupted
+    """
+    catalog = Catalog.for_calendars(calendars.values())
+    catalog.load()
+    watcher = DataWatcher(catalog, interval=interval, debounce=debounce)
+    print(f"Watching {len(catalog.folders())} folders ({watcher.mode}) with {len(catalog.items)} items loaded")
+    pending = CatalogChanges([], [])
+    try:
+        while True:
+            watcher.wait()
+            pending = sync_batch(calendars.values(), catalog, pending, force)
+    except KeyboardInterrupt:
+        pass
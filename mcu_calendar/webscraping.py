@@ -3,14 +3,16 @@ This script provides helper methods for accessing themoviedb.org data about the
 """
 
 import os
+from datetime import date
 from enum import Enum
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence
 from urllib.parse import quote_plus as url_encode
 
-import requests
 import tmdbsimple as TMDB
 
+from . import transport
+
 
 class Companies(Enum):
     """
@@ -99,6 +101,10 @@ class TvGenre(Enum):
     WESTERN = 37
 
 
+# TMDB allows up to 20 sub requests in an append_to_response
+MAX_APPENDED_RESPONSES = 20
+
+
 def query_all_pages(
     func: Callable[[TMDB.Discover, int, Dict[str, Any]], Dict[str, Any]]
 ) -> Callable[[Dict[str, Any]], List[Dict[str, Any]]]:
@@ -154,17 +160,92 @@ def _discover_shows(discoverer: TMDB.Discover, page: int, payload: Dict[str, Any
     return discoverer.tv(**{**base_payload, **payload})
 
 
-def get_movies(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+class TmdbApi:
     """
-    Gets movies from themoviedb.org with the given keyword
+    Every themoviedb.org call this project makes, so that they can be replaced with a local fake
     """
-    movies = _discover_movies(payload)
-    movies = [m for m in movies if "release_date" in m and m["release_date"] != ""]
-    movie_details = []
-    for movie in movies:
-        movie_details.append(TMDB.Movies(movie["id"]).info(append_to_response="release_dates"))
 
-    return movie_details
+    def __init__(self) -> None:
+        # Sends every call through the shared keep alive session
+        transport.session()
+
+    def discover_movies(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Discovers movies on all pages
+        """
+        return _discover_movies(payload)
+
+    def discover_shows(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Discovers shows on all pages
+        """
+        return _discover_shows(payload)
+
+    def movie(self, movie_id: int) -> Dict[str, Any]:
+        """
+        Gets a movie's details, with its release dates
+        """
+        return TMDB.Movies(movie_id).info(append_to_response="release_dates")
+
+    def show(self, show_id: int) -> Dict[str, Any]:
+        """
+        Gets a show's details, with its external ids
+        """
+        return TMDB.TV(show_id).info(append_to_response="external_ids")
+
+    def season(self, show_id: int, season_number: int) -> Dict[str, Any]:
+        """
+        Gets a season's details, with its episodes
+        """
+        return TMDB.TV_Seasons(show_id, season_number).info()
+
+    def seasons(self, show_id: int, season_numbers: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Gets the details of up to MAX_APPENDED_RESPONSES seasons, with their episodes, in a single request.
+        Seasons that TMDB didn't append are left out
+        """
+        if len(season_numbers) > MAX_APPENDED_RESPONSES:
+            raise ValueError(f"Can't append more than {MAX_APPENDED_RESPONSES} seasons to one request")
+        response = TMDB.TV(show_id).info(append_to_response=",".join(f"season/{n}" for n in season_numbers))
+        return {n: response[f"season/{n}"] for n in season_numbers if f"season/{n}" in response}
+
+    def changes(self, kind: str, start_date: date, end_date: date, page: int) -> Dict[str, Any]:
+        """
+        Gets a page of the ids of every "movie" or "tv" title on TMDB that changed between the dates
+        """
+        changes = TMDB.Changes()
+        query = getattr(changes, kind)
+        return query(start_date=start_date.isoformat(), end_date=end_date.isoformat(), page=page)
+
+    def title_changes(self, kind: str, title_id: int, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """
+        Gets the changes to a single "movie" or "tv" title between the dates
+        """
+        title = TMDB.Movies(title_id) if kind == "movie" else TMDB.TV(title_id)
+        return title.changes(start_date=start_date.isoformat(), end_date=end_date.isoformat())["changes"]
+
+
+def discover_movies(payload: Dict[str, Any], api: Optional[TmdbApi] = None) -> List[Dict[str, Any]]:
+    """
+    Discovers the movies from themoviedb.org that match the payload and have a release date, without their details
+    """
+    movies = (api or TmdbApi()).discover_movies(payload)
+    return [m for m in movies if "release_date" in m and m["release_date"] != ""]
+
+
+def get_movie_details(movies: List[Dict[str, Any]], api: Optional[TmdbApi] = None) -> List[Dict[str, Any]]:
+    """
+    Gets the details of discovered movies
+    """
+    api = api or TmdbApi()
+    return [api.movie(movie["id"]) for movie in movies]
+
+
+def get_movies(payload: Dict[str, Any], api: Optional[TmdbApi] = None) -> List[Dict[str, Any]]:
+    """
+    Gets movies from themoviedb.org with the given keyword
+    """
+    return get_movie_details(discover_movies(payload, api), api)
 
 
 def should_skip(season: Dict[str, Any], payload: Dict[str, Any]) -> bool:
@@ -180,28 +261,54 @@ def should_skip(season: Dict[str, Any], payload: Dict[str, Any]) -> bool:
     return False
 
 
-def get_shows(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+def discover_shows(payload: Dict[str, Any], api: Optional[TmdbApi] = None) -> List[Dict[str, Any]]:
     """
-    Gets tv shwos from themoviedb.org with the given keyword
+    Discovers the tv shows from themoviedb.org that match the payload and have aired, without their details
+    """
+    shows = (api or TmdbApi()).discover_shows(payload)
+    return [s for s in shows if "first_air_date" in s and s["first_air_date"] != ""]
+
+
+def get_show_details(
+    shows: List[Dict[str, Any]], payload: Dict[str, Any], api: Optional[TmdbApi] = None
+) -> List[Dict[str, Any]]:
     """
-    shows = _discover_shows(payload)
-    shows = [s for s in shows if "first_air_date" in s and s["first_air_date"] != ""]
+    Gets the details of discovered shows, with the details of each of their seasons that the payload doesn't skip
+    """
+    api = api or TmdbApi()
     # The discover api doesn't return season information, so we
     # still need to get the details
     show_details = []
     for show in shows:
-        show_detail = TMDB.TV(show["id"]).info(append_to_response="external_ids")
-        season_details = []
-        for season in show_detail["seasons"]:
-            if should_skip(season, payload):
-                continue
-            season_details.append(TMDB.TV_Seasons(show["id"], season["season_number"]).info())
-        show_detail["seasons"] = season_details
+        show_detail = api.show(show["id"])
+        needed = [s["season_number"] for s in show_detail["seasons"] if not should_skip(s, payload)]
+        show_detail["seasons"] = get_season_details(show["id"], needed, api)
         show_details.append(show_detail)
 
     return show_details
 
 
+def get_season_details(show_id: int, season_numbers: List[int], api: TmdbApi) -> List[Dict[str, Any]]:
+    """
+    Gets the details of a show's seasons, appending as many seasons as TMDB allows to each request and
+    only asking for a season on its own if it wasn't appended
+    """
+    fetched: Dict[int, Dict[str, Any]] = {}
+    for start in range(0, len(season_numbers), MAX_APPENDED_RESPONSES):
+        chunk = season_numbers[start:][:MAX_APPENDED_RESPONSES]
+        # A single season is the same one request either way, without the show's details
+        if len(chunk) > 1:
+            fetched.update(api.seasons(show_id, chunk))
+    return [fetched[n] if n in fetched else api.season(show_id, n) for n in season_numbers]
+
+
+def get_shows(payload: Dict[str, Any], api: Optional[TmdbApi] = None) -> List[Dict[str, Any]]:
+    """
+    Gets tv shwos from themoviedb.org with the given keyword
+    """
+    return get_show_details(discover_shows(payload, api), payload, api)
+
+
 MARVEL_SHOWS_CX = "61d919ee1f574fc77"
 MARVEL_MOVIES_CX = "0ea857e1a2f692afa"
 GOOGLE_SEARCH_FOMRAT = "https://www.googleapis.com/customsearch/v1?key={api_key}&cx={cx}&q={query}"
@@ -236,13 +343,12 @@ def __get_search_link(name: str, search_id: str, query: str) -> Optional[str]:
     if "GOOGLE_SEARCH_API_KEY" not in os.environ:
         return None
 
-    result = requests.get(
+    result = transport.session().get(
         GOOGLE_SEARCH_FOMRAT.format(
             api_key=os.environ["GOOGLE_SEARCH_API_KEY"],
             cx=search_id,
             query=query,
-        ),
-        timeout=30,
+        )
     )
     for item in result.json().get("items", []):
         if name.lower() in item["title"].lower():
@@ -2,15 +2,64 @@
 Calendars objects that sync data to a google Calendar
 """
 
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from functools import partial
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Sequence
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
+from . import reporting
+from .archive import load_segment, segment_path
 from .events import GoogleMediaEvent, Movie, Show
-from .helpers import create_progress, truncate
+from .helpers import truncate
+from .recurrence import expand_recurrence
+from .scheduler import QuotaBudget, SyncCall, estimate_cost, plan_calls, schedule
 
+# Folders with fewer files than this are loaded serially, because starting worker processes costs
+# more than parsing the files.  See benchmarks/load_benchmark.py for where the crossover is
+PARALLEL_LOAD_THRESHOLD = 256
 
-# pylint: disable=too-few-public-methods
+
+class DataLoadError(Exception):
+    """
+    Raised when one or more yaml files in a data folder could not be loaded
+    """
+
+    def __init__(self, errors: List[Tuple[Path, Exception]]) -> None:
+        self.errors = errors
+        details = "\n".join(f"  {path}: {type(error).__name__}: {error}" for path, error in errors)
+        super().__init__(f"Failed to load {len(errors)} file(s):\n{details}")
+
+
+def _load_file(factory: Callable[[Path], Any], path: Path) -> Tuple[Any, Optional[Exception]]:
+    """
+    Loads a single file, returning the error instead of raising it so every failure can be reported
+    """
+    try:
+        return factory(path), None
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        return None, error
+
+
+def _load_files(
+    paths: Sequence[Path], factory: Callable[[Path], Any], parallel_threshold: int, max_workers: Optional[int]
+) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Loads the files in order with _load_file(), across a process pool if there are enough of them.
+    The GIL is held for all of the yaml parsing (libyaml doesn't release it) so threads wouldn't help
+    """
+    load = partial(_load_file, factory)
+    workers = max_workers or os.cpu_count() or 1
+    if len(paths) < parallel_threshold or workers < 2:
+        return [load(p) for p in paths]
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(load, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
 class YamlCalendar:
     """
     Uses Yaml data to sync calendar information
@@ -24,40 +73,159 @@ class YamlCalendar:
         movie_dirs: List[Path],
         show_dirs: List[Path],
         google_service: Any,
+        item_filter: Optional[Callable[[GoogleMediaEvent], bool]] = None,
+        region: Optional[str] = None,
     ) -> None:
         self.name = name
         self.cal_id = cal_id
         self.movie_dirs = movie_dirs
         self.show_dirs = show_dirs
         self.google_service = google_service
+        self.item_filter = item_filter
+        # The ISO 3166-1 region whose release dates this calendar shows, or None for the default dates
+        self.region = region
+        # When set, only media with releases on or after this date are synced, both locally and remotely
+        self.window_start: Optional[date] = None
+        # When set, every existing event is rewritten whole, instead of patching only the fields that changed
+        self.rewrite = False
+        # When set, syncs stop writing once it's spent, see scheduler.schedule()
+        self.budget: Optional[QuotaBudget] = None
+
+    def in_window(self, item: GoogleMediaEvent) -> bool:
+        """
+        Checks if the item has any release inside the sync window
+        """
+        return self.window_start is None or item.last_release_date() >= self.window_start
+
+    def event_in_window(self, event: Dict) -> bool:
+        """
+        Checks if a listed all day event has any day inside the sync window, by the same rule as
+        in_window().  Google lists events that end after the window starts in UTC, which west of UTC
+        also takes in the ones on the day before it
+        """
+        start = event.get("start", {}).get("date")
+        if self.window_start is None or start is None:
+            return True
+        try:
+            days = expand_recurrence(date.fromisoformat(start), event.get("recurrence"))
+        except ValueError:
+            return True
+        return days[-1] >= self.window_start
+
+    def localize(self, item: GoogleMediaEvent) -> GoogleMediaEvent:
+        """
+        Gets the item as it releases in this calendar's region
+        """
+        return item.for_region(self.region)
+
+    def includes(self, item: GoogleMediaEvent) -> bool:
+        """
+        Checks if the item (which is from one of this calendar's folders) belongs on this calendar
+        """
+        return self.item_filter is None or self.item_filter(item)
 
     @staticmethod
-    def _get_objects_from_data(folder: Path, factory: Callable[[Path], Any]) -> List[Any]:
+    def _get_objects_from_data(
+        folder: Path,
+        factory: Callable[[Path], Any],
+        parallel_threshold: int = PARALLEL_LOAD_THRESHOLD,
+        max_workers: Optional[int] = None,
+        archived: bool = True,
+    ) -> List[Any]:
         """
-        Loads all of the objects defined in yaml files in ./data/{{folder_name}}
+        Loads all of the objects defined in yaml files in ./data/{{folder_name}}, and in its archive
+        segment unless archived is False, sorted by file name.  Large folders are parsed across a
+        process pool
         """
-        return [factory(f) for f in folder.iterdir()]
+        paths = sorted(folder.glob("*.yaml"))
+        results = _load_files(paths, factory, parallel_threshold, max_workers)
+        errors = [(path, error) for path, (_, error) in zip(paths, results) if error is not None]
+        if errors:
+            raise DataLoadError(errors)
+        objects = [obj for obj, _ in results]
+        segment = load_segment(folder) if archived else None
+        return objects if segment is None else segment.merged(objects)
 
     @staticmethod
-    def get_movies(folder: Path) -> Sequence[Movie]:
+    def get_movies(folder: Path, archived: bool = True) -> Sequence[Movie]:
         """
         Gets all Movie objects defined in the yaml files in ./data/movies
         """
-        return YamlCalendar._get_objects_from_data(folder, Movie.from_yaml)
+        return YamlCalendar._get_objects_from_data(folder, Movie.from_yaml, archived=archived)
 
     @staticmethod
-    def get_shows(folder: Path) -> Sequence[Show]:
+    def get_shows(folder: Path, archived: bool = True) -> Sequence[Show]:
         """
         Gets all Show objects defined in the yaml files in ./data/shows
         """
-        return YamlCalendar._get_objects_from_data(folder, Show.from_yaml)
+        return YamlCalendar._get_objects_from_data(folder, Show.from_yaml, archived=archived)
+
+    @staticmethod
+    def get_data(folder: Path, parallel_threshold: int = PARALLEL_LOAD_THRESHOLD) -> Dict[Path, Any]:
+        """
+        Parses every yaml (and .patch) file in ./data/{{folder_name}} without making objects of them, the
+        same way get_movies() and get_shows() do, leaving out the files that can't be parsed
+        """
+        paths = sorted(folder.glob("*.yaml"))
+        results = _load_files(paths, GoogleMediaEvent.load_yaml, parallel_threshold, None)
+        return {path: data for path, (data, error) in zip(paths, results) if error is None}
+
+    def source_files(self) -> List[Path]:
+        """
+        Gets every yaml (and .patch) file and archive segment that this calendar's events are built from,
+        in a stable order
+        """
+        folders = [*self.movie_dirs, *self.show_dirs]
+        files = [f for folder in folders for f in folder.iterdir() if f.suffix in (".yaml", ".patch")]
+        files += [segment_path(folder) for folder in folders if segment_path(folder).exists()]
+        return sorted(files)
+
+    def iter_items(self) -> Iterator[GoogleMediaEvent]:
+        """
+        Lazily loads every Movie and then every Show for this calendar, one file (or archive segment) at a time
+        """
+        folders: List[Tuple[Path, Callable[[Path], GoogleMediaEvent]]] = [
+            *((folder, Movie.from_yaml) for folder in self.movie_dirs),
+            *((folder, Show.from_yaml) for folder in self.show_dirs),
+        ]
+        for folder, factory in folders:
+            segment = load_segment(folder)
+            sealed = {} if segment is None else {path.name: item for path, item in segment.items.items()}
+            # Only a sorted list of file names is held on to (glob would list every DirEntry first),
+            # so a big folder costs little more than its names
+            with os.scandir(folder) as entries:
+                hot_names = sorted(entry.name for entry in entries if entry.name.endswith(".yaml"))
+            last_name = None
+            # A hot file sorts before the sealed item it overrides, which is then skipped
+            for name, is_sealed in heapq.merge(((n, False) for n in hot_names), ((n, True) for n in sorted(sealed))):
+                if name == last_name:
+                    continue
+                last_name = name
+                item = sealed[name] if is_sealed else factory(folder / name)
+                if self.includes(item):
+                    yield self.localize(item)
+
+    def iter_google_events(self) -> Iterator[Dict]:
+        """
+        Lazily gets the events currently on the calendar from get_cal_id() a page at a time, only those
+        inside the sync window if there is one (see event_in_window())
+        """
+        kwargs: Dict[str, Any] = {"calendarId": self.cal_id}
+        if self.window_start is not None:
+            kwargs["timeMin"] = f"{self.window_start.isoformat()}T00:00:00Z"
+
+        while True:
+            events_result = self.google_service.list(**kwargs).execute()
+            yield from (e for e in events_result.get("items", []) if self.event_in_window(e))
+            if not events_result.get("nextPageToken"):
+                return
+            kwargs["pageToken"] = events_result["nextPageToken"]
 
     def _get_google_events(self) -> List[Dict]:
         """
-        Gets all of the events currently on the calendar from get_cal_id()
+        Gets all of the events currently on the calendar, see iter_google_events()
         """
-        events_result = self.google_service.list(calendarId=self.cal_id).execute()
-        return events_result.get("items", [])
+        return list(self.iter_google_events())
 
     def _create_google_event(
         self,
@@ -67,47 +235,129 @@ class YamlCalendar:
         force: bool,
     ) -> None:
         """
-        Creates or Updates events if needed on the calendar based on the items objects
+        Creates or Updates events if needed on the calendar based on the items objects.  Updates only patch
+        the fields that changed, and with force every event's fields are compared rather than only the ones
+        that decide whether the item changed, but unchanged events are still left alone unless rewriting
         """
         items = sorted(items, key=lambda i: i.sort_val())
-        with create_progress() as progress:
-            for item in progress.track(items, description=progress_title):
-                event = next(
-                    (e for e in existing_events if "summary" in e and e["summary"] == item.title),
-                    None,
-                )
-                if event is not None:
-                    existing_events.remove(event)
-                if event is None:
-                    progress.print(f"[reset]{item}", "[red](Adding)")
-                    self.google_service.insert(calendarId=self.cal_id, body=item.to_google_event()).execute()
-                elif item != event or force:
-                    progress.print(f"[reset]{item}", "[yellow](Updating)")
-                    self.google_service.update(
-                        calendarId=self.cal_id,
-                        eventId=event["id"],
-                        body=item.to_google_event(),
-                    ).execute()
-                else:
-                    progress.print(f"[reset]{item}", "[cyan](Skipping)")
+        report = reporting.current()
+        for item in report.track(items, progress_title):
+            event = next(
+                (e for e in existing_events if "summary" in e and e["summary"] == item.title),
+                None,
+            )
+            if event is not None:
+                existing_events.remove(event)
+            start = time.perf_counter()
+            if event is None:
+                self.google_service.insert(calendarId=self.cal_id, body=item.to_google_event()).execute()
+                report.record("insert", self.name, item.title, time.perf_counter() - start, str(item))
+                continue
+            changes = item.changed_fields(event) if force or item != event else {}
+            if self.rewrite:
+                self.google_service.update(
+                    calendarId=self.cal_id,
+                    eventId=event["id"],
+                    body=item.to_google_event(),
+                ).execute()
+                report.record("update", self.name, item.title, time.perf_counter() - start, str(item))
+            elif changes:
+                self.google_service.patch(calendarId=self.cal_id, eventId=event["id"], body=changes).execute()
+                report.record("update", self.name, item.title, time.perf_counter() - start, str(item))
+            else:
+                report.record("skip", self.name, item.title, text=str(item))
+
+    def _delete_google_events(self, events: List[Dict]) -> None:
+        """
+        Deletes the given events from the calendar
+        """
+        report = reporting.current()
+        events = sorted(events, key=lambda i: date.fromisoformat(i["start"]["date"]))
+        for old_event in report.track(events, "Stale events..."):
+            item_time = date.fromisoformat(old_event["start"]["date"])
+            item_str = f"{truncate(old_event['summary'], 26)} {item_time.strftime('%b %d, %Y')}"
+            start = time.perf_counter()
+            self.google_service.delete(calendarId=self.cal_id, eventId=old_event["id"]).execute()
+            report.record("delete", self.name, old_event["summary"], time.perf_counter() - start, item_str)
 
     def create_google_events(self, force: bool = False) -> None:
         """
         Creates or Updates events all events if needed on the calendar
         """
-        print("    UPDATING", self.name)
-        cur_events = self._get_google_events()
         movies = [m for mdir in self.movie_dirs for m in YamlCalendar.get_movies(mdir)]
         shows = [s for sdir in self.show_dirs for s in YamlCalendar.get_shows(sdir)]
-        self._create_google_event("[bold]Movies..", movies, cur_events, force=force)
-        self._create_google_event("[bold]Shows...", shows, cur_events, force=force)
-
-        with create_progress() as progress:
-            cur_events.sort(key=lambda i: date.fromisoformat(i["start"]["date"]))
-            for old_event in progress.track(cur_events, description="Stale events..."):
-                item_time = date.fromisoformat(old_event["start"]["date"])
-                item_str = f"{truncate(old_event['summary'], 26)} {item_time.strftime('%b %d, %Y')}"
-                progress.print(f"[reset]{item_str}", "[red](Deleting)")
-                self.google_service.delete(calendarId=self.cal_id, eventId=old_event["id"]).execute()
-
-        print()
+        self.sync_google_events(movies, shows, force)
+
+    def sync_google_events(
+        self,
+        movies: Sequence[GoogleMediaEvent],
+        shows: Sequence[GoogleMediaEvent],
+        force: bool = False,
+        sealed: Sequence[GoogleMediaEvent] = (),
+    ) -> int:
+        """
+        Syncs the calendar to exactly the given (already loaded) movies and shows.  With a sync window,
+        media released before the window and their events are left alone, and so are the sealed
+        (archived and unchanged since the last sync) items.  The writes are made most urgent first, and
+        with a quota budget only as many as it allows are made.  Returns how many had to be left for the
+        next run
+        """
+        report = reporting.current()
+        if self.window_start is None:
+            report.note("    UPDATING", self.name)
+        else:
+            report.note("    UPDATING", self.name, f"(since {self.window_start.isoformat()})")
+        cur_events = self._get_google_events()
+        sealed_ids = {id(i) for i in sealed if self.includes(i)}
+        if sealed_ids:
+            report.note(f"    SKIPPING {len(sealed_ids)} archived")
+            sealed_titles = {i.title for i in sealed if id(i) in sealed_ids}
+            cur_events = [e for e in cur_events if e.get("summary") not in sealed_titles]
+        movies = [self.localize(m) for m in movies if id(m) not in sealed_ids and self.includes(m)]
+        shows = [self.localize(s) for s in shows if id(s) not in sealed_ids and self.includes(s)]
+        movies = [m for m in movies if self.in_window(m)]
+        shows = [s for s in shows if self.in_window(s)]
+        calls, skipped = plan_calls([movies, shows], cur_events, force, self.rewrite)
+        for item in skipped:
+            report.record("skip", self.name, item.title, text=str(item))
+        deferred = self._write(calls, len(cur_events))
+
+        report.note()
+        return deferred
+
+    def _write(self, calls: Sequence[SyncCall], listed_events: int) -> int:
+        """
+        Makes the calls most urgent first, as many as the budget allows, and returns how many were left
+        """
+        report = reporting.current()
+        if self.budget is not None:
+            self.budget.charge(estimate_cost([], listed_events))
+        now, deferred = schedule(calls, date.today(), self.budget)
+        if deferred:
+            report.note(f"    PLANNED {len(calls)} writes, the quota budget allows {len(now)}")
+        for call in report.track(now, "[bold]Writing."):
+            start = time.perf_counter()
+            getattr(self.google_service, call.method)(calendarId=self.cal_id, **call.kwargs).execute()
+            report.record(call.action, self.name, call.title, time.perf_counter() - start, call.text)
+        if deferred:
+            report.note(f"    DEFERRED {len(deferred)} writes to the next run")
+        return len(deferred)
+
+    def update_google_events(
+        self, items: Sequence[GoogleMediaEvent], removed: Sequence[GoogleMediaEvent], force: bool = False
+    ) -> None:
+        """
+        Creates or Updates only the events for the given items, and deletes only the events for the
+        removed items, instead of syncing and sweeping the whole calendar
+        """
+        report = reporting.current()
+        report.note("    UPDATING", self.name)
+        cur_events = self._get_google_events()
+        # Items that were changed so they no longer belong on this calendar need their events removed
+        removed = [*removed, *(i for i in items if not self.includes(i))]
+        items = [self.localize(i) for i in items if self.includes(i)]
+        self._create_google_event("[bold]Changed.", items, cur_events, force=force)
+        removed_titles = {i.title for i in removed} - {i.title for i in items}
+        self._delete_google_events([e for e in cur_events if e.get("summary") in removed_titles])
+
+        report.note()
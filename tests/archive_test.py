@@ -0,0 +1,155 @@
+"""
+Pytests for archive.py
+"""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+
+import datetime
+import json
+from pathlib import Path
+
+import pytest
+from fakes import FakeEventsService, write_movie
+
+from mcu_calendar.archive import load_segment, seal_folder, segment_path
+from mcu_calendar.catalog import Catalog
+from mcu_calendar.router import Router
+from mcu_calendar.syncstate import SyncState
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+
+@pytest.fixture(name="movies")
+def fixture_movies(tmp_path: Path) -> Path:
+    movies = tmp_path / "data" / "movies"
+    movies.mkdir(parents=True)
+    write_movie(movies / "old.yaml", "Old", "2010-05-07")
+    write_movie(movies / "older.yaml", "Older", "2008-05-02")
+    write_movie(movies / "new.yaml", "New", "2030-05-03")
+    (movies / "older.patch").write_text("regional_release_dates: {GB: 2008-04-30}\n", encoding="UTF-8")
+    (movies / "old.patch").write_text("description: patched\n", encoding="UTF-8")
+    return movies
+
+
+def test_seal_folder(movies: Path) -> None:
+    sealed = seal_folder(movies, True, datetime.date(2020, 1, 1))
+    assert [p.name for p in sealed] == ["old.yaml", "older.yaml"]
+    assert sorted(p.name for p in movies.iterdir()) == ["new.yaml"]
+    assert segment_path(movies) == movies.parent / "archive" / "movies.json"
+
+    segment = load_segment(movies)
+    assert segment is not None
+    assert {p.name: i.title for p, i in segment.items.items()} == {"old.yaml": "Old", "older.yaml": "Older"}
+    assert segment.items[movies / "old.yaml"].description == "patched"
+    assert segment.items[movies / "older.yaml"].for_region("GB").sort_val() == datetime.date(2008, 4, 30)
+
+    # Sealed items load alongside the hot ones, as if they were still yaml files
+    assert [m.title for m in YamlCalendar.get_movies(movies)] == ["New", "Old", "Older"]
+    assert [m.title for m in YamlCalendar.get_movies(movies, archived=False)] == ["New"]
+    assert [m.title for m in YamlCalendar("Test", "uuid", [movies], [], None).iter_items()] == ["New", "Old", "Older"]
+
+    # Sealing again only adds to the segment, and an unchanged archive keeps its hash
+    assert not seal_folder(movies, True, datetime.date(2020, 1, 1))
+    write_movie(movies / "mid.yaml", "Mid", "2015-05-01")
+    assert [p.name for p in seal_folder(movies, True, datetime.date(2020, 1, 1))] == ["mid.yaml"]
+    new_segment = load_segment(movies)
+    assert new_segment is not None and len(new_segment.items) == 3
+    assert new_segment.content_hash != segment.content_hash
+
+
+def test_hot_file_overrides_sealed(movies: Path) -> None:
+    seal_folder(movies, True, datetime.date(2020, 1, 1))
+    write_movie(movies / "old.yaml", "Old (Rerelease)", "2010-05-07")
+    assert [m.title for m in YamlCalendar.get_movies(movies)] == ["New", "Old (Rerelease)", "Older"]
+
+
+def test_seal_folder_validates(movies: Path) -> None:
+    (movies / "bad.yaml").write_text("title: 5\nrelease_date: 2001-01-01\ndescription: ''\n", encoding="UTF-8")
+    with pytest.raises(ValueError):
+        seal_folder(movies, True, datetime.date(2020, 1, 1))
+    # Nothing is sealed if anything fails
+    assert load_segment(movies) is None
+    assert (movies / "old.yaml").exists()
+
+
+def test_catalog_refresh_after_sealing(movies: Path) -> None:
+    catalog = Catalog([movies], [])
+    catalog.load()
+    seal_folder(movies, True, datetime.date(2020, 1, 1))
+    changes = catalog.refresh()
+    # Sealed items didn't change, so there's nothing to sync and nothing was removed
+    assert not changes
+    assert sorted(i.title for i in catalog.items.values()) == ["New", "Old", "Older"]
+    assert sorted(i.title for i in catalog.sealed_items([movies])) == ["Old", "Older"]
+
+    write_movie(movies / "old.yaml", "Old 2", "2010-05-07")
+    changes = catalog.refresh()
+    assert [p.name for p in changes.updated] == ["old.yaml"]
+    assert [i.title for i in changes.removed] == ["Old"]
+    assert sorted(i.title for i in catalog.sealed_items([movies])) == ["Older"]
+
+
+def test_router_skips_unchanged_archive(movies: Path, tmp_path: Path) -> None:
+    seal_folder(movies, True, datetime.date(2020, 1, 1))
+    state = SyncState(tmp_path / "state.yaml")
+    # The remote copy of Old is out of date, which only a sync that diffs the archive would notice
+    events = [
+        {
+            "id": "old",
+            "summary": "Old",
+            "description": "stale",
+            "start": {"date": "2010-05-07"},
+            "end": {"date": "2010-05-08"},
+        },
+        {
+            "id": "older",
+            "summary": "Older",
+            "description": "about Older",
+            "start": {"date": "2008-05-02"},
+            "end": {"date": "2008-05-03"},
+        },
+    ]
+
+    service = FakeEventsService(events)
+    Router({"all": YamlCalendar("All", "all", [movies], [], service)}).sync(False, state)
+    # The upcoming release is written first
+    assert service.calls == ["insert New", "patch old description,source,transparency"]
+
+    # Once recorded, the unchanged archive isn't diffed (or swept for stale events) again
+    service = FakeEventsService(events)
+    Router({"all": YamlCalendar("All", "all", [movies], [], service)}).sync(False, state)
+    assert service.calls == ["insert New"]
+
+    service = FakeEventsService(events)
+    Router({"all": YamlCalendar("All", "all", [movies], [], service)}).sync(True, state)
+    # Forcing diffs every field, and the remote events are missing the source and transparency
+    assert service.calls == [
+        "insert New",
+        "patch old description,source,transparency",
+        "patch older source,transparency",
+    ]
+
+
+def test_edited_segment_is_diffed_again(movies: Path, tmp_path: Path) -> None:
+    seal_folder(movies, True, datetime.date(2020, 1, 1))
+    segment = load_segment(movies)
+    assert segment is not None
+    state = SyncState(tmp_path / "state.yaml")
+    Router({"all": YamlCalendar("All", "all", [movies], [], FakeEventsService([]))}).sync(False, state)
+
+    # Editing the segment by hand without updating its hash still counts as a change
+    path = segment_path(movies)
+    content = json.loads(path.read_text(encoding="UTF-8"))
+    assert content["hash"] == segment.content_hash
+    content["items"][0]["description"] = "edited"
+    path.write_text(json.dumps(content), encoding="UTF-8")
+    edited = load_segment(movies)
+    assert edited is not None and edited.content_hash != segment.content_hash
+    service = FakeEventsService([])
+    Router({"all": YamlCalendar("All", "all", [movies], [], service)}).sync(False, state)
+    assert service.calls == ["insert New", "insert Old", "insert Older"]
+
+    content["items"][0]["title"] = ""
+    path.write_text(json.dumps(content), encoding="UTF-8")
+    with pytest.raises(ValueError):
+        load_segment(movies)
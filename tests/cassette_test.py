@@ -0,0 +1,124 @@
+"""
+Pytests for cassette.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+from fakes import local_server
+
+from mcu_calendar import cassette, transport
+from mcu_calendar.cassette import Cassette, CassetteHttp, CassetteMiss, request_key
+from mcu_calendar.transport import PooledSession
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Answers every request with a counter of how many it has answered, so replays can be told apart
+    """
+
+    protocol_version = "HTTP/1.1"
+    count = 0
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        Handler.count += 1
+        body = f'{{"path": "{self.path}", "count": {Handler.count}}}'.encode("UTF-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=secret")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_: object) -> None:
+        pass
+
+
+@pytest.fixture(name="url")
+def fixture_url() -> Iterator[str]:
+    Handler.count = 0
+    with local_server(Handler) as url:
+        yield url
+
+
+def test_request_key() -> None:
+    assert request_key("get", "https://api/x?b=2&api_key=secret&a=1") == "GET https://api/x?a=1&b=2"
+    assert request_key("GET", "https://api/x?a=1&b=2") == request_key("GET", "https://api/x?b=2&a=1")
+    assert request_key("POST", "https://api/x", '{"a": 1}') == request_key("POST", "https://api/x", b'{"a": 1}')
+    assert request_key("POST", "https://api/x", '{"a": 1}') != request_key("POST", "https://api/x", '{"a": 2}')
+
+
+def test_session_record_and_replay(url: str, tmp_path: Path) -> None:
+    path = tmp_path / "tape.json"
+    with Cassette(path, record=True) as tape:
+        session = PooledSession(timeout=5, cassette=tape)
+        recorded = [session.get(f"{url}/x?api_key=secret").json() for _ in range(2)]
+        recorded.append(session.get(f"{url}/y").json())
+        session.close()
+    assert "secret" not in path.read_text(encoding="UTF-8")
+
+    replay = Cassette(path, speed=0)
+    session = PooledSession(cassette=replay)
+    assert [session.get(f"{url}/x?api_key=other").json() for _ in range(2)] == recorded[:2]
+    # Once a request's responses run out the last one keeps being replayed
+    assert session.get(f"{url}/x").json() == recorded[1]
+    response = session.get(f"{url}/y")
+    assert response.json() == recorded[2]
+    assert response.headers["Content-Type"] == "application/json"
+    assert "Set-Cookie" not in response.headers
+    assert Handler.count == 3
+    assert replay.replayed == 4
+
+    with pytest.raises(CassetteMiss):
+        session.get(f"{url}/z")
+
+
+def test_replay_latency(url: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "tape.json"
+    with Cassette(path, record=True) as tape:
+        PooledSession(timeout=5, cassette=tape).get(f"{url}/x")
+    latency = tape.interactions[request_key("GET", f"{url}/x")][0].latency
+    assert latency > 0
+
+    sleeps: List[float] = []
+    monkeypatch.setattr("time.sleep", sleeps.append)
+    PooledSession(cassette=Cassette(path)).get(f"{url}/x")
+    PooledSession(cassette=Cassette(path, speed=0)).get(f"{url}/x")
+    assert sleeps == [pytest.approx(latency, abs=1e-6)]
+
+
+def test_httplib2_record_and_replay(url: str, tmp_path: Path) -> None:
+    path = tmp_path / "tape.json"
+    with Cassette(path, record=True) as tape:
+        _, content = CassetteHttp(tape, timeout=5).request(f"{url}/events?key=secret")
+
+    response, replayed = CassetteHttp(Cassette(path, speed=0)).request(f"{url}/events")
+    assert (response.status, response["content-type"], replayed) == (200, "application/json", content)
+    assert Handler.count == 1
+
+
+def test_configure(url: str, tmp_path: Path) -> None:
+    path = tmp_path / "tape.json"
+    parser = ArgumentParser()
+    cassette.add_arguments(parser)
+    tape = cassette.from_arguments(parser.parse_args(["--record", str(path)]))
+    assert tape is not None and tape.recording
+    try:
+        transport.configure(cassette=tape)
+        assert transport.active_cassette() is tape
+        assert isinstance(transport.google_http(), CassetteHttp)
+        transport.session().get(f"{url}/x")
+    finally:
+        transport.configure()
+    assert transport.active_cassette() is None
+    assert len(tape) == 1
+
+    tape.save()
+    replay = cassette.from_arguments(parser.parse_args(["--replay", str(path), "--zero-latency"]))
+    assert replay is not None and not replay.recording and replay.speed == 0
+    assert len(replay) == 1
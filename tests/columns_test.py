@@ -0,0 +1,88 @@
+"""
+Pytests for columns.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+import random
+from pathlib import Path
+from typing import List
+
+from mcu_calendar.columns import (
+    KIND_MOVIE,
+    KIND_SHOW,
+    SCHEDULE_DAILY,
+    SCHEDULE_DATES,
+    SCHEDULE_SINGLE,
+    SCHEDULE_WEEKLY,
+    SCHEDULE_WEEKLY_EXCEPTIONS,
+    CatalogColumns,
+    classify_recurrence,
+)
+from mcu_calendar.events import GoogleMediaEvent, Movie, Show
+from mcu_calendar.recurrence import encode_recurrence
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+
+def day(offset: int) -> datetime.date:
+    return datetime.date(2024, 1, 1) + datetime.timedelta(days=offset)
+
+
+def show(title: str, offsets: List[int]) -> Show:
+    return Show(title, [day(o) for o in offsets], "", Path(f"{title}.yaml"))
+
+
+def test_columns() -> None:
+    items: List[GoogleMediaEvent] = [
+        Movie("A", "", day(0), Path("a.yaml"), "tt1", {"GB": day(-1)}),
+        show("S", [0, 7, 14]),
+        show("S", [28, 35]),
+        show("D", [3, 4, 5, 6]),
+        show("X", [0, 7, 21]),
+        show("R", [0, 3, 30]),
+    ]
+    columns = CatalogColumns(items)
+    assert list(columns.kind) == [KIND_MOVIE, KIND_SHOW, KIND_SHOW, KIND_SHOW, KIND_SHOW, KIND_SHOW]
+    assert columns.titles == ["A", "S", "D", "X", "R"]
+    assert list(columns.title_index) == [0, 1, 1, 2, 3, 4]
+    assert list(columns.imdb_ids) == ["tt1", "", "", "", "", ""]
+    assert list(columns.lengths()) == [1, 3, 2, 4, 3, 3]
+    assert list(columns.schedules()) == [
+        SCHEDULE_SINGLE,
+        SCHEDULE_WEEKLY,
+        SCHEDULE_WEEKLY,
+        SCHEDULE_DAILY,
+        SCHEDULE_WEEKLY_EXCEPTIONS,
+        SCHEDULE_DATES,
+    ]
+
+    assert [i.title for i in columns.select(columns.releasing_between(day(8), day(13)))] == []
+    assert [i.title for i in columns.select(columns.releasing_between(day(14), day(29)))] == ["S", "S", "X"]
+    assert [i.title for i in columns.select(columns.in_window(day(20)))] == ["S", "X", "R"]
+    assert columns.in_window(None).all()
+
+    # Regional columns use the region's release dates
+    assert CatalogColumns(items, "GB").first_dates()[0] == day(-1)
+
+
+def test_schedules_match_encode_recurrence() -> None:
+    rng = random.Random(42)
+    shows = [Show.from_yaml(p) for p in sorted((Path("data") / "mcu-shows").glob("*.yaml"))]
+    for i in range(500):
+        # Mostly regular weekly or daily schedules, with a few dates off the grid
+        step = rng.choice([1, 7])
+        offsets = {step * o for o in rng.sample(range(12), rng.randint(1, 8))}
+        offsets |= set(rng.sample(range(80), rng.randint(0, 2)))
+        shows.append(show(f"Random {i}", sorted(offsets)))
+    columns = CatalogColumns(shows)
+    expected = [classify_recurrence(encode_recurrence(s.release_dates)) for s in shows]
+    assert list(columns.schedules()) == expected
+
+
+def test_columns_match_object_path() -> None:
+    cal = YamlCalendar("Test", "uuid", [Path("data") / "mcu-movies"], [Path("data") / "mcu-shows"], None)
+    items = list(cal.iter_items())
+    columns = CatalogColumns(items)
+    cal.window_start = datetime.date(2021, 1, 1)
+    assert columns.select(columns.in_window(cal.window_start)) == [i for i in items if cal.in_window(i)]
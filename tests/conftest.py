@@ -0,0 +1,34 @@
+"""
+Fixtures shared by the tests
+"""
+
+import shutil
+from pathlib import Path
+
+import pytest
+from fakes import git
+
+
+@pytest.fixture(name="git_repo")
+def fixture_git_repo(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    An empty git repo that the test runs in
+    """
+    monkeypatch.chdir(tmp_path)
+    git("init", "-q")
+    git("config", "user.name", "test")
+    git("config", "user.email", "test@example.com")
+    return tmp_path
+
+
+@pytest.fixture(name="data")
+def fixture_data(tmp_path: Path) -> Path:
+    """
+    A data folder with an empty movies and shows folder, and the repo's schemas to validate them with
+    """
+    data = tmp_path / "data"
+    (data / "movies").mkdir(parents=True)
+    (data / "shows").mkdir()
+    shutil.copy(Path("data") / "movie-schema.yaml", data)
+    shutil.copy(Path("data") / "show-schema.yaml", data)
+    return data
@@ -196,6 +196,23 @@ def test_movie_event_not_equals(event_dict: Dict[str, Any]) -> None:
     assert not movie == event_dict
 
 
+def test_movie_for_region(tmp_path: Path) -> None:
+    path = tmp_path / "movie.yaml"
+    path.write_text(
+        "title: A\nrelease_date: 2023-02-17\nregional_release_dates:\n  GB: 2023-02-16\ndescription: x\n",
+        encoding="UTF-8",
+    )
+    movie = Movie.from_yaml(path)
+    assert movie.regional_release_dates == {"GB": datetime.date(2023, 2, 16)}
+    assert movie.for_region(None) is movie and movie.for_region("CA") is movie
+    gb_movie = movie.for_region("GB")
+    assert gb_movie.to_google_event()["start"] == {"date": "2023-02-16"}
+    assert movie.to_google_event()["start"] == {"date": "2023-02-17"}
+    # Each region's copy is only made once, so its google event is only built once
+    assert movie.for_region("GB") is gb_movie
+    assert movie != Movie("A", "x", datetime.date(2023, 2, 17), path)
+
+
 # ======================================
 # Tests for events.Show
 # ======================================
@@ -478,7 +495,7 @@ def test_show_event_not_equals(event_dict: Dict[str, Any]) -> None:
                 ],
                 "description": "Sometimes things happen",
             },
-            None,
+            "RRULE:FREQ=WEEKLY;WKST=SU;COUNT=2;BYDAY=SA",
         ),
         (
             {
@@ -499,3 +516,15 @@ def test_show_recurrence(event: Dict[str, Any], recurrence: str) -> None:
         assert google_event["recurrence"] is None
     else:
         assert google_event["recurrence"][0] == recurrence
+
+
+def test_changed_fields() -> None:
+    show = Show("TITLE", [datetime.date(2019, 4, 20)], "Sometimes things happen", file_path=Path())
+    event = {**show.to_google_event(), "id": "1", "etag": "x"}
+    # Google leaves the empty recurrence out of the event
+    del event["recurrence"]
+    assert not show.changed_fields(event)
+
+    event["description"] = "Old"
+    event["recurrence"] = ["RRULE:FREQ=WEEKLY;COUNT=2"]
+    assert show.changed_fields(event) == {"description": "Sometimes things happen", "recurrence": None}
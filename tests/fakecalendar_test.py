@@ -0,0 +1,103 @@
+"""
+Pytests for fakecalendar.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+from pathlib import Path
+from typing import Any, Iterator, List
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from mcu_calendar.fakecalendar import FakeCalendarApi, FakeCalendarServer
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+CAL_ID = "test@group.calendar.google.com"
+
+
+def event(summary: str, day: int = 1) -> dict:
+    return {"summary": summary, "start": {"date": f"2024-05-{day:02}"}, "end": {"date": f"2024-05-{day + 1:02}"}}
+
+
+@pytest.fixture(name="server")
+def fixture_server() -> Iterator[FakeCalendarServer]:
+    with FakeCalendarServer(FakeCalendarApi()) as server:
+        yield server
+
+
+def test_sync_yaml_calendar(server: FakeCalendarServer, tmp_path: Path) -> None:
+    (tmp_path / "a.yaml").write_text("title: A\nrelease_date: 2024-05-03\ndescription: new\n", encoding="UTF-8")
+    (tmp_path / "b.yaml").write_text("title: B\nrelease_date: 2024-07-26\ndescription: x\n", encoding="UTF-8")
+    server.api.seed_events(CAL_ID, [{**event("A"), "description": "old"}, event("Stale")])
+
+    calendar = YamlCalendar("Test", CAL_ID, [tmp_path], [], server.service())
+    calendar.create_google_events()
+    events = {e["summary"]: e for e in server.api.events(CAL_ID)}
+    assert sorted(events) == ["A", "B"]
+    assert events["A"]["description"] == "new"
+    assert events["B"]["start"] == {"date": "2024-07-26"}
+    assert server.api.counts == {"list": 1, "insert": 1, "patch": 1, "delete": 1}
+
+    # A second sync finds nothing to change
+    calendar.create_google_events()
+    assert server.api.counts["list"] == 2
+    assert server.api.counts["patch"] == 1
+
+
+def test_pages_and_sync_tokens(server: FakeCalendarServer) -> None:
+    server.api.seed_events(CAL_ID, [event(f"E{i}", i + 1) for i in range(5)])
+    service = server.service()
+    first = service.list(calendarId=CAL_ID, maxResults=2).execute()
+    assert [e["summary"] for e in first["items"]] == ["E0", "E1"]
+    second = service.list(calendarId=CAL_ID, maxResults=2, pageToken=first["nextPageToken"]).execute()
+    third = service.list(calendarId=CAL_ID, maxResults=2, pageToken=second["nextPageToken"]).execute()
+    assert [e["summary"] for e in third["items"]] == ["E4"]
+    assert "nextPageToken" not in third
+
+    later = service.list(calendarId=CAL_ID, timeMin="2024-05-04T00:00:00Z").execute()
+    assert [e["summary"] for e in later["items"]] == ["E3", "E4"]
+
+    service.patch(calendarId=CAL_ID, eventId=first["items"][0]["id"], body={"description": "d"}).execute()
+    service.delete(calendarId=CAL_ID, eventId=first["items"][1]["id"]).execute()
+    changes = service.list(calendarId=CAL_ID, syncToken=third["nextSyncToken"]).execute()
+    assert [(e["summary"], e["status"], e.get("description")) for e in changes["items"]] == [
+        ("E0", "confirmed", "d"),
+        ("E1", "cancelled", None),
+    ]
+    with pytest.raises(HttpError) as error:
+        service.list(calendarId=CAL_ID, syncToken="expired").execute()
+    assert error.value.status_code == 410
+
+
+def test_batch(server: FakeCalendarServer) -> None:
+    service = server.service()
+    results: List[Any] = []
+    batch = server.new_batch()
+    for summary in ("A", "B"):
+        batch.add(service.insert(calendarId=CAL_ID, body=event(summary)), callback=lambda _, r, e: results.append(r))
+    batch.add(service.delete(calendarId=CAL_ID, eventId="missing"), callback=lambda _, r, e: results.append(e))
+    batch.execute()
+
+    assert [r["summary"] for r in results[:2]] == ["A", "B"]
+    assert isinstance(results[2], HttpError) and results[2].status_code == 404
+    assert sorted(e["summary"] for e in server.api.events(CAL_ID)) == ["A", "B"]
+    assert server.api.counts["batch"] == 1
+
+
+def test_quota_and_failures() -> None:
+    with FakeCalendarServer(FakeCalendarApi(quota=2, quota_window=60)) as server:
+        service = server.service()
+        for _ in range(2):
+            service.list(calendarId=CAL_ID).execute()
+        with pytest.raises(HttpError) as error:
+            service.list(calendarId=CAL_ID).execute()
+        assert error.value.status_code == 403
+        assert error.value.error_details[0]["reason"] == "rateLimitExceeded"
+        assert server.api.counts["throttled"] == 1
+
+    with FakeCalendarServer(FakeCalendarApi(failure_rate=1.0)) as server:
+        with pytest.raises(HttpError) as error:
+            server.service().insert(calendarId=CAL_ID, body=event("A")).execute()
+        assert error.value.status_code == 503
+        assert not server.api.events(CAL_ID)
@@ -0,0 +1,137 @@
+"""
+Fakes and helpers shared by the tests that sync calendars or talk to a local http server
+"""
+
+import os
+import subprocess  # nosec B404
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Type, Union
+
+
+def git(*args: str, day: Optional[date] = None) -> None:
+    """
+    Runs git in the current folder, committing as if it was the given day
+    """
+    env = (
+        None
+        if day is None
+        else {**os.environ, "GIT_AUTHOR_DATE": f"{day}T12:00:00", "GIT_COMMITTER_DATE": f"{day}T12:00:00"}
+    )
+    subprocess.run(["git", *args], check=True, capture_output=True, env=env)  # nosec B603 B607
+
+
+@contextmanager
+def local_server(handler: Type[BaseHTTPRequestHandler]) -> Iterator[str]:
+    """
+    Serves requests with the handler on a free local port while in the context, giving its url
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def write_movie(
+    path: Path, title: str, release_date: Union[str, date] = "2019-04-20", description: Optional[str] = None
+) -> Path:
+    """
+    Writes a movie's yaml file, described as "about {title}" unless a description is given
+    """
+    description = f"about {title}" if description is None else description
+    path.write_text(f"title: {title}\nrelease_date: {release_date}\ndescription: {description}\n", encoding="UTF-8")
+    return path
+
+
+class FakeRequest:  # pylint: disable=too-few-public-methods
+    """
+    A request that returns its result, or raises its error, when it's executed
+    """
+
+    def __init__(self, result: Any = None, error: Optional[Exception] = None) -> None:
+        self.result = result
+        self.error = error
+
+    def execute(self, *_: Any, **__: Any) -> Any:
+        """
+        Gets the result, or raises the error
+        """
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FakeEventsService:
+    """
+    A stand in for the calendar api's events() service.  It lists the events it was given (page_size
+    at a time when that's set), and records every change as "insert Title", "update Title",
+    "patch id field,field" or "delete id" in calls, and the arguments of every request by method.
+    Writing the event titled fail_on raises error once the request is executed
+    """
+
+    def __init__(self, events: Optional[List[Dict]] = None, page_size: Optional[int] = None) -> None:
+        self.events = [] if events is None else events
+        self.page_size = page_size
+        self.calls: List[str] = []
+        self.requests: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.fail_on: Optional[str] = None
+        self.error: Exception = RuntimeError("quota exceeded")
+
+    def inserted(self, cal_id: str) -> List[str]:
+        """
+        Gets the titles inserted into a calendar, in order
+        """
+        return [kwargs["body"]["summary"] for kwargs in self.requests["insert"] if kwargs["calendarId"] == cal_id]
+
+    def list(self, **kwargs: Any) -> FakeRequest:
+        """
+        Lists the events, a page at a time when there's a page size
+        """
+        self.requests["list"].append(kwargs)
+        events = [dict(e) for e in self.events]
+        if self.page_size is None:
+            return FakeRequest({"items": events})
+        start = int(kwargs.get("pageToken", 0))
+        end = start + self.page_size
+        result: Dict[str, Any] = {"items": events[start:end]}
+        if end < len(events):
+            result["nextPageToken"] = str(end)
+        return FakeRequest(result)
+
+    def _write(self, method: str, kwargs: Dict[str, Any], text: str) -> FakeRequest:
+        self.requests[method].append(kwargs)
+        self.calls.append(f"{method} {text}")
+        summary = kwargs.get("body", {}).get("summary")
+        return FakeRequest(error=self.error if summary is not None and summary == self.fail_on else None)
+
+    def insert(self, **kwargs: Any) -> FakeRequest:
+        """
+        Records an insert
+        """
+        return self._write("insert", kwargs, kwargs["body"]["summary"])
+
+    def update(self, **kwargs: Any) -> FakeRequest:
+        """
+        Records an update
+        """
+        return self._write("update", kwargs, kwargs["body"]["summary"])
+
+    def patch(self, **kwargs: Any) -> FakeRequest:
+        """
+        Records a patch
+        """
+        return self._write("patch", kwargs, f"{kwargs['eventId']} {','.join(sorted(kwargs['body']))}")
+
+    def delete(self, **kwargs: Any) -> FakeRequest:
+        """
+        Records a delete
+        """
+        return self._write("delete", kwargs, kwargs["eventId"])
@@ -0,0 +1,175 @@
+"""
+Pytests for fanout.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+from pathlib import Path
+from typing import Any, Iterator, List, Optional
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from mcu_calendar import fanout
+from mcu_calendar.fakecalendar import FakeCalendarApi, FakeCalendarServer
+from mcu_calendar.fanout import (
+    FanoutError,
+    QuotaService,
+    RateLimiter,
+    Subscriber,
+    fanout_sync,
+    load_subscribers,
+)
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+
+class FakeClock:
+    """
+    A clock that only moves when something sleeps
+    """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture(name="server")
+def fixture_server() -> Iterator[FakeCalendarServer]:
+    with FakeCalendarServer(FakeCalendarApi()) as server:
+        yield server
+
+
+@pytest.fixture(name="data_dir")
+def fixture_data_dir(tmp_path: Path) -> Path:
+    for folder, titles in (("movies", ["A", "B", "C"]), ("shows", [])):
+        (tmp_path / folder).mkdir()
+        for day, title in enumerate(titles, 1):
+            (tmp_path / folder / f"{title.lower()}.yaml").write_text(
+                f"title: {title}\nrelease_date: 2024-05-{day:02}\ndescription: {title} desc\n", encoding="UTF-8"
+            )
+    return tmp_path
+
+
+def subscriber(key: str, service: Any, data_dir: Path, credentials: Optional[str] = None) -> Subscriber:
+    calendar = YamlCalendar(key, f"{key}@calendar", [data_dir / "movies"], [data_dir / "shows"], service)
+    return Subscriber(key, calendar, credentials)
+
+
+def test_rate_limiter() -> None:
+    clock = FakeClock()
+    limiter = RateLimiter(2, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(4):
+        limiter.acquire()
+    assert clock.sleeps == [0.5, 0.5]
+    clock.now += 10
+    limiter.acquire()
+    assert len(clock.sleeps) == 2
+
+
+def test_fanout_sync(server: FakeCalendarServer, data_dir: Path) -> None:
+    server.api.seed_events("b@calendar", [{"summary": "Stale", "start": {"date": "2024-01-01"}}])
+    service = QuotaService(server.service(), RateLimiter(1000))
+    subscribers = [subscriber(key, service, data_dir) for key in ("a", "b")]
+    counts = fanout_sync(subscribers)
+    assert counts["a"] == {"insert": 3, "skip": 0}
+    assert counts["b"] == {"insert": 3, "delete": 1, "skip": 0}
+    for key in ("a", "b"):
+        assert sorted(e["summary"] for e in server.api.events(f"{key}@calendar")) == ["A", "B", "C"]
+
+    counts = fanout_sync(subscribers)
+    assert counts["a"] == {"skip": 3}
+
+
+def test_writes_take_turns(data_dir: Path) -> None:
+    calls: List[str] = []
+
+    class Service:
+        """
+        Records which calendar each call was made to
+        """
+
+        # pylint: disable=missing-function-docstring,invalid-name,unused-argument
+        def list(self, calendarId: str, **kwargs: Any) -> Any:
+            return Request(lambda: {"items": []})
+
+        def insert(self, calendarId: str, **kwargs: Any) -> Any:
+            return Request(lambda: calls.append(calendarId))
+
+    class Request:  # pylint: disable=too-few-public-methods
+        """
+        A request that runs a function when executed
+        """
+
+        def __init__(self, function: Any) -> None:
+            self.execute = function
+
+    fanout_sync([subscriber(key, Service(), data_dir) for key in ("a", "b", "c")])
+    assert calls == ["a@calendar", "b@calendar", "c@calendar"] * 3
+
+
+def test_rate_limited_calls_are_retried(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(fanout, "BACKOFF_SECONDS", 0.1)
+    with FakeCalendarServer(FakeCalendarApi(quota=2, quota_window=0.25)) as server:
+        service = QuotaService(server.service(), RateLimiter(1000))
+        for _ in range(3):
+            service.list(calendarId="a@calendar").execute()
+        # The third call was throttled by the server until its quota window passed
+        assert server.api.counts["throttled"] >= 1
+        assert server.api.counts["list"] == 3
+
+    monkeypatch.setattr(fanout, "MAX_RETRIES", 1)
+    with FakeCalendarServer(FakeCalendarApi(quota=0, quota_window=60)) as server:
+        with pytest.raises(HttpError):
+            QuotaService(server.service(), RateLimiter(1000)).list(calendarId="a@calendar").execute()
+        assert server.api.counts["throttled"] == 2
+
+
+def test_failures_only_stop_their_subscriber(server: FakeCalendarServer, data_dir: Path) -> None:
+    class Broken:  # pylint: disable=too-few-public-methods
+        """
+        A service whose calendar can't be listed
+        """
+
+        # pylint: disable=missing-function-docstring,unused-argument
+        def list(self, **kwargs: Any) -> Any:
+            raise HttpError(type("Response", (), {"status": 404, "reason": "Not Found"})(), b"{}")
+
+    with pytest.raises(FanoutError) as error:
+        fanout_sync([subscriber("broken", Broken(), data_dir, "other"), subscriber("a", server.service(), data_dir)])
+    assert list(error.value.errors) == ["broken"]
+    assert len(server.api.events("a@calendar")) == 3
+
+
+def test_load_subscribers(tmp_path: Path, data_dir: Path) -> None:
+    (tmp_path / "calendars.yaml").write_text("mcu:\n  name: MCU\n  movies: [movies]\n", encoding="UTF-8")
+    (tmp_path / "subscribers.yaml").write_text(
+        "quotas:\n  default: 4\n  team-b.json: 2\n"
+        "subscribers:\n"
+        "  team-a:\n    calendar_id: a@calendar\n    route: mcu\n"
+        "  team-b:\n    calendar_id: b@calendar\n    credentials: team-b.json\n    name: Team B\n"
+        "    shows: [shows]\n    filters:\n      released_after: 2020-01-01\n"
+        "  team-c:\n    calendar_id: c@calendar\n    credentials: team-b.json\n    movies: [movies]\n",
+        encoding="UTF-8",
+    )
+    created: List[Optional[str]] = []
+
+    def service_for(credentials: Optional[str]) -> Optional[str]:
+        created.append(credentials)
+        return credentials
+
+    subscribers = load_subscribers(service_for, tmp_path / "subscribers.yaml", tmp_path / "calendars.yaml", data_dir)
+    assert created == [None, "team-b.json"]
+    a, b, c = (s.calendar for s in subscribers)
+    assert (a.name, a.cal_id, a.movie_dirs, a.show_dirs) == ("MCU", "a@calendar", [data_dir / "movies"], [])
+    assert (b.name, b.movie_dirs, b.show_dirs, b.item_filter is not None) == ("Team B", [], [data_dir / "shows"], True)
+    assert c.name == "team-c"
+    assert b.google_service is c.google_service
+    assert (a.google_service.limiter.rate, b.google_service.limiter.rate) == (4, 2)
+    assert [s.credentials for s in subscribers] == [None, "team-b.json", "team-b.json"]
@@ -0,0 +1,122 @@
+"""
+Pytests for feedserver.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+import gzip
+import http.client
+import threading
+import time
+from email.utils import format_datetime
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+import pytest
+from fakes import write_movie
+
+from mcu_calendar.feedserver import FeedServer, FeedStore, RenderedFeed
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+MODIFIED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture(name="server")
+def fixture_server(tmp_path: Path) -> Iterator[Tuple[FeedServer, Path]]:
+    movie_dir = tmp_path / "movies"
+    movie_dir.mkdir()
+    write_movie(movie_dir / "my_title.yaml", "MY TITLE", "2019-04-20")
+    store = FeedStore({"test": YamlCalendar("Test", "uuid", [movie_dir], [], None)})
+    store.load()
+    server = FeedServer(("127.0.0.1", 0), store, reload_interval=3600)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, movie_dir
+    server.shutdown()
+    server.server_close()
+
+
+def test_rendered_feed_conditional() -> None:
+    feed = RenderedFeed(b"body", "text/plain", MODIFIED)
+    assert gzip.decompress(feed.gzip_body) == b"body"
+    assert feed.is_not_modified(feed.etag, None)
+    assert feed.is_not_modified(f'"other", W/{feed.etag}', None)
+    assert not feed.is_not_modified('"other"', None)
+    assert feed.is_not_modified(None, format_datetime(MODIFIED, usegmt=True))
+    assert not feed.is_not_modified(None, format_datetime(MODIFIED - datetime.timedelta(days=1), usegmt=True))
+    assert not feed.is_not_modified(None, "not a date")
+    assert not feed.is_not_modified(None, None)
+
+
+def test_serve_feeds(server: Tuple[FeedServer, Path]) -> None:
+    feed_server, _ = server
+    conn = http.client.HTTPConnection("127.0.0.1", feed_server.server_address[1])
+
+    conn.request("GET", "/test.ics")
+    response = conn.getresponse()
+    body = response.read()
+    assert response.status == 200
+    assert b"SUMMARY:MY TITLE" in body
+    etag = response.getheader("ETag", "")
+
+    conn.request("GET", "/test.ics", headers={"If-None-Match": etag})
+    response = conn.getresponse()
+    assert response.status == 304
+    assert response.read() == b""
+
+    conn.request("GET", "/test.json", headers={"Accept-Encoding": "gzip"})
+    response = conn.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert b'"summary":"MY TITLE"' in gzip.decompress(response.read())
+
+    conn.request("GET", "/missing.ics")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 404
+    conn.close()
+
+
+def test_reload(server: Tuple[FeedServer, Path]) -> None:
+    feed_server, movie_dir = server
+    store = feed_server.store
+    etag = store.feeds["/test.ics"].etag
+    assert store.reload() == []
+
+    write_movie(movie_dir / "my_title.yaml", "MY TITLE", "2019-05-20")
+    assert store.reload() == ["test"]
+    assert store.feeds["/test.ics"].etag != etag
+    assert b"DTSTART;VALUE=DATE:20190520" in store.feeds["/test.ics"].body
+
+    (movie_dir / "my_title.yaml").unlink()
+    assert store.reload() == ["test"]
+    assert b"VEVENT" not in store.feeds["/test.ics"].body
+
+
+def test_reload_survives_broken_files(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    movie_dir = tmp_path / "movies"
+    movie_dir.mkdir()
+    write_movie(movie_dir / "my_title.yaml", "MY TITLE", "2019-04-20")
+    store = FeedStore({"test": YamlCalendar("Test", "uuid", [movie_dir], [], None)})
+    store.load()
+    feed_server = FeedServer(("127.0.0.1", 0), store, reload_interval=0.01)
+    thread = threading.Thread(target=feed_server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        (movie_dir / "my_title.yaml").write_text("title: [B\n", encoding="UTF-8")
+        wait_for(lambda: "Reload failed" in capsys.readouterr().out)
+        assert b"DTSTART;VALUE=DATE:20190420" in store.feeds["/test.ics"].body
+
+        write_movie(movie_dir / "my_title.yaml", "MY TITLE", "2019-05-20")
+        wait_for(lambda: b"DTSTART;VALUE=DATE:20190520" in store.feeds["/test.ics"].body)
+    finally:
+        feed_server.shutdown()
+        feed_server.server_close()
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
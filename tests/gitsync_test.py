@@ -0,0 +1,156 @@
+"""
+Pytests for gitsync.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+import json
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from fakes import git, write_movie
+
+from mcu_calendar.archive import seal_folder, segment_path
+from mcu_calendar.gitsync import (
+    affected_media,
+    git_changes,
+    head_commit,
+    incremental_sync,
+)
+from mcu_calendar.syncstate import SyncState
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+
+def write_distinct_movie(path: Path, title: str) -> None:
+    # Keep the files distinct enough that git's rename detection doesn't pair up unrelated files
+    write_movie(path, title, description=f"{path.stem} " * 40)
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(git_repo: Path) -> Path:  # pylint: disable=unused-argument
+    movies = Path("data") / "movies"
+    movies.mkdir(parents=True)
+    write_distinct_movie(movies / "a.yaml", "A")
+    write_distinct_movie(movies / "b.yaml", "B")
+    write_distinct_movie(movies / "c.yaml", "C")
+    write_distinct_movie(movies / "d.yaml", "D")
+    git("add", "-A")
+    git("commit", "-qm", "first")
+    return movies
+
+
+def test_affected_media(repo: Path) -> None:
+    first = head_commit()
+    assert first is not None
+
+    write_distinct_movie(repo / "a.yaml", "A 2")
+    (repo / "b.yaml").unlink()
+    git("mv", str(repo / "c.yaml"), str(repo / "c_renamed.yaml"))
+    write_distinct_movie(repo / "e.yaml", "E")
+    git("add", "-A")
+    git("commit", "-qm", "second")
+
+    changes = git_changes(first, [repo])
+    assert changes is not None
+    assert sorted((c.status[0], c.path.name) for c in changes) == [
+        ("A", "e.yaml"),
+        ("D", "b.yaml"),
+        ("M", "a.yaml"),
+        ("R", "c_renamed.yaml"),
+    ]
+
+    cal = YamlCalendar("Test", "uuid", [repo], [], None)
+    updated, removed = affected_media(cal, first, changes)
+    assert sorted(i.title for i in updated) == ["A 2", "C", "E"]
+    assert sorted(i.title for i in removed) == ["A", "B", "C"]
+
+
+def test_affected_media_patch(repo: Path) -> None:
+    (repo / "a.patch").write_text("title: A Patched\n", encoding="UTF-8")
+    git("add", "-A")
+    git("commit", "-qm", "patch")
+    first = head_commit()
+    assert first is not None
+
+    # The old item is the one its old .patch file made, whether the patch or the yaml file changed
+    (repo / "a.patch").write_text("title: A Repatched\n", encoding="UTF-8")
+    write_distinct_movie(repo / "b.yaml", "B 2")
+    (repo / "b.patch").write_text("title: B Patched\n", encoding="UTF-8")
+    git("add", "-A")
+    git("commit", "-qm", "repatch")
+
+    changes = git_changes(first, [repo])
+    assert changes is not None
+    cal = YamlCalendar("Test", "uuid", [repo], [], None)
+    updated, removed = affected_media(cal, first, changes)
+    assert sorted(i.title for i in updated) == ["A Repatched", "B Patched"]
+    assert sorted({i.title for i in removed}) == ["A Patched", "B"]
+
+
+def test_git_changes_unknown_commit(repo: Path) -> None:
+    assert git_changes("0" * 40, [repo]) is None
+
+
+class RecordingCalendar(YamlCalendar):
+    """
+    A calendar that records which syncs it was asked to make instead of making them
+    """
+
+    def __init__(self, movie_dir: Path) -> None:
+        super().__init__("Test", "uuid", [movie_dir], [], None)
+        self.calls: List[Any] = []
+
+    def create_google_events(self, force: bool = False) -> None:
+        self.calls.append("full")
+
+    def update_google_events(self, items: Any, removed: Any, force: bool = False) -> None:
+        self.calls.append(sorted(i.title for i in items))
+
+
+def test_incremental_sync(repo: Path) -> None:
+    state = SyncState(Path("state.yaml"))
+    cal = RecordingCalendar(repo)
+
+    incremental_sync(cal, state)
+    incremental_sync(cal, state)
+    write_distinct_movie(repo / "d.yaml", "D 2")
+    git("commit", "-qam", "second")
+    incremental_sync(cal, state)
+    assert cal.calls == ["full", ["D 2"]]
+
+    assert SyncState(Path("state.yaml")).calendar("uuid")["commit"] == head_commit()
+    state.calendar("uuid")["commit"] = "0" * 40
+    incremental_sync(cal, state)
+    assert cal.calls[-1] == "full"
+
+
+def test_affected_media_archive(repo: Path) -> None:
+    first = head_commit()
+    assert first is not None
+    seal_folder(repo, True, datetime.date(2020, 1, 1))
+    git("add", "-A")
+    git("commit", "-qm", "seal")
+
+    # Sealing moves the items, it doesn't remove (or change) them
+    cal = YamlCalendar("Test", "uuid", [repo], [], None)
+    changes = git_changes(first, [repo, segment_path(repo)])
+    assert changes is not None
+    updated, removed = affected_media(cal, first, changes)
+    removed_titles = {i.title for i in removed} - {i.title for i in updated}
+    assert not removed_titles
+
+    sealed = head_commit()
+    assert sealed is not None
+    segment = json.loads(segment_path(repo).read_text(encoding="UTF-8"))
+    segment["items"][0]["title"] = "A 2"
+    segment["items"] = segment["items"][:-1]
+    segment_path(repo).write_text(json.dumps(segment), encoding="UTF-8")
+    git("commit", "-qam", "edit archive")
+
+    changes = git_changes(sealed, [repo, segment_path(repo)])
+    assert changes is not None
+    updated, removed = affected_media(cal, sealed, changes)
+    assert [i.title for i in updated] == ["A 2"]
+    assert sorted(i.title for i in removed) == ["A", "D"]
@@ -0,0 +1,98 @@
+"""
+Pytests for ics.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+import io
+from pathlib import Path
+
+import pytest
+
+from mcu_calendar.events import Movie, Show
+from mcu_calendar.ics import (
+    event_uid,
+    export_calendar,
+    fold_line,
+    read_digest,
+    write_ics,
+)
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+STAMP = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "SUMMARY:short",
+        "DESCRIPTION:" + "x" * 200,
+        "DESCRIPTION:" + "à" * 100,
+    ],
+)
+def test_fold_line(line: str) -> None:
+    folded = fold_line(line)
+    assert folded.endswith("\r\n")
+    physical_lines = folded[:-2].split("\r\n")
+    for physical_line in physical_lines:
+        assert len(physical_line.encode("UTF-8")) <= 75
+    assert "".join(p[1:] if i else p for i, p in enumerate(physical_lines)) == line
+
+
+def test_write_ics() -> None:
+    movie = Movie(
+        title="MY TITLE, the movie",
+        release_date=datetime.date(2019, 4, 20),
+        description="stuff; happens\n",
+        file_path=Path("data") / "mcu-movies" / "my_title.yaml",
+    )
+    show = Show(
+        title="MY SHOW",
+        release_dates=[datetime.date(2019, 4, 20), datetime.date(2019, 4, 27), datetime.date(2019, 5, 4)],
+        description="Sometimes things happen",
+        file_path=Path("data") / "mcu-shows" / "my_show.yaml",
+    )
+    stream = io.StringIO(newline="")
+    write_ics(stream, "Test", [movie, show], STAMP)
+    lines = stream.getvalue().split("\r\n")
+
+    assert lines[0] == "BEGIN:VCALENDAR"
+    assert lines[-2] == "END:VCALENDAR"
+    assert lines.count("BEGIN:VEVENT") == 2
+    assert "UID:mcu-movies-my_title@mcu-calendar.github.com" in lines
+    assert "SUMMARY:MY TITLE\\, the movie" in lines
+    assert "DESCRIPTION:stuff\\; happens" in lines
+    assert "DTSTART;VALUE=DATE:20190420" in lines
+    assert "DTEND;VALUE=DATE:20190421" in lines
+    assert "RRULE:FREQ=WEEKLY;WKST=SU;COUNT=3;BYDAY=SA" in lines
+
+
+def test_event_uid_stable() -> None:
+    path = Path("data") / "mcu-movies" / "my_title.yaml"
+    movie1 = Movie("MY TITLE", "stuff happens", datetime.date(2019, 4, 20), path)
+    movie2 = Movie("MY NEW TITLE", "other stuff happens", datetime.date(2020, 4, 20), path)
+    assert event_uid(movie1) == event_uid(movie2)
+
+
+def test_export_calendar_only_when_changed(tmp_path: Path) -> None:
+    movie_dir = tmp_path / "movies"
+    movie_dir.mkdir()
+    (movie_dir / "my_title.yaml").write_text(
+        "title: MY TITLE\nrelease_date: 2019-04-20\ndescription: stuff happens\n", encoding="UTF-8"
+    )
+    cal = YamlCalendar("Test", "uuid", [movie_dir], [], None)
+    ics_path = tmp_path / "feeds" / "test.ics"
+
+    assert export_calendar(cal, ics_path)
+    digest = read_digest(ics_path)
+    assert digest is not None
+    assert not export_calendar(cal, ics_path)
+    assert export_calendar(cal, ics_path, force=True)
+
+    (movie_dir / "my_title.yaml").write_text(
+        "title: MY TITLE\nrelease_date: 2019-05-20\ndescription: stuff happens\n", encoding="UTF-8"
+    )
+    assert export_calendar(cal, ics_path)
+    assert read_digest(ics_path) != digest
+    assert "DTSTART;VALUE=DATE:20190520" in ics_path.read_text(encoding="UTF-8")
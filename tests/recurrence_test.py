@@ -0,0 +1,80 @@
+"""
+Pytests for recurrence.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from mcu_calendar.events import Show
+from mcu_calendar.recurrence import encode_recurrence, expand_recurrence
+
+
+def weeks(start: datetime.date, *offsets: int) -> List[datetime.date]:
+    return [start + datetime.timedelta(weeks=o) for o in offsets]
+
+
+START = datetime.date(2019, 4, 20)
+
+
+@pytest.mark.parametrize(
+    ("release_dates", "recurrence"),
+    [
+        ([START], None),
+        (weeks(START, 0, 1, 2), ["RRULE:FREQ=WEEKLY;WKST=SU;COUNT=3;BYDAY=SA"]),
+        (
+            [START, START + datetime.timedelta(days=1), START + datetime.timedelta(days=2)],
+            ["RRULE:FREQ=DAILY;COUNT=3"],
+        ),
+        (
+            # Double episode premiere
+            [START, START + datetime.timedelta(days=1), *weeks(START, 1, 2, 3)],
+            ["RRULE:FREQ=WEEKLY;WKST=SU;COUNT=4;BYDAY=SA", "RDATE;VALUE=DATE:20190421"],
+        ),
+        (
+            # Mid season break
+            weeks(START, 0, 1, 2, 5, 6, 7),
+            ["RRULE:FREQ=WEEKLY;WKST=SU;COUNT=8;BYDAY=SA", "EXDATE;VALUE=DATE:20190511,20190518"],
+        ),
+        (
+            # No rule fits
+            [START, datetime.date(2019, 5, 2), datetime.date(2019, 6, 13)],
+            ["RDATE;VALUE=DATE:20190502,20190613"],
+        ),
+    ],
+)
+def test_encode_recurrence(release_dates: List[datetime.date], recurrence: Optional[List[str]]) -> None:
+    assert encode_recurrence(release_dates) == recurrence
+    assert expand_recurrence(release_dates[0], recurrence) == release_dates
+
+
+@pytest.mark.parametrize(
+    "release_dates",
+    [
+        weeks(START, 0, 2, 4, 6, 8),
+        weeks(START, 0, 1, 3, 4, 8, 9, 10),
+        [START + datetime.timedelta(days=d) for d in (0, 1, 2, 4, 5, 7, 13, 21)],
+        [START + datetime.timedelta(days=d * d) for d in range(10)],
+    ],
+)
+def test_round_trip(release_dates: List[datetime.date]) -> None:
+    recurrence = encode_recurrence(release_dates)
+    assert recurrence is not None
+    assert expand_recurrence(release_dates[0], recurrence) == release_dates
+
+
+@pytest.mark.parametrize(
+    "show_path",
+    [
+        *(Path("data") / "mcu-shows").iterdir(),
+        *(Path("data") / "starwars-shows").iterdir(),
+    ],
+)
+def test_round_trip_shows(show_path: Path) -> None:
+    show = Show.from_yaml(show_path)
+    event = show.to_google_event()
+    assert expand_recurrence(show.start_date, event["recurrence"]) == sorted(set(show.release_dates))
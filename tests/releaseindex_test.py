@@ -0,0 +1,64 @@
+"""
+Pytests for releaseindex.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from mcu_calendar.catalog import Catalog
+from mcu_calendar.events import Movie, Show
+from mcu_calendar.releaseindex import Release, ReleaseIndex, open_index
+
+
+@pytest.fixture(name="catalog")
+def fixture_catalog(data: Path) -> Catalog:
+    (data / "movies" / "a.yaml").write_text("title: A\nrelease_date: 2024-05-03\ndescription: x\n", encoding="UTF-8")
+    (data / "movies" / "b.yaml").write_text("title: B\nrelease_date: 2024-07-26\ndescription: x\n", encoding="UTF-8")
+    (data / "shows" / "s.yaml").write_text(
+        "title: S\nrelease_dates: [2024-04-30, 2024-05-07, 2024-05-14]\ndescription: x\n", encoding="UTF-8"
+    )
+    return Catalog([data / "movies"], [data / "shows"])
+
+
+def test_query(catalog: Catalog) -> None:
+    index = open_index(catalog)
+    assert index.query(datetime.date(2024, 5, 1), datetime.date(2024, 5, 14)) == [
+        Release(datetime.date(2024, 5, 3), "A", "movie", "movies"),
+        Release(datetime.date(2024, 5, 7), "S", "show", "shows"),
+        Release(datetime.date(2024, 5, 14), "S", "show", "shows"),
+    ]
+    assert [r.title for r in index.query(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31), {"movies"})] == [
+        "A",
+        "B",
+    ]
+    assert not index.query(datetime.date(2024, 8, 1), datetime.date(2024, 12, 31))
+
+
+def test_open_index_persists(catalog: Catalog, monkeypatch: pytest.MonkeyPatch) -> None:
+    open_index(catalog)
+    assert (catalog.folders()[0].parent / ".release_index.json").exists()
+
+    def fail(*_: Any) -> Any:
+        raise AssertionError("parsed yaml")
+
+    # An unchanged catalog is answered from the saved index without parsing any yaml
+    with monkeypatch.context() as patch:
+        patch.setattr(Movie, "from_yaml", fail)
+        patch.setattr(Show, "from_yaml", fail)
+        fresh = open_index(Catalog(catalog.movie_dirs, catalog.show_dirs))
+    assert len(fresh.query(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31))) == 5
+
+    (catalog.movie_dirs[0] / "c.yaml").write_text("title: C\nrelease_date: 2024-05-10\ndescription: x\n", "UTF-8")
+    rebuilt = open_index(Catalog(catalog.movie_dirs, catalog.show_dirs))
+    assert [r.title for r in rebuilt.query(datetime.date(2024, 5, 10), datetime.date(2024, 5, 10))] == ["C"]
+
+
+def test_load_bad_index(tmp_path: Path) -> None:
+    (tmp_path / "index.json").write_text("{", encoding="UTF-8")
+    assert ReleaseIndex.load(tmp_path / "index.json") is None
+    assert ReleaseIndex.load(tmp_path / "missing.json") is None
@@ -0,0 +1,78 @@
+"""
+Pytests for reporting.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import io
+import json
+
+import pytest
+
+from mcu_calendar import reporting
+from mcu_calendar.reporting import HeadlessReporter, Reporter
+
+
+def read_lines(text: str) -> list:
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def test_headless_only_changes(capsys: pytest.CaptureFixture) -> None:
+    report = HeadlessReporter()
+    assert list(report.track([1, 2], "Movies..")) == [1, 2]
+    report.note("    UPDATING", "MCU")
+    report.record("insert", "MCU", "Iron Man", 0.0123, "Iron Man   May 02, 2008")
+    report.record("skip", "MCU", "Thor")
+    report.record("delete", "Shows", "Loki")
+    # Nothing is written until the buffer fills or the report closes
+    assert capsys.readouterr().out == ""
+
+    report.close()
+    lines = read_lines(capsys.readouterr().out)
+    assert lines[:2] == [
+        {"action": "insert", "calendar": "MCU", "title": "Iron Man", "latency_ms": 12.3},
+        {"action": "delete", "calendar": "Shows", "title": "Loki"},
+    ]
+    assert lines[2]["action"] == "summary"
+    assert lines[2]["calendars"] == {"MCU": {"insert": 1, "skip": 1}, "Shows": {"delete": 1}}
+
+    # A report with nothing recorded has no summary
+    report.close()
+    assert capsys.readouterr().out == ""
+
+
+def test_headless_verbose(capsys: pytest.CaptureFixture) -> None:
+    report = HeadlessReporter(verbose=True)
+    report.note("    UPDATING", "MCU")
+    report.note()
+    report.record("skip", "MCU", "Thor")
+    report.close()
+    assert [line["action"] for line in read_lines(capsys.readouterr().out)] == ["note", "skip", "summary"]
+
+
+def test_headless_flushes_full_buffer(capsys: pytest.CaptureFixture, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(reporting, "BUFFER_SIZE", 2)
+    report = HeadlessReporter()
+    report.record("insert", "MCU", "A")
+    assert capsys.readouterr().out == ""
+    report.record("insert", "MCU", "B")
+    assert len(read_lines(capsys.readouterr().out)) == 2
+
+
+def test_live(capsys: pytest.CaptureFixture) -> None:
+    report = Reporter(verbose=False)
+    report.record("update", "MCU", "Iron Man", text="Iron Man   May 02, 2008")
+    report.record("skip", "MCU", "Thor")
+    report.note("    UPDATING", "MCU")
+    assert capsys.readouterr().out == "Iron Man   May 02, 2008 (Updating)\n    UPDATING MCU\n"
+    assert report.counts == {"MCU": {"update": 1, "skip": 1}}
+
+
+def test_configure(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(reporting, "_REPORTER", None)
+    monkeypatch.setattr("sys.stdout", io.StringIO())
+    assert reporting.current().headless
+    assert not reporting.current().verbose
+    assert not reporting.configure(headless=False).headless
+    assert reporting.current().verbose
+    assert reporting.configure(headless=True, verbose=True).verbose
@@ -0,0 +1,109 @@
+"""
+Pytests for router.py
+"""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+
+import datetime
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+from fakes import FakeEventsService, write_movie
+
+from mcu_calendar.events import GoogleMediaEvent, Movie
+from mcu_calendar.router import MediaFilter, Router, load_calendars
+from mcu_calendar.syncstate import SyncState
+
+
+def test_load_calendars_from_repo_config() -> None:
+    ids = {k: f"{k}-id" for k in ["mcu", "mcu-movies", "mcu-shows", "mcu-adjacent", "dceu", "starwars"]}
+    calendars = load_calendars(ids, None)
+    assert list(calendars) == list(ids)
+    assert calendars["mcu"].movie_dirs == [Path("data") / "mcu-movies"]
+    assert calendars["mcu"].show_dirs == [Path("data") / "mcu-shows"]
+    assert calendars["starwars"].movie_dirs == []
+    assert calendars["dceu"].cal_id == "dceu-id"
+
+
+def test_media_filter() -> None:
+    media_filter = MediaFilter(released_after=datetime.date(2019, 1, 1), released_before=datetime.date(2019, 12, 31))
+    assert media_filter(Movie("A", "", datetime.date(2019, 4, 20), Path()))
+    assert not media_filter(Movie("A", "", datetime.date(2018, 4, 20), Path()))
+    assert not media_filter(Movie("A", "", datetime.date(2020, 4, 20), Path()))
+
+
+def test_router_loads_and_builds_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    data = tmp_path / "data"
+    (data / "movies").mkdir(parents=True)
+    for i, year in enumerate([2018, 2019, 2020]):
+        write_movie(data / "movies" / f"movie_{i}.yaml", f"Movie {i}", f"{year}-04-20")
+    config = tmp_path / "calendars.yaml"
+    config.write_text(
+        "all:\n  name: All\n  movies: [movies]\n"
+        "same:\n  name: Same\n  movies: [movies]\n"
+        "recent:\n  name: Recent\n  movies: [movies]\n  filters:\n    released_after: 2019-01-01\n",
+        encoding="UTF-8",
+    )
+
+    loads: Counter = Counter()
+    builds: Counter = Counter()
+    load_yaml = GoogleMediaEvent.load_yaml
+    to_google_event_core = Movie._to_google_event_core  # pylint: disable=protected-access
+
+    # Validating the catalog checks the data it was loaded from rather than parsing the files again
+    def counting_load_yaml(path: Path) -> Dict[str, Any]:
+        loads[path.name] += 1
+        return load_yaml(path)
+
+    def counting_to_google_event_core(self: Movie) -> Dict[str, Any]:
+        builds[self.title] += 1
+        return to_google_event_core(self)
+
+    monkeypatch.setattr(GoogleMediaEvent, "load_yaml", staticmethod(counting_load_yaml))
+    monkeypatch.setattr(Movie, "_to_google_event_core", counting_to_google_event_core)
+
+    service = FakeEventsService()
+    calendars = load_calendars({"all": "all", "same": "same", "recent": "recent"}, service, config, data)
+    Router(calendars).sync()
+
+    assert set(loads.values()) == {1}
+    assert set(builds.values()) == {1}
+    # Past releases are written newest first
+    assert service.inserted("all") == ["Movie 2", "Movie 1", "Movie 0"]
+    assert service.inserted("same") == ["Movie 2", "Movie 1", "Movie 0"]
+    assert service.inserted("recent") == ["Movie 2", "Movie 1"]
+
+
+def test_router_sync_window(tmp_path: Path) -> None:
+    data = tmp_path / "data"
+    (data / "movies").mkdir(parents=True)
+    today = datetime.date.today()
+    for i, days_ago in enumerate([400, 10]):
+        release = today - datetime.timedelta(days=days_ago)
+        write_movie(data / "movies" / f"movie_{i}.yaml", f"Movie {i}", release)
+    config = tmp_path / "calendars.yaml"
+    config.write_text("all:\n  name: All\n  movies: [movies]\n", encoding="UTF-8")
+    state = SyncState(tmp_path / "state.yaml")
+
+    # The first sync is always a full one, and stale events anywhere get deleted
+    service = FakeEventsService([{"summary": "Gone", "id": "gone-id", "start": {"date": "2019-01-01"}}])
+    Router(load_calendars({"all": "all"}, service, config, data)).sync(False, state, 30, 7)
+    assert "timeMin" not in service.requests["list"][0]
+    assert service.inserted("all") == ["Movie 1", "Movie 0"]
+    assert service.calls[-1] == "delete gone-id"
+    assert SyncState(tmp_path / "state.yaml").calendar("all")["last_full_sync"] == today
+
+    # After that only the window is listed and synced, until the next full sync is due
+    service = FakeEventsService()
+    Router(load_calendars({"all": "all"}, service, config, data)).sync(False, state, 30, 7)
+    assert service.requests["list"][0]["timeMin"] == f"{today - datetime.timedelta(days=30)}T00:00:00Z"
+    assert service.inserted("all") == ["Movie 1"]
+
+    state.calendar("all")["last_full_sync"] = today - datetime.timedelta(days=7)
+    service = FakeEventsService()
+    Router(load_calendars({"all": "all"}, service, config, data)).sync(False, state, 30, 7)
+    assert "timeMin" not in service.requests["list"][0]
+    assert service.inserted("all") == ["Movie 1", "Movie 0"]
@@ -0,0 +1,209 @@
+"""
+Pytests for scheduler.py
+"""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pytest
+from fakes import FakeEventsService, git, write_movie
+
+from mcu_calendar.router import Router
+from mcu_calendar.scheduler import (
+    QuotaBudget,
+    SyncCall,
+    change_dates,
+    estimate_cost,
+    plan_calls,
+    schedule,
+    urgency,
+)
+from mcu_calendar.syncstate import SyncState
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+TODAY = date(2024, 5, 10)
+
+
+def call(title: str, release: Optional[date], source: Any = None, method: str = "insert") -> SyncCall:
+    return SyncCall(method, {}, title, title, release, source)
+
+
+def test_plan_calls(tmp_path: Path) -> None:
+    for title, day in (("A", 1), ("B", 2), ("C", 3)):
+        write_movie(tmp_path / f"{title.lower()}.yaml", title, date(2024, 5, day))
+    items = YamlCalendar.get_movies(tmp_path)
+    events: List[Dict] = [
+        {"id": "1", **items[0].to_google_event()},
+        {"id": "2", **items[1].to_google_event(), "description": "old"},
+        {"id": "3", **items[0].to_google_event(), "start": {"date": "2024-04-01"}},
+    ]
+    calls, skipped = plan_calls([items], events)
+    assert [(c.method, c.title, c.kwargs.get("eventId"), c.release) for c in calls] == [
+        ("patch", "B", "2", date(2024, 5, 2)),
+        ("insert", "C", None, date(2024, 5, 3)),
+        ("delete", "A", "3", date(2024, 4, 1)),
+    ]
+    assert skipped == [items[0]]
+    assert calls[1].source == items[2].file_path
+    # The payloads are the items' shared google events, not copies
+    assert calls[1].kwargs["body"] is items[2].to_google_event()
+
+    # Only the fields that differ are patched, and forcing doesn't write events that already match
+    assert calls[0].kwargs["body"] == {"description": "about B"}
+    assert calls[0].action == "update"
+    calls, skipped = plan_calls([items], events, force=True)
+    assert ([c.method for c in calls], len(skipped)) == (["patch", "insert", "delete"], 1)
+
+    calls, skipped = plan_calls([items], events, rewrite=True)
+    assert [c.method for c in calls] == ["update", "update", "insert", "delete"]
+    assert calls[0].kwargs["body"] is items[0].to_google_event()
+    assert not skipped
+
+
+def commit(message: str, day: date) -> None:
+    git("add", "-A")
+    git("commit", "-qm", message, day=day)
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(git_repo: Path) -> Path:
+    (git_repo / "movies").mkdir()
+    return git_repo / "movies"
+
+
+def test_urgency(repo: Path) -> None:
+    today = date.today()
+    old = write_movie(repo / "old.yaml", "Old", date(2008, 5, 2))
+    edited = write_movie(repo / "edited.yaml", "Edited", date(2010, 5, 7))
+    older = write_movie(repo / "older.yaml", "Older", date(2001, 1, 1))
+    stale = write_movie(repo / "stale.yaml", "Stale", date(2009, 1, 1))
+    # The first commit adds everything, so even made today it doesn't count as changing anything
+    commit("first", today)
+    edited.write_text(edited.read_text(encoding="UTF-8") + "# edited\n", encoding="UTF-8")
+    commit("edit", today - timedelta(days=3))
+    stale.write_text(stale.read_text(encoding="UTF-8") + "# edited\n", encoding="UTF-8")
+    commit("edit stale", today - timedelta(days=30))
+    draft = write_movie(repo / "draft.yaml", "Draft", date(1999, 1, 1))
+    # A fresh checkout gives every file the same mtime, which mustn't make them all recent
+    for path in (old, edited, older, stale, draft):
+        os.utime(path, (1e9, 1e9))
+
+    calls = [
+        call("Back catalog", date(2008, 5, 2), old),
+        call("Older back catalog", date(2001, 1, 1), older),
+        call("Later", today + timedelta(days=60)),
+        call("Edited", date(2010, 5, 7), edited),
+        call("Just released", today - timedelta(days=2)),
+        call("Soon", today + timedelta(days=3)),
+        call("Today", today),
+        call("Stale", date(2009, 1, 1), stale, method="delete"),
+        call("Draft", date(1999, 1, 1), draft),
+        call("Unknown", None),
+    ]
+    assert change_dates([old, edited, stale, draft], today) == {
+        edited: today - timedelta(days=3),
+        stale: today - timedelta(days=30),
+        draft: today,
+    }
+    ordered, deferred = schedule(calls, today, QuotaBudget(100))
+    assert [c.title for c in ordered] == [
+        "Today",
+        "Soon",
+        "Later",
+        "Draft",
+        "Just released",
+        "Edited",
+        "Stale",
+        "Back catalog",
+        "Older back catalog",
+        "Unknown",
+    ]
+    assert not deferred
+    # Without a limit everything is written this run, so git isn't asked what changed
+    assert [c.title for c in schedule(calls, today, QuotaBudget())[0]][3:] == [
+        "Just released",
+        "Edited",
+        "Stale",
+        "Back catalog",
+        "Older back catalog",
+        "Draft",
+        "Unknown",
+    ]
+
+    # A .patch file changing counts as the media changing
+    edited.with_suffix(".patch").write_text("", encoding="UTF-8")
+    assert urgency(calls[0], today, change_dates([old], today)) == (2, -date(2008, 5, 2).toordinal(), 0)
+    assert urgency(calls[3], today, change_dates([edited], today)) == (
+        1,
+        -today.toordinal(),
+        -date(2010, 5, 7).toordinal(),
+    )
+
+
+def test_urgency_ties(repo: Path) -> None:
+    # Media changed on the same day goes newest release first, not in the order it was planned
+    today = date.today()
+    write_movie(repo / "base.yaml", "Base", date(2000, 1, 1))
+    commit("first", today)
+    paths = [write_movie(repo / f"movie_{year}.yaml", f"Movie {year}", date(year, 1, 1)) for year in (2008, 2015, 2011)]
+    commit("add", today - timedelta(days=1))
+    calls = [call(path.stem, date(int(path.stem[-4:]), 1, 1), path) for path in paths]
+    assert [c.title for c in schedule(calls, today, QuotaBudget(100))[0]] == ["movie_2015", "movie_2011", "movie_2008"]
+
+
+def test_schedule_budget() -> None:
+    calls = [call(f"Movie {i}", TODAY - timedelta(days=400 + i)) for i in range(5)]
+    budget = QuotaBudget(10, used=7)
+    now, deferred = schedule(calls, TODAY, budget)
+    assert [c.title for c in now] == ["Movie 0", "Movie 1", "Movie 2"]
+    assert [c.title for c in deferred] == ["Movie 3", "Movie 4"]
+    assert budget.used == 10 and budget.spent
+
+    unlimited = QuotaBudget()
+    assert schedule(calls, TODAY, unlimited)[1] == []
+    assert unlimited.used == 5 and not unlimited.spent
+
+
+def test_estimate_cost() -> None:
+    calls = [call("A", TODAY), call("B", TODAY, method="patch"), call("C", TODAY, method="delete")]
+    assert estimate_cost(calls) == 4
+    assert estimate_cost(calls, listed_events=600) == 6
+    assert estimate_cost([]) == 1
+
+
+def test_router_carries_deferred_writes_over(tmp_path: Path) -> None:
+    today = date.today()
+    movies = tmp_path / "movies"
+    movies.mkdir()
+    for i in range(4):
+        write_movie(movies / f"movie_{i}.yaml", f"Movie {i}", today - timedelta(days=1000 + i))
+    write_movie(movies / "upcoming.yaml", "Upcoming", today + timedelta(days=5))
+    state = SyncState(tmp_path / "state.yaml")
+    calendar = YamlCalendar("Test", "uuid", [movies], [], FakeEventsService())
+
+    # One call lists the calendar, so a budget of 3 leaves room for two writes
+    Router({"test": calendar}).sync(state=state, budget=QuotaBudget(3, state.quota_used(today)))
+    assert calendar.google_service.calls == ["insert Upcoming", "insert Movie 0"]
+    state = SyncState(tmp_path / "state.yaml")
+    assert state.calendar("uuid") == {"deferred": 3}
+    assert state.quota_used(today) == 3
+    assert state.quota_used(today + timedelta(days=1)) == 0
+
+    # The day's budget is spent, so nothing more is written until it's raised
+    calendar.google_service = FakeEventsService()
+    Router({"test": calendar}).sync(state=state, budget=QuotaBudget(3, state.quota_used(today)))
+    assert not calendar.google_service.calls
+
+    Router({"test": calendar}).sync(state=state, budget=QuotaBudget(10, state.quota_used(today)))
+    assert calendar.google_service.calls == [
+        f"insert {title}" for title in ("Upcoming", "Movie 0", "Movie 1", "Movie 2", "Movie 3")
+    ]
+    state = SyncState(tmp_path / "state.yaml")
+    assert "deferred" not in state.calendar("uuid")
+    assert state.calendar("uuid")["last_full_sync"] == today
+    assert state.quota_used(today) == 9
@@ -0,0 +1,98 @@
+"""
+Pytests for search.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+import shutil
+from pathlib import Path
+
+from mcu_calendar.catalog import Catalog
+from mcu_calendar.events import Movie, Show
+from mcu_calendar.search import SearchIndex
+
+RELEASE = datetime.date(2024, 5, 3)
+
+
+def make_index() -> SearchIndex:
+    return SearchIndex(
+        [
+            Movie("Iron Man", "https://www.imdb.com/title/tt0371746\n", RELEASE, Path("iron_man.yaml")),
+            Movie("Iron Man 2", "https://www.imdb.com/title/tt1228705\n", RELEASE, Path("iron_man_2.yaml")),
+            Movie(
+                "The Avengers",
+                "https://www.imdb.com/title/tt0848228\nhttps://www.marvel.com/movies/the-avengers\n",
+                RELEASE,
+                Path("the_avengers.yaml"),
+            ),
+            Show("Loki", [RELEASE], "https://www.imdb.com/title/tt9140554\nFeaturing Iron Man\n", Path("loki.yaml")),
+            Show("Loki (Season 2)", [RELEASE], "https://www.imdb.com/title/tt9140554\n", Path("loki_2.yaml")),
+        ]
+    )
+
+
+def titles(items: list) -> list:
+    return [i.title for i in items]
+
+
+def test_search_words() -> None:
+    index = make_index()
+    # Title matches outrank description matches
+    assert titles(index.search("iron man")) == ["Iron Man", "Iron Man 2", "Loki"]
+    assert titles(index.search("man 2")) == ["Iron Man 2"]
+    assert not index.search("iron hulk")
+    assert titles(index.search("IRON man", limit=1)) == ["Iron Man"]
+
+
+def test_search_prefix_and_fuzzy() -> None:
+    index = make_index()
+    assert titles(index.search("aven")) == ["The Avengers"]
+    assert titles(index.search("loki seas")) == ["Loki (Season 2)"]
+    assert titles(index.search("avangers")) == ["The Avengers"]
+    assert titles(index.search("lokki 2")) == ["Loki (Season 2)"]
+
+
+def test_exact_lookups() -> None:
+    index = make_index()
+    assert titles(index.by_imdb_id("tt0371746")) == ["Iron Man"]
+    assert titles(index.by_imdb_id("tt9140554")) == ["Loki", "Loki (Season 2)"]
+    assert not index.by_imdb_id("tt0000000")
+    assert titles(index.by_url("http://www.marvel.com/movies/the-avengers/")) == ["The Avengers"]
+    assert titles(index.by_safe_title("iron_man_2")) == ["Iron Man 2"]
+
+
+def test_add_and_remove() -> None:
+    index = make_index()
+    index.add(Movie("Iron Man Three", "https://www.imdb.com/title/tt1300854\n", RELEASE, Path("iron_man_2.yaml")))
+    assert len(index) == 5
+    assert titles(index.search("iron man t")) == ["Iron Man Three"]
+    assert not index.by_imdb_id("tt1228705")
+
+    index.remove(Path("iron_man_2.yaml"))
+    index.remove(Path("missing.yaml"))
+    assert len(index) == 4
+    assert not index.search("three")
+    assert not index.by_safe_title("iron_man_three")
+
+
+def test_catalog_keeps_index(tmp_path: Path) -> None:
+    data = tmp_path / "data"
+    (data / "movies").mkdir(parents=True)
+    shutil.copy(Path("data") / "movie-schema.yaml", data)
+    (data / "movies" / "a.yaml").write_text(
+        "title: Alpha\nrelease_date: 2024-05-03\ndescription: x\n", encoding="UTF-8"
+    )
+    (data / "movies" / "b.yaml").write_text("title: Beta\nrelease_date: 2024-07-26\ndescription: x\n", encoding="UTF-8")
+    catalog = Catalog([data / "movies"], [])
+    catalog.load()
+    assert titles(catalog.search.search("alp")) == ["Alpha"]
+
+    (data / "movies" / "a.yaml").write_text(
+        "title: Gamma\nrelease_date: 2024-05-03\ndescription: x\n", encoding="UTF-8"
+    )
+    (data / "movies" / "b.yaml").unlink()
+    catalog.refresh()
+    assert not catalog.search.search("alpha")
+    assert not catalog.search.search("beta")
+    assert titles(catalog.search.search("gamma")) == ["Gamma"]
@@ -0,0 +1,134 @@
+"""
+Pytests for shards.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import time
+from collections import Counter
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterator
+
+import pytest
+
+from mcu_calendar import shards
+from mcu_calendar.catalog import Catalog
+from mcu_calendar.fakecalendar import FakeCalendarApi, FakeCalendarServer, fake_service
+from mcu_calendar.shards import (
+    ShardError,
+    WorkQueue,
+    WorkUnit,
+    plan_units,
+    run_worker,
+    shard_sync,
+)
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+TITLES = ["A", "B", "C", "D", "E", "F"]
+
+
+@pytest.fixture(name="server")
+def fixture_server() -> Iterator[FakeCalendarServer]:
+    with FakeCalendarServer(FakeCalendarApi()) as server:
+        yield server
+
+
+@pytest.fixture(name="data_dir")
+def fixture_data_dir(tmp_path: Path) -> Path:
+    (tmp_path / "movies").mkdir()
+    for day, title in enumerate(TITLES, 1):
+        (tmp_path / "movies" / f"{title.lower()}.yaml").write_text(
+            f"title: {title}\nrelease_date: 2024-05-{day:02}\ndescription: {title} desc\n", encoding="UTF-8"
+        )
+    return tmp_path
+
+
+def make_calendars(url: str, data_dir: Path) -> Dict[str, YamlCalendar]:
+    service = fake_service(url)
+    return {key: YamlCalendar(key, f"{key}@calendar", [data_dir / "movies"], [], service) for key in ("x", "y")}
+
+
+def test_plan_units(data_dir: Path) -> None:
+    calendars = make_calendars("http://unused", data_dir)
+    catalog = Catalog.for_calendars(calendars.values())
+    catalog.load()
+    assert plan_units(calendars, catalog, 3) == [
+        WorkUnit("x", None, "2024-05-03"),
+        WorkUnit("x", "2024-05-03", "2024-05-05"),
+        WorkUnit("x", "2024-05-05", None),
+        WorkUnit("y", None, "2024-05-03"),
+        WorkUnit("y", "2024-05-03", "2024-05-05"),
+        WorkUnit("y", "2024-05-05", None),
+    ]
+    assert plan_units({"x": calendars["x"]}, catalog, 1) == [WorkUnit("x")]
+    assert WorkUnit("x", "2024-05-03", "2024-05-05").contains({"start": {"date": "2024-05-04"}})
+    assert not WorkUnit("x", "2024-05-03", "2024-05-05").contains({"start": {"date": "2024-05-05"}})
+
+
+def test_claims_and_leases(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(shards, "MAX_ATTEMPTS", 2)
+    with WorkQueue(tmp_path / "queue.sqlite", lease=0.1) as queue:
+        queue.plan([WorkUnit("x", None, "2024-01-01"), WorkUnit("x", "2024-01-01", None)])
+        first = queue.claim("one")
+        second = queue.claim("two")
+        assert first is not None and second is not None
+        assert (first.unit, second.unit, first.attempt) == (
+            WorkUnit("x", None, "2024-01-01"),
+            WorkUnit("x", "2024-01-01"),
+            1,
+        )
+        assert queue.claim("three") is None
+        assert queue.complete(first.unit_id, "one", Counter(insert=2))
+
+        # "two" never finishes, so its unit is claimed again once the lease runs out
+        time.sleep(0.15)
+        retry = queue.claim("three")
+        assert retry is not None and (retry.unit_id, retry.attempt) == (second.unit_id, 2)
+        assert not queue.complete(second.unit_id, "two", Counter())
+        assert queue.unfinished() == 1
+
+        # After MAX_ATTEMPTS claims the unit is failed instead of claimed again
+        time.sleep(0.15)
+        assert queue.claim("four") is None
+        counts, failures = queue.results()
+        assert counts == {"x": {"insert": 2}}
+        assert failures == [(WorkUnit("x", "2024-01-01"), "The lease ran out on every attempt")]
+
+
+def test_shard_sync(server: FakeCalendarServer, data_dir: Path, tmp_path: Path) -> None:
+    server.api.seed_events(
+        "y@calendar",
+        [
+            {"summary": "Old", "start": {"date": "2020-01-01"}, "end": {"date": "2020-01-02"}},
+            {"summary": "C", "start": {"date": "2024-05-03"}, "end": {"date": "2024-05-04"}},
+        ],
+    )
+    calendars_for = partial(make_calendars, server.url, data_dir)
+    counts = shard_sync(calendars_for, workers=2, shards=3, queue_path=tmp_path / "queue.sqlite")
+
+    assert counts == {"x": {"insert": 6, "skip": 0}, "y": {"insert": 5, "update": 1, "delete": 1, "skip": 0}}
+    for key in ("x", "y"):
+        assert sorted(e["summary"] for e in server.api.events(f"{key}@calendar")) == TITLES
+    with WorkQueue(tmp_path / "queue.sqlite") as queue:
+        assert queue.unfinished() == 0
+
+
+def test_crashed_worker_is_retried(server: FakeCalendarServer, data_dir: Path, tmp_path: Path) -> None:
+    queue_path = tmp_path / "queue.sqlite"
+    calendars_for = partial(make_calendars, server.url, data_dir)
+    with WorkQueue(queue_path, lease=0.2) as queue:
+        queue.plan([WorkUnit("x", None, "2024-05-04"), WorkUnit("x", "2024-05-04", None)])
+        assert queue.claim("crashed") is not None
+
+    assert run_worker(queue_path, calendars_for, lease=0.2, worker="survivor", poll=0.05) == 2
+    assert sorted(e["summary"] for e in server.api.events("x@calendar")) == TITLES
+
+
+def test_failed_units_are_reported(data_dir: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(shards, "MAX_ATTEMPTS", 1)
+    with FakeCalendarServer(FakeCalendarApi(failure_rate=1.0)) as server:
+        calendars_for = partial(make_calendars, server.url, data_dir)
+        with pytest.raises(ShardError) as error:
+            shard_sync(calendars_for, workers=1, queue_path=tmp_path / "queue.sqlite")
+    assert [unit for unit, _ in error.value.failures] == [WorkUnit("x"), WorkUnit("y")]
@@ -0,0 +1,87 @@
+"""
+Pytests for streamsync.py
+"""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+
+from pathlib import Path
+from typing import Dict
+
+import pytest
+from fakes import FakeEventsService, write_movie
+
+from mcu_calendar.streamsync import RemoteIndex, stream_sync
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+
+def event(event_id: str, summary: str, description: str, start: str, end: str) -> Dict:
+    return {
+        "id": event_id,
+        "summary": summary,
+        "description": description,
+        "start": {"date": start},
+        "end": {"date": end},
+        "etag": "dropped before indexing",
+    }
+
+
+@pytest.fixture(name="movies")
+def fixture_movies(tmp_path: Path) -> Path:
+    for name, title, release_date in [("a", "A", "2019-04-20"), ("b", "B", "2019-05-20"), ("c", "C", "2019-06-20")]:
+        write_movie(tmp_path / f"{name}.yaml", title, release_date)
+    return tmp_path
+
+
+EVENTS = [
+    event("a1", "A", "about A", "2019-04-20", "2019-04-21"),
+    event("b1", "B", "old", "2019-05-20", "2019-05-21"),
+    event("a2", "A", "about A", "2019-04-20", "2019-04-21"),
+    event("z1", "Z", "gone", "2018-01-01", "2018-01-02"),
+]
+
+
+@pytest.mark.parametrize("max_pending", [1, 64])
+def test_stream_sync_matches_full_sync(movies: Path, max_pending: int) -> None:
+    full = FakeEventsService(list(EVENTS), page_size=2)
+    YamlCalendar("Test", "uuid", [movies], [], full).create_google_events()
+
+    streamed = FakeEventsService(list(EVENTS), page_size=2)
+    counts = stream_sync(YamlCalendar("Test", "uuid", [movies], [], streamed), max_pending=max_pending)
+    assert sorted(streamed.calls) == sorted(full.calls)
+    assert streamed.calls == ["patch b1 description,source,transparency", "insert C", "delete a2", "delete z1"]
+    assert (counts["insert"], counts["update"], counts["delete"], counts["skip"]) == (1, 1, 2, 1)
+
+
+def test_stream_sync_force(movies: Path) -> None:
+    service = FakeEventsService(list(EVENTS), page_size=2)
+    stream_sync(YamlCalendar("Test", "uuid", [movies], [], service), force=True)
+    assert service.calls[:3] == ["patch a1 source,transparency", "patch b1 description,source,transparency", "insert C"]
+
+    # Forcing leaves events alone when every field already matches, unless they're being rewritten
+    calendar = YamlCalendar("Test", "uuid", [movies], [], service)
+    service = FakeEventsService([{"id": f"{i.title}1", **i.to_google_event()} for i in calendar.iter_items()])
+    calendar.google_service = service
+    stream_sync(calendar, force=True)
+    assert not service.calls
+    calendar.rewrite = True
+    stream_sync(calendar)
+    assert service.calls == ["update A", "update B", "update C"]
+
+
+def test_stream_sync_writer_error(movies: Path) -> None:
+    service = FakeEventsService()
+    service.fail_on = "B"
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        stream_sync(YamlCalendar("Test", "uuid", [movies], [], service), max_pending=1)
+    # Nothing is written after the first failure
+    assert service.calls == ["insert A", "insert B"]
+
+
+def test_remote_index() -> None:
+    with RemoteIndex() as remote:
+        remote.add(iter(EVENTS))
+        first = remote.pop("A")
+        assert first is not None and first["id"] == "a1" and "etag" not in first
+        assert remote.pop("Q") is None
+        assert [e["id"] for e in remote.remaining()] == ["b1", "a2", "z1"]
@@ -0,0 +1,178 @@
+"""
+Pytests for tmdbrefresh.py
+"""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+
+import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import pytest
+
+from get_new_media import (
+    get_new_media,
+    get_regional_release_dates,
+    get_release_date,
+    index_release_dates,
+)
+from mcu_calendar.tmdbrefresh import TmdbState, changed_ids, plan_refresh
+from mcu_calendar.webscraping import TmdbApi, get_movies, get_show_details
+
+
+class FakeTmdbApi(TmdbApi):
+    """
+    A local stand in for themoviedb.org, that records every call made to it
+    """
+
+    # The real client opens a shared http session, which the fake has no use for
+    # pylint: disable=super-init-not-called
+    def __init__(self, movies: Dict[int, str], changed: Set[int], changes_pages: int = 1) -> None:
+        self.movies = movies
+        self.changed = changed
+        self.changes_pages = changes_pages
+        self.calls: List[str] = []
+
+    def discover_movies(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.calls.append("discover")
+        return (
+            [{"id": i, "release_date": "2030-01-01"} for i in self.movies]
+            if payload.get("with_companies") == 420
+            else []
+        )
+
+    def discover_shows(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return []
+
+    def movie(self, movie_id: int) -> Dict[str, Any]:
+        self.calls.append(f"movie {movie_id}")
+        return {
+            "id": movie_id,
+            "title": self.movies[movie_id],
+            "imdb_id": f"tt{movie_id}",
+            "release_date": "2030-01-01",
+            "release_dates": {"results": []},
+        }
+
+    def show(self, show_id: int) -> Dict[str, Any]:
+        self.calls.append(f"show {show_id}")
+        seasons = [{"season_number": n, "air_date": f"{2000 + n}-01-01"} for n in range(1, 45)]
+        return {"id": show_id, "name": "Show", "seasons": seasons}
+
+    def season(self, show_id: int, season_number: int) -> Dict[str, Any]:
+        self.calls.append(f"season {show_id} {season_number}")
+        return {"season_number": season_number}
+
+    def seasons(self, show_id: int, season_numbers: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        self.calls.append(f"seasons {show_id} {season_numbers[0]}-{season_numbers[-1]}")
+        # TMDB leaves out seasons it doesn't have rather than failing the whole request
+        return {n: {"season_number": n} for n in season_numbers if n != 30}
+
+    def changes(self, kind: str, start_date: datetime.date, end_date: datetime.date, page: int) -> Dict[str, Any]:
+        self.calls.append(f"changes {kind} {page}")
+        results = [{"id": i} for i in self.changed] if page == 1 else [{"id": 1000 + page}]
+        return {"results": results, "page": page, "total_pages": self.changes_pages}
+
+    def title_changes(
+        self, kind: str, title_id: int, start_date: datetime.date, end_date: datetime.date
+    ) -> List[Dict[str, Any]]:
+        self.calls.append(f"title_changes {kind} {title_id}")
+        return [{"key": "title"}] if title_id in self.changed else []
+
+
+def test_get_movies_with_fake() -> None:
+    api = FakeTmdbApi({1: "A", 2: "B"}, set())
+    assert [m["title"] for m in get_movies({"with_companies": 420}, api)] == ["A", "B"]
+    assert api.calls == ["discover", "movie 1", "movie 2"]
+
+
+def test_get_show_details_appends_seasons() -> None:
+    api = FakeTmdbApi({}, set())
+    shows = get_show_details([{"id": 7}], {"air_date.gte": "2003-06-01"}, api)
+    assert [s["season_number"] for s in shows[0]["seasons"]] == list(range(4, 45))
+    assert api.calls == ["show 7", "seasons 7 4-23", "seasons 7 24-43", "season 7 30", "season 7 44"]
+
+
+def test_changed_ids() -> None:
+    today = datetime.date(2024, 5, 10)
+    api = FakeTmdbApi({}, {1, 3}, changes_pages=2)
+    assert changed_ids(api, "movie", [1, 2], None, today) is None
+    assert changed_ids(api, "movie", [1, 2], today - datetime.timedelta(days=15), today) is None
+    assert changed_ids(api, "movie", [], today, today) == set()
+    assert not api.calls
+
+    assert changed_ids(api, "movie", [1, 2], today - datetime.timedelta(days=1), today) == {1}
+    assert api.calls == ["changes movie 1", "changes movie 2"]
+
+    # When the changes list is longer than the tracked list, each tracked title is checked instead
+    api = FakeTmdbApi({}, {1, 3}, changes_pages=50)
+    assert changed_ids(api, "tv", [1, 2], today - datetime.timedelta(days=1), today) == {1}
+    assert api.calls == ["changes tv 1", "title_changes tv 1", "title_changes tv 2"]
+
+
+def test_plan_refresh() -> None:
+    discovered = [{"id": 1}, {"id": 2}, {"id": 3}]
+    tracked: Dict[int, Optional[str]] = {1: "tt1", 2: "tt2", 4: "tt4"}
+    assert plan_refresh(discovered, tracked, None) == (discovered, {})
+    assert plan_refresh(discovered, tracked, {2}) == ([{"id": 2}, {"id": 3}], {1: "tt1"})
+
+
+def test_tmdb_state(tmp_path: Path) -> None:
+    state = TmdbState(tmp_path / "state.yaml")
+    assert state.last_run is None and not state.tracked("mcu-movies")
+    state.track("mcu-movies", {1: "tt1", 2: None})
+    state.save(datetime.date(2024, 5, 10))
+    state = TmdbState(tmp_path / "state.yaml")
+    assert state.last_run == datetime.date(2024, 5, 10)
+    assert state.tracked("mcu-movies") == {1: "tt1", 2: None}
+
+
+def test_get_new_media_refresh(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("GOOGLE_SEARCH_API_KEY", raising=False)
+    for folder in ["mcu-movies", "mcu-adjacent-movies", "dceu-movies", "mcu-shows", "starwars-shows"]:
+        (Path("data") / folder).mkdir(parents=True)
+    release_date_gte = datetime.date(2029, 1, 1)
+
+    api = FakeTmdbApi({1: "Movie A", 2: "Movie B"}, set())
+    get_new_media(release_date_gte, refresh=True, api=api)
+    assert [c for c in api.calls if c.startswith("movie")] == ["movie 1", "movie 2"]
+    assert sorted(p.name for p in (Path("data") / "mcu-movies").iterdir()) == ["movie_a.yaml", "movie_b.yaml"]
+
+    # Only the changed and newly discovered movies are refetched, and the unchanged ones are kept
+    api = FakeTmdbApi({1: "Movie A", 2: "Movie B 2", 3: "Movie C"}, {2})
+    get_new_media(release_date_gte, refresh=True, api=api)
+    assert [c for c in api.calls if c.startswith("movie")] == ["movie 2", "movie 3"]
+    assert sorted(p.name for p in (Path("data") / "mcu-movies").iterdir()) == [
+        "movie_a.yaml",
+        "movie_b_2.yaml",
+        "movie_c.yaml",
+    ]
+    assert TmdbState().tracked("mcu-movies") == {1: "tt1", 2: "tt2", 3: "tt3"}
+
+
+def test_index_release_dates() -> None:
+    movie = {
+        "release_date": "2023-02-15",
+        "release_dates": {
+            "results": [
+                {
+                    "iso_3166_1": "US",
+                    "release_dates": [
+                        {"type": 3, "release_date": "2023-02-17T00:00:00.000Z"},
+                        {"type": 3, "release_date": "2023-03-01T00:00:00.000Z"},
+                        {"type": 4, "release_date": "2023-04-14T00:00:00.000Z"},
+                    ],
+                },
+                {"iso_3166_1": "GB", "release_dates": [{"type": 3, "release_date": "2023-02-16T00:00:00.000Z"}]},
+                {"iso_3166_1": "CA", "release_dates": [{"type": 3, "release_date": "2023-02-17T00:00:00.000Z"}]},
+            ]
+        },
+    }
+    index = index_release_dates(movie)
+    assert index["US"] == {3: datetime.date(2023, 2, 17), 4: datetime.date(2023, 4, 14)}
+    assert get_release_date(movie, "US", index) == datetime.date(2023, 2, 17)
+    assert get_release_date(movie, "DE", index) == datetime.date(2023, 2, 15)
+    # Only the regions whose date differs are kept
+    assert get_regional_release_dates(index, datetime.date(2023, 2, 17)) == {"GB": datetime.date(2023, 2, 16)}
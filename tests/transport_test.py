@@ -0,0 +1,61 @@
+"""
+Pytests for transport.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+from http.server import BaseHTTPRequestHandler
+from typing import Iterator, List
+
+import pytest
+import tmdbsimple
+from fakes import local_server
+
+from mcu_calendar import transport
+from mcu_calendar.transport import PooledSession
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Answers every request with a tiny json body, and records the headers it was sent
+    """
+
+    protocol_version = "HTTP/1.1"
+    seen: List[str] = []
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        Handler.seen.append(self.headers.get("Connection", ""))
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_: object) -> None:
+        pass
+
+
+@pytest.fixture(name="url")
+def fixture_url() -> Iterator[str]:
+    with local_server(Handler) as url:
+        yield url
+
+
+def test_connections_are_reused(url: str) -> None:
+    Handler.seen.clear()
+    session = PooledSession(timeout=5)
+    for _ in range(5):
+        # The same header tmdbsimple sends with every request
+        assert session.get(f"{url}/x", headers={"Connection": "close"}).json() == {"ok": True}
+    stats = session.stats()
+    assert (stats.requests, stats.connections, stats.reused) == (5, 1, 4)
+    assert "close" not in Handler.seen
+    session.close()
+
+
+def test_configure_installs_tmdb_session() -> None:
+    session = transport.configure(pool_maxsize=2)
+    assert tmdbsimple.REQUESTS_SESSION is session
+    assert transport.session() is session
+    assert transport.stats().requests == 0
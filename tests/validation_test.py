@@ -0,0 +1,107 @@
+"""
+Pytests for validation.py
+"""
+
+# pylint: disable=missing-function-docstring
+
+import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from mcu_calendar import validation
+from mcu_calendar.catalog import Catalog
+from mcu_calendar.validation import (
+    CatalogValidationError,
+    compile_schema,
+    load_schema,
+    validate_folders,
+)
+
+MOVIE_DIRS = [Path("data") / "mcu-movies", Path("data") / "mcu-adjacent-movies", Path("data") / "dceu-movies"]
+SHOW_DIRS = [Path("data") / "mcu-shows", Path("data") / "starwars-shows"]
+
+
+def test_repo_data_is_valid() -> None:
+    assert not validate_folders(MOVIE_DIRS, SHOW_DIRS, use_cache=False)
+
+
+def test_compile_schema() -> None:
+    check = load_schema(Path("data") / "show-schema.yaml")
+    assert check is not None
+    valid = {"title": "A", "release_dates": [datetime.date(2024, 1, 1), "2024-01-08"], "description": ""}
+    assert not list(check(valid, "$"))
+    invalid = {"title": 5, "release_dates": ["soon"], "extra": True}
+    assert list(check(invalid, "$")) == [
+        "$ is missing description",
+        "$.title should be a string, not int",
+        "$.release_dates[0] should be a date, not 'soon'",
+        "$ has unexpected property extra",
+    ]
+    assert list(check({"title": "A", "release_dates": [], "description": ""}, "$")) == [
+        "$.release_dates should have at least 1 item(s)"
+    ]
+
+
+def test_compile_schema_regional_dates() -> None:
+    check = load_schema(Path("data") / "movie-schema.yaml")
+    assert check is not None
+    movie = {"title": "A", "release_date": "2023-02-17", "description": "", "regional_release_dates": {"GB": "soon"}}
+    assert list(check(movie, "$")) == ["$.regional_release_dates.GB should be a date, not 'soon'"]
+
+
+def test_compile_schema_unsupported() -> None:
+    with pytest.raises(ValueError):
+        compile_schema({"type": "string", "pattern": "^a"})
+
+
+def write(path: Path, text: str) -> None:
+    path.write_text(text, encoding="UTF-8")
+
+
+def test_validate_folders(data: Path) -> None:
+    write(
+        data / "movies" / "a.yaml", "title: A\nrelease_date: 2019-04-20\ndescription: https://www.imdb.com/title/tt1\n"
+    )
+    write(data / "movies" / "a_2.yaml", "title: A!\nrelease_date: 2019-04-20\ndescription: x\nimdb_id: tt1\n")
+    write(data / "movies" / "b.yaml", "title: B\nrelease_date: someday\n")
+    write(data / "movies" / "c.yaml", "title: [C\n")
+    write(data / "shows" / "s.yaml", "title: S\nrelease_dates: [2024-01-08, 2024-01-01]\ndescription: x\n")
+
+    issues = validate_folders([data / "movies"], [data / "shows"])
+    assert sorted((i.path.name, i.message.split(":")[0]) for i in issues) == [
+        ("a_2.yaml", "imdb_id 'tt1' is already used by a.yaml"),
+        ("a_2.yaml", "title 'a' is already used by a.yaml"),
+        ("b.yaml", "$ is missing description"),
+        ("b.yaml", "$.release_date should be a date, not 'someday'"),
+        ("c.yaml", "couldn't be loaded"),
+        ("s.yaml", "release_dates aren't sorted"),
+    ]
+
+    with pytest.raises(CatalogValidationError) as error:
+        Catalog([data / "movies"], [data / "shows"]).load()
+    assert len(error.value.issues) == len(issues)
+
+
+def test_validate_folders_cache(data: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    write(data / "movies" / "a.yaml", "title: A\nrelease_date: 2019-04-20\ndescription: x\n")
+    write(data / "movies" / "b.yaml", "title: B\nrelease_date: 2019-04-20\ndescription: x\n")
+    assert not validate_folders([data / "movies"], [])
+
+    validated = []
+    validate_file = validation.validate_file
+
+    def counting_validate_file(path: Path, *args: Any) -> Any:
+        validated.append(path.name)
+        return validate_file(path, *args)
+
+    monkeypatch.setattr(validation, "validate_file", counting_validate_file)
+    assert not validate_folders([data / "movies"], [])
+    assert not validated
+
+    # Only the changed file is validated again, and a .patch file counts as part of its yaml file
+    write(data / "movies" / "b.patch", "title: A\n")
+    issues = validate_folders([data / "movies"], [])
+    assert validated == ["b.yaml"]
+    assert [i.message for i in issues] == ["title 'a' is already used by a.yaml"]
@@ -0,0 +1,92 @@
+"""
+Pytests for watcher.py
+"""
+
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-class-docstring
+
+import threading
+from pathlib import Path
+
+from fakes import FakeEventsService, write_movie
+from googleapiclient.errors import HttpError
+
+from mcu_calendar.catalog import Catalog, CatalogChanges
+from mcu_calendar.watcher import DataWatcher, sync_batch, sync_changes
+from mcu_calendar.yamlcalendar import YamlCalendar
+
+
+def test_sync_changes(tmp_path: Path) -> None:
+    movies = tmp_path / "movies"
+    other_movies = tmp_path / "other-movies"
+    movies.mkdir()
+    other_movies.mkdir()
+    write_movie(movies / "a.yaml", "A")
+    write_movie(movies / "b.yaml", "B")
+    write_movie(other_movies / "c.yaml", "C")
+
+    service = FakeEventsService([{"id": "b-id", "summary": "B", "start": {"date": "2019-04-20"}}])
+    calendars = [
+        YamlCalendar("Movies", "movies", [movies], [], service),
+        YamlCalendar("Other", "other", [other_movies], [], service),
+    ]
+    catalog = Catalog.for_calendars(calendars)
+    catalog.load()
+
+    write_movie(movies / "a.yaml", "A", "2020-01-01")
+    write_movie(movies / "b.yaml", "B 2")
+    changes = catalog.refresh()
+    assert changes.updated == [movies / "a.yaml", movies / "b.yaml"]
+    assert [i.title for i in changes.removed] == ["B"]
+
+    synced = sync_changes(calendars, catalog, changes)
+    assert [c.name for c in synced] == ["Movies"]
+    assert service.calls == ["insert B 2", "insert A", "delete b-id"]
+
+
+def test_watcher_polling_debounce(tmp_path: Path) -> None:
+    write_movie(tmp_path / "a.yaml", "A")
+    catalog = Catalog([tmp_path], [])
+    catalog.load()
+    watcher = DataWatcher(catalog, interval=0.01, debounce=0.05, max_delay=5)
+    watcher.mode = "polling"
+    watcher._inotify = None  # pylint: disable=protected-access
+
+    def make_changes() -> None:
+        write_movie(tmp_path / "a.yaml", "A 2")
+        write_movie(tmp_path / "b.yaml", "B")
+
+    timer = threading.Timer(0.05, make_changes)
+    timer.start()
+    watcher.wait()
+    timer.join()
+
+    changes = catalog.refresh()
+    assert changes.updated == [tmp_path / "a.yaml", tmp_path / "b.yaml"]
+    assert not catalog.refresh()
+
+
+def test_sync_batch_keeps_going(tmp_path: Path) -> None:
+    write_movie(tmp_path / "a.yaml", "A")
+    service = FakeEventsService([])
+    calendars = [YamlCalendar("Movies", "movies", [tmp_path], [], service)]
+    catalog = Catalog.for_calendars(calendars)
+    catalog.load()
+
+    # A half saved file fails validation, and leaves the catalog as it was until it's fixed
+    (tmp_path / "b.yaml").write_text("title: [B\n", encoding="UTF-8")
+    pending = sync_batch(calendars, catalog, CatalogChanges([], []))
+    assert not pending and not service.calls
+    assert list(catalog.items) == [tmp_path / "a.yaml"]
+
+    # A sync that fails is retried along with the next batch
+    write_movie(tmp_path / "b.yaml", "B")
+    service.fail_on = "B"
+    service.error = HttpError(type("Response", (), {"status": 500, "reason": "Server Error"})(), b"{}")
+    pending = sync_batch(calendars, catalog, pending)
+    assert pending.updated == [tmp_path / "b.yaml"]
+    service.fail_on = None
+    write_movie(tmp_path / "c.yaml", "C")
+    pending = sync_batch(calendars, catalog, pending)
+    assert not pending
+    assert service.calls == ["insert B", "insert B", "insert C"]
@@ -6,30 +6,15 @@ Pytests for yamlcalendar.py
 # pylint: disable=missing-class-docstring
 # pylint: disable=protected-access
 
+import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict
 
-from mcu_calendar.events import GoogleMediaEvent
-from mcu_calendar.yamlcalendar import YamlCalendar
+import pytest
+from fakes import FakeEventsService
 
-
-class MockExecutor:  # pylint: disable=too-few-public-methods
-    def execute(self, *_: Any, **__: Any) -> None:
-        pass
-
-
-class MockService:
-    def __init__(self) -> None:
-        self.insert_kwargs: List[Dict] = []
-        self.update_kwargs: List[Dict] = []
-
-    def insert(self, **kwargs: Any) -> MockExecutor:
-        self.insert_kwargs.append(kwargs)
-        return MockExecutor()
-
-    def update(self, **kwargs: Any) -> MockExecutor:
-        self.update_kwargs.append(kwargs)
-        return MockExecutor()
+from mcu_calendar.events import GoogleMediaEvent, Movie
+from mcu_calendar.yamlcalendar import DataLoadError, YamlCalendar
 
 
 class MockEvent(GoogleMediaEvent):
@@ -55,8 +40,42 @@ def test_get_shows() -> None:
     assert len(shows) == len(list(path.iterdir()))
 
 
+def test_get_movies_sorted() -> None:
+    path = Path("data") / "mcu-movies"
+    movies = YamlCalendar.get_movies(path)
+    assert [m.file_path for m in movies] == sorted(path.iterdir())
+
+
+def test_get_objects_parallel() -> None:
+    path = Path("data") / "mcu-movies"
+    serial = YamlCalendar._get_objects_from_data(path, Movie.from_yaml)
+    parallel = YamlCalendar._get_objects_from_data(path, Movie.from_yaml, parallel_threshold=0, max_workers=2)
+    assert parallel == serial
+    assert [m.file_path for m in parallel] == [m.file_path for m in serial]
+
+
+def test_get_objects_errors(tmp_path: Path) -> None:
+    (tmp_path / "a_good.yaml").write_text("title: A\nrelease_date: 2019-04-20\ndescription: A\n", encoding="UTF-8")
+    (tmp_path / "b_bad.yaml").write_text("title: B\ndescription: B\n", encoding="UTF-8")
+    (tmp_path / "c_bad.yaml").write_text("title: [C\n", encoding="UTF-8")
+    with pytest.raises(DataLoadError) as exc_info:
+        YamlCalendar.get_movies(tmp_path)
+    assert [path.name for path, _ in exc_info.value.errors] == ["b_bad.yaml", "c_bad.yaml"]
+
+
+def test_get_data(tmp_path: Path) -> None:
+    (tmp_path / "a.yaml").write_text("title: A\nrelease_date: 2019-04-20\ndescription: A\n", encoding="UTF-8")
+    (tmp_path / "a.patch").write_text("title: A Patched\n", encoding="UTF-8")
+    (tmp_path / "b.yaml").write_text("title: [B\n", encoding="UTF-8")
+    expected = {
+        tmp_path / "a.yaml": {"title": "A Patched", "release_date": datetime.date(2019, 4, 20), "description": "A"}
+    }
+    assert YamlCalendar.get_data(tmp_path) == expected
+    assert YamlCalendar.get_data(tmp_path, parallel_threshold=0) == expected
+
+
 def test_create_google_event_add() -> None:
-    service = MockService()
+    service = FakeEventsService()
     cal = YamlCalendar("Test", "uuid", [], [], service)
     cal._create_google_event(
         progress_title="Test...",
@@ -64,14 +83,14 @@ def test_create_google_event_add() -> None:
         existing_events=[],
         force=False,
     )
-    assert len(service.insert_kwargs) == 1
-    assert len(service.update_kwargs) == 0
-    assert service.insert_kwargs[0]["body"]["summary"] == "Test Movie"
-    assert service.insert_kwargs[0]["body"]["description"] == "Movie Description"
+    assert len(service.requests["insert"]) == 1
+    assert len(service.requests["update"]) == 0
+    assert service.requests["insert"][0]["body"]["summary"] == "Test Movie"
+    assert service.requests["insert"][0]["body"]["description"] == "Movie Description"
 
 
 def test_create_google_event_update() -> None:
-    service = MockService()
+    service = FakeEventsService()
     cal = YamlCalendar("Test", "uuid", [], [], service)
     cal._create_google_event(
         progress_title="Test...",
@@ -79,14 +98,16 @@ def test_create_google_event_update() -> None:
         existing_events=[{"summary": "Test Movie", "description": "Bad Description", "id": ""}],
         force=False,
     )
-    assert len(service.insert_kwargs) == 0
-    assert len(service.update_kwargs) == 1
-    assert service.update_kwargs[0]["body"]["summary"] == "Test Movie"
-    assert service.update_kwargs[0]["body"]["description"] == "Movie Description"
+    assert len(service.requests["insert"]) == 0
+    assert len(service.requests["update"]) == 0
+    assert len(service.requests["patch"]) == 1
+    # Only the fields that differ are sent
+    assert "summary" not in service.requests["patch"][0]["body"]
+    assert service.requests["patch"][0]["body"]["description"] == "Movie Description"
 
 
 def test_create_google_event_skip() -> None:
-    service = MockService()
+    service = FakeEventsService()
     cal = YamlCalendar("Test", "uuid", [], [], service)
     cal._create_google_event(
         progress_title="Test...",
@@ -94,20 +115,109 @@ def test_create_google_event_skip() -> None:
         existing_events=[{"summary": "Test Movie", "description": "Movie Description", "id": ""}],
         force=False,
     )
-    assert len(service.insert_kwargs) == 0
-    assert len(service.update_kwargs) == 0
+    assert len(service.requests["insert"]) == 0
+    assert len(service.requests["update"]) == 0
 
 
 def test_create_google_event_skip_force() -> None:
-    service = MockService()
+    service = FakeEventsService()
     cal = YamlCalendar("Test", "uuid", [], [], service)
+    item = MockEvent("Test Movie", "Movie Description")
     cal._create_google_event(
         progress_title="Test...",
-        items=[MockEvent("Test Movie", "Movie Description")],
-        existing_events=[{"summary": "Test Movie", "description": "Movie Description", "id": ""}],
+        items=[item],
+        existing_events=[{**item.to_google_event(), "id": ""}],
         force=True,
     )
-    assert len(service.insert_kwargs) == 0
-    assert len(service.update_kwargs) == 1
-    assert service.update_kwargs[0]["body"]["summary"] == "Test Movie"
-    assert service.update_kwargs[0]["body"]["description"] == "Movie Description"
+    assert len(service.requests["insert"]) == 0
+    assert len(service.requests["update"]) == 0
+    assert len(service.requests["patch"]) == 0
+
+
+def test_create_google_event_force_patches_any_field() -> None:
+    service = FakeEventsService()
+    cal = YamlCalendar("Test", "uuid", [], [], service)
+    item = MockEvent("Test Movie", "Movie Description")
+    cal._create_google_event(
+        progress_title="Test...",
+        items=[item],
+        existing_events=[{**item.to_google_event(), "transparency": "opaque", "id": ""}],
+        force=True,
+    )
+    assert len(service.requests["update"]) == 0
+    assert service.requests["patch"][0]["body"] == {"transparency": "transparent"}
+
+
+def test_create_google_event_rewrite() -> None:
+    service = FakeEventsService()
+    cal = YamlCalendar("Test", "uuid", [], [], service)
+    cal.rewrite = True
+    item = MockEvent("Test Movie", "Movie Description")
+    cal._create_google_event(
+        progress_title="Test...",
+        items=[item],
+        existing_events=[{**item.to_google_event(), "id": ""}],
+        force=False,
+    )
+    assert len(service.requests["patch"]) == 0
+    assert len(service.requests["update"]) == 1
+    assert service.requests["update"][0]["body"] == item.to_google_event()
+
+
+def test_get_google_events_pages_and_window() -> None:
+    service = FakeEventsService([{"summary": f"Event {i}"} for i in range(3)], page_size=1)
+    cal = YamlCalendar("Test", "uuid", [], [], service)
+    cal.window_start = datetime.date(2021, 6, 1)
+    events = cal._get_google_events()
+    assert [e["summary"] for e in events] == ["Event 0", "Event 1", "Event 2"]
+    assert [kwargs.get("pageToken") for kwargs in service.requests["list"]] == [None, "1", "2"]
+    assert {kwargs["timeMin"] for kwargs in service.requests["list"]} == {"2021-06-01T00:00:00Z"}
+
+
+def test_in_window() -> None:
+    cal = YamlCalendar("Test", "uuid", [], [], None)
+    old = Movie("Old", "", datetime.date(2019, 4, 20), Path())
+    new = Movie("New", "", datetime.date(2021, 7, 9), Path())
+    assert cal.in_window(old) and cal.in_window(new)
+    cal.window_start = datetime.date(2021, 6, 1)
+    assert not cal.in_window(old)
+    assert cal.in_window(new)
+
+
+def test_window_boundary_events(tmp_path: Path) -> None:
+    # West of UTC, listing from the window's start also gets the events of the day before it, which
+    # belong to media outside the window and so mustn't be deleted as stale
+    (tmp_path / "before.yaml").write_text("title: Before\nrelease_date: 2021-05-31\ndescription: x\n", encoding="UTF-8")
+    before = YamlCalendar.get_movies(tmp_path)[0]
+    show = {"summary": "Show", "start": {"date": "2021-05-24"}, "end": {"date": "2021-05-25"}}
+    events = [
+        {"id": "1", **before.to_google_event()},
+        {"id": "2", **show, "recurrence": ["RRULE:FREQ=WEEKLY;WKST=SU;COUNT=3;BYDAY=MO"]},
+    ]
+    service = FakeEventsService(events)
+    cal = YamlCalendar("Test", "uuid", [tmp_path], [], service)
+    cal.window_start = datetime.date(2021, 6, 1)
+    assert not cal.event_in_window(events[0])
+    assert [e["summary"] for e in cal._get_google_events()] == ["Show"]
+
+    cal.sync_google_events([before], [])
+    assert service.calls == ["delete 2"]
+    cal.window_start = datetime.date(2021, 5, 31)
+    assert cal.event_in_window(events[0])
+
+    # A season that started before the window is in it while any of its episodes are
+    assert not cal.event_in_window({**show, "recurrence": ["RDATE;VALUE=DATE:20210530"]})
+    assert cal.event_in_window({**show, "recurrence": ["RRULE:FREQ=WEEKLY;WKST=SU;COUNT=3;BYDAY=MO"]})
+
+
+def test_region_calendar(tmp_path: Path) -> None:
+    (tmp_path / "a.yaml").write_text(
+        "title: A\nrelease_date: 2023-02-17\nregional_release_dates: {GB: 2023-02-16}\ndescription: x\n",
+        encoding="UTF-8",
+    )
+    service = FakeEventsService()
+    YamlCalendar("Test", "uuid", [tmp_path], [], service, region="GB").create_google_events()
+    assert [kwargs["body"]["start"] for kwargs in service.requests["insert"]] == [{"date": "2023-02-16"}]
+    assert [i.sort_val() for i in YamlCalendar("Test", "uuid", [tmp_path], [], None, region="GB").iter_items()] == [
+        datetime.date(2023, 2, 16)
+    ]